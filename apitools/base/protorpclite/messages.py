@@ -42,6 +42,7 @@ Public Exceptions (indentation indications class hierarchy):
   ValidationError: Raised when a message or field is not valid.
   DefinitionNotFoundError: Raised when definition not found.
 """
+import copy
 import types
 import weakref
 
@@ -955,6 +956,49 @@ class Message(six.with_metaclass(_MessageClass, object)):
             raise TypeError('Variant type %s is not valid.' % variant)
         self.__unrecognized_fields[key] = value, variant
 
+    def __copy__(self):
+        """Make a shallow copy of this message.
+
+        The copy has its own field values, including new lists for
+        repeated fields, so fields of the copy may be assigned or
+        appended to without affecting this message. Nested messages and
+        unrecognized field values are shared.
+
+        Returns:
+          A new instance of this message's type.
+        """
+        message_type = type(self)
+        result = message_type.__new__(message_type)
+        result.__tags = dict(
+            (number, copy.copy(value) if isinstance(value, FieldList)
+             else value)
+            for number, value in self.__tags.items())
+        result.__unrecognized_fields = dict(self.__unrecognized_fields)
+        return result
+
+    def __deepcopy__(self, memo):
+        """Make a deep copy of this message.
+
+        Field values are copied directly, without validating them again
+        or serializing the message.
+
+        Args:
+          memo: Memo dictionary, as passed by copy.deepcopy.
+
+        Returns:
+          A new instance of this message's type.
+        """
+        message_type = type(self)
+        result = message_type.__new__(message_type)
+        memo[id(self)] = result
+        result.__tags = dict(
+            (number, _deepcopy_field_value(value, memo))
+            for number, value in self.__tags.items())
+        result.__unrecognized_fields = dict(
+            (key, (copy.deepcopy(value, memo), variant))
+            for key, (value, variant) in self.__unrecognized_fields.items())
+        return result
+
     def __setattr__(self, name, value):
         """Change set behavior for messages.
 
@@ -1154,6 +1198,33 @@ class FieldList(list):
         self.__field.validate_element(value)
         return list.insert(self, index, value)
 
+    def __copy__(self):
+        """Make a shallow copy of this list, for the same field."""
+        result = FieldList.__new__(type(self))
+        result.__field = self.__field
+        list.__init__(result, self)
+        return result
+
+    def __deepcopy__(self, memo):
+        """Make a deep copy of this list, without validating it again."""
+        result = FieldList.__new__(type(self))
+        memo[id(self)] = result
+        result.__field = self.__field
+        list.__init__(result, (_deepcopy_field_value(value, memo)
+                               for value in self))
+        return result
+
+
+def _deepcopy_field_value(value, memo):
+    """Deep copy a value assigned to a message field.
+
+    Values of all other field types are immutable, so only messages and
+    lists need to be copied.
+    """
+    if isinstance(value, (Message, FieldList)):
+        return copy.deepcopy(value, memo)
+    return value
+
 
 class _FieldMeta(type):
 
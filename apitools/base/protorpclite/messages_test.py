@@ -16,6 +16,7 @@
 #
 
 """Tests for apitools.base.protorpclite.messages."""
+import copy
 import pickle
 import re
 import sys
@@ -1882,6 +1883,65 @@ class MessageTest(test_util.TestCase):
         self.assertEqual((['list', 0, ('test',)], messages.Variant.STRING),
                           message.get_unrecognized_field_info('repeated'))
 
+    def testCopy(self):
+        """Test shallow copies of messages."""
+        class AnotherMessage(messages.Message):
+            string = messages.StringField(1, repeated=True)
+
+        class MyMessage(messages.Message):
+            field1 = messages.IntegerField(1)
+            field2 = messages.MessageField(AnotherMessage, 2)
+            field3 = messages.MessageField(AnotherMessage, 3, repeated=True)
+
+        message = MyMessage(field1=1, field2=AnotherMessage(string=['a']),
+                            field3=[AnotherMessage()])
+        message.set_unrecognized_field(
+            'exists', 'value', messages.Variant.STRING)
+        copied = copy.copy(message)
+        self.assertEqual(message, copied)
+        self.assertTrue(message.field2 is copied.field2)
+        self.assertTrue(message.field3[0] is copied.field3[0])
+        self.assertTrue(MyMessage.field3 is copied.field3.field)
+
+        copied.field1 = 2
+        copied.field3.append(AnotherMessage())
+        copied.set_unrecognized_field(
+            'exists', 'other', messages.Variant.STRING)
+        self.assertEqual(1, message.field1)
+        self.assertEqual(1, len(message.field3))
+        self.assertEqual(('value', messages.Variant.STRING),
+                         message.get_unrecognized_field_info('exists'))
+
+    def testDeepCopy(self):
+        """Test deep copies of messages."""
+        class MyEnum(messages.Enum):
+            val1 = 1
+            val2 = 2
+
+        class AnotherMessage(messages.Message):
+            string = messages.StringField(1, repeated=True)
+
+        class MyMessage(messages.Message):
+            field1 = messages.IntegerField(1)
+            field2 = messages.EnumField(MyEnum, 2)
+            field3 = messages.MessageField(AnotherMessage, 3, repeated=True)
+
+        message = MyMessage(field1=1, field2=MyEnum.val2,
+                            field3=[AnotherMessage(string=['a', 'b'])])
+        message.set_unrecognized_field('repeated', ['list', 0],
+                                       messages.Variant.STRING)
+        copied = copy.deepcopy(message)
+        self.assertEqual(message, copied)
+        self.assertTrue(MyEnum.val2 is copied.field2)
+        self.assertTrue(AnotherMessage.string is copied.field3[0].string.field)
+        self.assertFalse(message.field3[0] is copied.field3[0])
+
+        copied.field3[0].string.append('c')
+        copied.get_unrecognized_field_info('repeated')[0].append(1)
+        self.assertEqual(['a', 'b'], message.field3[0].string)
+        self.assertEqual((['list', 0], messages.Variant.STRING),
+                         message.get_unrecognized_field_info('repeated'))
+
 
 class FindDefinitionTest(test_util.TestCase):
     """Test finding definitions relative to various definitions and modules."""
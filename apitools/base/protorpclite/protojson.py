@@ -23,10 +23,13 @@ Public classes:
 Public functions:
   encode_message: Encodes a message in to a JSON string.
   decode_message: Merge from a JSON string in to a message.
+  get_json_backend: Get the JSON library used to parse and serialize.
+  set_json_backend: Choose the JSON library used to parse and serialize.
 """
 import base64
 import binascii
 import logging
+import re
 
 import six
 
@@ -37,9 +40,14 @@ from apitools.base.protorpclite import util
 __all__ = [
     'ALTERNATIVE_CONTENT_TYPES',
     'CONTENT_TYPE',
+    'JsonBackend',
     'MessageJSONEncoder',
+    'StdlibJsonBackend',
+    'available_json_backends',
     'encode_message',
     'decode_message',
+    'get_json_backend',
+    'set_json_backend',
     'ProtoJson',
 ]
 
@@ -83,6 +91,204 @@ def _load_json_module():
 json = _load_json_module()
 
 
+class JsonBackend(object):
+    """A library used to parse and serialize JSON.
+
+    Backends parse and produce the same python values as the json module,
+    but their output may be formatted differently: whitespace and the
+    escaping of non-ASCII characters vary between libraries.
+
+    Attributes:
+      name: The name used to select this backend in set_json_backend.
+    """
+
+    name = None
+
+    def loads(self, data):
+        """Parse data, a JSON document as text or as UTF-8 encoded bytes."""
+        raise NotImplementedError()
+
+    def dumps(self, value, sort_keys=False):
+        """Serialize value as a JSON text string."""
+        raise NotImplementedError()
+
+    def dumps_bytes(self, value, sort_keys=False):
+        """Serialize value as UTF-8 encoded JSON."""
+        return self.dumps(value, sort_keys=sort_keys).encode('utf8')
+
+
+class StdlibJsonBackend(JsonBackend):
+    """Backend for json, or a compatible module such as simplejson."""
+
+    def __init__(self, module=None):
+        self.__json = module or json
+        self.name = self.__json.__name__
+
+    def loads(self, data):
+        if isinstance(data, bytes):
+            data = data.decode('utf8')
+        return self.__json.loads(data)
+
+    def dumps(self, value, sort_keys=False):
+        return self.__json.dumps(value, sort_keys=sort_keys)
+
+
+# A number token of integer digits too long for orjson to be sure to
+# parse as an integer. Digits in strings, such as uint64 IDs, don't match
+# unless a string happens to contain such a token.
+_LONG_INTEGER_PATTERN = r'(?:^|[:\[,])\s*-?[0-9]{19,}\s*(?:[,}\]]|$)'
+_LONG_INTEGER = re.compile(_LONG_INTEGER_PATTERN)
+_LONG_INTEGER_BYTES = re.compile(_LONG_INTEGER_PATTERN.encode('ascii'))
+
+
+class _OrjsonBackend(JsonBackend):
+    """Backend for orjson, which reads and writes bytes natively.
+
+    orjson parses integers beyond 64 bits as floats, so documents that
+    might have one are parsed with the json module instead.
+    """
+
+    name = 'orjson'
+
+    def __init__(self, module):
+        self.__orjson = module
+        self.__fallback = StdlibJsonBackend()
+
+    def loads(self, data):
+        long_integer = (_LONG_INTEGER_BYTES if isinstance(data, bytes)
+                        else _LONG_INTEGER)
+        if long_integer.search(data):
+            return self.__fallback.loads(data)
+        try:
+            return self.__orjson.loads(data)
+        except ValueError:
+            # orjson rejects some documents the json module accepts, such
+            # as NaN or lone surrogates, so let json have the final say.
+            return self.__fallback.loads(data)
+
+    def dumps(self, value, sort_keys=False):
+        return self.dumps_bytes(value, sort_keys=sort_keys).decode('utf8')
+
+    def dumps_bytes(self, value, sort_keys=False):
+        option = self.__orjson.OPT_NON_STR_KEYS
+        if sort_keys:
+            option |= self.__orjson.OPT_SORT_KEYS
+        try:
+            return self.__orjson.dumps(value, option=option)
+        except TypeError:
+            # For example, integers beyond 64 bits.
+            return self.__fallback.dumps_bytes(value, sort_keys=sort_keys)
+
+
+class _UjsonBackend(JsonBackend):
+    """Backend for ujson."""
+
+    name = 'ujson'
+
+    def __init__(self, module):
+        self.__ujson = module
+        self.__fallback = StdlibJsonBackend()
+
+    def loads(self, data):
+        try:
+            return self.__ujson.loads(data)
+        except ValueError:
+            return self.__fallback.loads(data)
+
+    def dumps(self, value, sort_keys=False):
+        try:
+            return self.__ujson.dumps(
+                value, sort_keys=sort_keys, ensure_ascii=False,
+                escape_forward_slashes=False)
+        except (OverflowError, TypeError):
+            return self.__fallback.dumps(value, sort_keys=sort_keys)
+
+
+class _ParsingJsonBackend(JsonBackend):
+    """Parse with a faster backend, but serialize with the json module.
+
+    This is the default when a faster library is installed, as the
+    output of other libraries is formatted differently from json's.
+    """
+
+    name = 'auto'
+
+    def __init__(self, backend):
+        self.__backend = backend
+        self.__fallback = StdlibJsonBackend()
+
+    def loads(self, data):
+        return self.__backend.loads(data)
+
+    def dumps(self, value, sort_keys=False):
+        return self.__fallback.dumps(value, sort_keys=sort_keys)
+
+
+# Optional backends, in order of preference.
+_JSON_BACKEND_TYPES = [
+    _OrjsonBackend,
+    _UjsonBackend,
+]
+
+_json_backend = None
+
+
+def available_json_backends():
+    """Get all of the JSON backends which can be loaded.
+
+    Returns:
+      A list of JsonBackend instances, in order of preference. The last
+      one is always the json module.
+    """
+    backends = []
+    for backend_type in _JSON_BACKEND_TYPES:
+        try:
+            module = __import__(backend_type.name, {}, {}, [])
+        except ImportError:
+            continue
+        backends.append(backend_type(module))
+    backends.append(StdlibJsonBackend())
+    return backends
+
+
+def get_json_backend():
+    """Get the JsonBackend used to parse and serialize JSON.
+
+    Unless set_json_backend was called, JSON is parsed with the fastest
+    installed library of orjson and ujson, and serialized with the json
+    module so that output doesn't depend on what is installed.
+    """
+    global _json_backend  # pylint:disable=global-statement
+    if _json_backend is None:
+        backend = available_json_backends()[0]
+        if not isinstance(backend, StdlibJsonBackend):
+            backend = _ParsingJsonBackend(backend)
+        _json_backend = backend
+    return _json_backend
+
+
+def set_json_backend(backend):
+    """Set the JsonBackend used to parse and serialize JSON.
+
+    Args:
+      backend: A JsonBackend instance, the name of a library ('orjson',
+        'ujson', 'json' or 'simplejson'), or None to go back to the
+        default choice.
+
+    Raises:
+      ImportError: If backend names a library which is not installed.
+    """
+    global _json_backend  # pylint:disable=global-statement
+    if backend is None or isinstance(backend, JsonBackend):
+        _json_backend = backend
+        return
+    for backend_type in _JSON_BACKEND_TYPES:
+        if backend_type.name == backend:
+            _json_backend = backend_type(__import__(backend, {}, {}, []))
+            return
+    _json_backend = StdlibJsonBackend(__import__(backend, {}, {}, []))
+
+
 # TODO: Rename this to MessageJsonEncoder.
 class MessageJSONEncoder(json.JSONEncoder):
     """Message JSON encoder class.
@@ -206,11 +412,26 @@ class ProtoJson(object):
           ValueError: If encoded_message is not valid JSON.
           messages.ValidationError if merged message is not initialized.
         """
-        encoded_message = six.ensure_str(encoded_message)
         if not encoded_message.strip():
             return message_type()
 
-        dictionary = json.loads(encoded_message)
+        return self.decode_dictionary(
+            message_type, get_json_backend().loads(encoded_message))
+
+    def decode_dictionary(self, message_type, dictionary):
+        """Merge an already-parsed JSON structure to Message instance.
+
+        Args:
+          message_type: Message to decode data to.
+          dictionary: Dictionary to extract information from, as parsed
+            from JSON. Nested objects will also be dictionaries.
+
+        Returns:
+          Decoded instance of message_type.
+
+        Raises:
+          messages.ValidationError if merged message is not initialized.
+        """
         message = self.__decode_dictionary(message_type, dictionary)
         message.check_initialized()
         return message
@@ -283,7 +504,7 @@ class ProtoJson(object):
             is_unrecognized_field = False
             if field.repeated:
                 # This should be unnecessary? Or in fact become an error.
-                if not isinstance(value, list):
+                if not isinstance(value, (list, tuple)):
                     value = [value]
                 valid_value = []
                 for item in value:
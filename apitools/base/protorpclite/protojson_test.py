@@ -17,8 +17,11 @@
 """Tests for apitools.base.protorpclite.protojson."""
 import datetime
 import json
+import math
 import unittest
 
+import mock
+
 from apitools.base.protorpclite import message_types
 from apitools.base.protorpclite import messages
 from apitools.base.protorpclite import protojson
@@ -487,5 +490,163 @@ class CustomProtoJsonTest(test_util.TestCase):
         self.assertTrue(instance is protojson.ProtoJson.get_default())
 
 
+class JsonBackendConformanceTestBase(object):
+    """Tests which every JsonBackend must pass.
+
+    Subclasses set BACKEND to the name of the backend to test, and are
+    skipped if it isn't installed.
+    """
+
+    BACKEND = None
+
+    VALUE = {
+        'string': u'a "quoted" \\ string/with\nescapes\t',
+        'unicode': u'\u00e9\u4e2d\U0001f600',
+        'integers': [0, -1, 2 ** 31, 2 ** 63 - 1, -2 ** 63],
+        'floats': [0.5, -1.25, 1e-07, 1.5e300],
+        'constants': [True, False, None],
+        'empty': [{}, [], ''],
+        'nested': {'a': [{'b': {'c': [1, 'two', 3.0]}}]},
+    }
+
+    def setUp(self):
+        backends = dict((backend.name, backend)
+                        for backend in protojson.available_json_backends())
+        if self.BACKEND not in backends:
+            self.skipTest('%s is not installed' % self.BACKEND)
+        self.backend = backends[self.BACKEND]
+
+    def testRoundTrip(self):
+        self.assertEqual(self.VALUE,
+                         self.backend.loads(self.backend.dumps(self.VALUE)))
+
+    def testOutputIsJson(self):
+        self.assertEqual(self.VALUE,
+                         json.loads(self.backend.dumps(self.VALUE)))
+
+    def testLoadsJson(self):
+        self.assertEqual(self.VALUE,
+                         self.backend.loads(json.dumps(self.VALUE)))
+
+    def testBytesRoundTrip(self):
+        encoded = self.backend.dumps_bytes(self.VALUE)
+        self.assertIsInstance(encoded, bytes)
+        self.assertEqual(self.VALUE, self.backend.loads(encoded))
+        self.assertEqual(self.VALUE, json.loads(encoded.decode('utf8')))
+
+    def testLoadsUtf8Bytes(self):
+        self.assertEqual({u'k': u'\u00e9\U0001f600'},
+                         self.backend.loads(
+                             u'{"k": "\u00e9\U0001f600"}'.encode('utf8')))
+
+    def testSortKeys(self):
+        encoded = self.backend.dumps({'b': 1, 'a': {'d': 2, 'c': 3}},
+                                     sort_keys=True)
+        self.assertEqual(['a', 'c', 'd', 'b'],
+                         [x for x in encoded if x.isalpha()])
+        encoded = self.backend.dumps_bytes({'b': 1, 'a': 2}, sort_keys=True)
+        self.assertLess(encoded.index(b'"a"'), encoded.index(b'"b"'))
+
+    def testNonStringKeys(self):
+        self.assertEqual({'1': 'a'},
+                         self.backend.loads(self.backend.dumps({1: 'a'})))
+
+    def testLargeIntegers(self):
+        self.assertEqual([2 ** 70],
+                         json.loads(self.backend.dumps([2 ** 70])))
+        values = [2 ** 64, -2 ** 63 - 1, 2 ** 70, 2 ** 64 - 1, -2 ** 63]
+        encoded = '{"a": [%s]}' % ', '.join(str(value) for value in values)
+        for data in (encoded, encoded.encode('ascii')):
+            loaded = self.backend.loads(data)
+            self.assertEqual({'a': values}, loaded)
+            # Not floats that compare equal.
+            self.assertEqual([type(value) for value in values],
+                             [type(value) for value in loaded['a']])
+
+    def testLoadsNaN(self):
+        self.assertTrue(math.isnan(self.backend.loads('[NaN]')[0]))
+
+    def testLoadsInvalid(self):
+        for data in ('{this is not json}', b'[1, 2', '{"a": }'):
+            self.assertRaises(ValueError, self.backend.loads, data)
+
+    def testDecodeMessage(self):
+        protojson.set_json_backend(self.backend)
+        try:
+            message = protojson.decode_message(
+                MyMessage, u'{"a_string": "\u00e9", "a_repeated": [1, 2]}'
+                .encode('utf8'))
+        finally:
+            protojson.set_json_backend(None)
+        self.assertEqual(
+            MyMessage(a_string=u'\u00e9', a_repeated=[1, 2]), message)
+
+
+class StdlibJsonBackendTest(JsonBackendConformanceTestBase,
+                            test_util.TestCase):
+    BACKEND = 'json'
+
+
+class OrjsonBackendTest(JsonBackendConformanceTestBase, test_util.TestCase):
+    BACKEND = 'orjson'
+
+    def testLoadsLongDigitStringsWithOrjson(self):
+        data = ('{"id": "1234567890123456789", "size": 1234567890123,'
+                ' "etag": "12345678901234567890123"}')
+        with mock.patch.object(json, 'loads',
+                               side_effect=AssertionError('json used')):
+            for document in (data, data.encode('ascii')):
+                self.assertEqual(
+                    {'id': '1234567890123456789', 'size': 1234567890123,
+                     'etag': '12345678901234567890123'},
+                    self.backend.loads(document))
+
+
+class UjsonBackendTest(JsonBackendConformanceTestBase, test_util.TestCase):
+    BACKEND = 'ujson'
+
+
+class JsonBackendTest(test_util.TestCase):
+    """Tests for choosing a JsonBackend."""
+
+    def tearDown(self):
+        protojson.set_json_backend(None)
+
+    def testDefaultOutputMatchesJson(self):
+        value = {'b': [1, 2.5, u'\u00e9'], 'a': None}
+        backend = protojson.get_json_backend()
+        self.assertEqual(json.dumps(value), backend.dumps(value))
+        self.assertEqual(json.dumps(value, sort_keys=True),
+                         backend.dumps(value, sort_keys=True))
+
+    def testDefaultParsesWithPreferredBackend(self):
+        preferred = protojson.available_json_backends()[0]
+        with mock.patch.object(
+                preferred, 'loads', return_value={}) as loads:
+            protojson.set_json_backend(None)
+            with mock.patch.object(
+                    protojson, 'available_json_backends',
+                    return_value=[preferred]):
+                protojson.get_json_backend().loads('[]')
+        self.assertTrue(loads.called)
+
+    def testSetByName(self):
+        protojson.set_json_backend('json')
+        self.assertIsInstance(protojson.get_json_backend(),
+                              protojson.StdlibJsonBackend)
+        self.assertEqual('json', protojson.get_json_backend().name)
+
+    def testSetInstance(self):
+        backend = protojson.StdlibJsonBackend()
+        protojson.set_json_backend(backend)
+        self.assertIs(backend, protojson.get_json_backend())
+        protojson.set_json_backend(None)
+        self.assertIsNot(backend, protojson.get_json_backend())
+
+    def testSetUnknown(self):
+        self.assertRaises(ImportError, protojson.set_json_backend,
+                          'no_such_json_module')
+
+
 if __name__ == '__main__':
     unittest.main()
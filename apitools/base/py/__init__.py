@@ -14,23 +14,132 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
-"""Top-level imports for apitools base files."""
-
-# pylint:disable=wildcard-import
-# pylint:disable=redefined-builtin
-from apitools.base.py.base_api import *
-from apitools.base.py.batch import *
-from apitools.base.py.credentials_lib import *
-from apitools.base.py.encoding import *
-from apitools.base.py.exceptions import *
-from apitools.base.py.extra_types import *
-from apitools.base.py.http_wrapper import *
-from apitools.base.py.list_pager import *
-from apitools.base.py.transfer import *
-from apitools.base.py.util import *
-
-try:
-    # pylint:disable=no-name-in-module
-    from apitools.base.py.internal import *
-except ImportError:
-    pass
+"""Top-level imports for apitools base files.
+
+On Python 3.7 and later, names are imported from their submodules on
+first access, so that importing this package doesn't import oauth2client,
+the email package and the rest of the submodules up front.
+"""
+
+import importlib
+import sys
+
+# Names exported by this package, by the submodule that defines them.
+# This must match the submodules' __all__ lists; see init_test.py.
+_SUBMODULE_NAMES = {
+    'base_api': (
+        'ApiMethodInfo', 'ApiUploadInfo', 'BaseApiClient', 'BaseApiService',
+        'LazyService', 'NormalizeApiEndpoint'),
+    'batch': ('BatchApiRequest',),
+    'credentials_lib': (
+        'CredentialsFromFile', 'GaeAssertionCredentials',
+        'GceAssertionCredentials', 'GetCredentials', 'GetUserinfo',
+        'ServiceAccountCredentialsFromFile'),
+    'encoding': (
+        'AddCustomJsonEnumMapping', 'AddCustomJsonFieldMapping',
+        'CopyProtoMessage', 'DictToMessage', 'GetCustomJsonEnumMapping',
+        'GetCustomJsonFieldMapping', 'JsonToMessage', 'MessageToDict',
+        'MessageToJson', 'MessageToPyValue', 'MessageToRepr',
+        'PartialResponseFields', 'PyValueToMessage'),
+    'exceptions': (
+        'BadStatusCodeError', 'BatchError', 'CircuitOpenError',
+        'CommunicationError', 'ConfigurationError', 'ConfigurationValueError',
+        'CredentialsError', 'Error', 'GeneratedClientError',
+        'HttpBadRequestError',
+        'HttpConflictError', 'HttpError', 'HttpForbiddenError',
+        'HttpNotFoundError', 'HttpUnauthorizedError', 'InvalidDataError',
+        'InvalidDataFromServerError', 'InvalidUserInputError',
+        'NotFoundError', 'NotYetImplementedError', 'RequestError',
+        'ResourceUnavailableError', 'RetryAfterError', 'StreamExhausted',
+        'TransferError', 'TransferInvalidError', 'TransferRetryError',
+        'TypecheckError', 'UserError'),
+    'extra_types': (
+        'DateField', 'DateTimeMessage', 'JsonArray', 'JsonObject',
+        'JsonProtoDecoder', 'JsonProtoEncoder', 'JsonValue'),
+    'http_wrapper': (
+        'AdaptiveRateLimiter', 'CheckResponse', 'CircuitBreaker',
+        'EvictHttpConnection', 'GetConnectionStats', 'GetHttp',
+        'HandleExceptionsAndRebuildHttpConnections', 'HttpConnectionPool',
+        'MakeRequest', 'RebuildHttpConnections', 'Request', 'Response',
+        'RethrowExceptionHandler', 'RetryBudget'),
+    'list_pager': (
+        'PrefixShards', 'RangeShards', 'YieldFromList',
+        'YieldFromListSharded'),
+    'transfer': (
+        'Download', 'DownloadCompletePrinter', 'DownloadProgressPrinter',
+        'RESUMABLE_UPLOAD', 'SIMPLE_UPLOAD', 'Upload', 'UploadCompletePrinter',
+        'UploadProgressPrinter'),
+    'util': ('DetectGae', 'DetectGce'),
+}
+
+# Submodules that the wildcard imports used to leave in this namespace.
+_SUBMODULES = (
+    'base_api', 'batch', 'buffered_stream', 'compression', 'credentials_lib',
+    'encoding', 'encoding_helper', 'exceptions', 'extra_types', 'gzip',
+    'http_wrapper', 'list_pager', 'mapped_file', 'stream_slice', 'transfer',
+    'upload_checkpoint', 'util')
+
+if sys.version_info < (3, 7):
+    # pylint:disable=wildcard-import
+    from apitools.base.py.base_api import *
+    from apitools.base.py.batch import *
+    from apitools.base.py.credentials_lib import *
+    from apitools.base.py.encoding import *
+    from apitools.base.py.exceptions import *
+    from apitools.base.py.extra_types import *
+    from apitools.base.py.http_wrapper import *
+    from apitools.base.py.list_pager import *
+    from apitools.base.py.transfer import *
+    from apitools.base.py.util import *
+
+    try:
+        # pylint:disable=no-name-in-module
+        from apitools.base.py.internal import *
+    except ImportError:
+        pass
+else:
+    _NAME_TO_SUBMODULE = dict(
+        (name, submodule)
+        for submodule, names in _SUBMODULE_NAMES.items()
+        for name in names)
+
+    def __getattr__(name):  # pylint: disable=invalid-name
+        """Import name from its submodule on first access."""
+        if name in _SUBMODULES:
+            return importlib.import_module('%s.%s' % (__name__, name))
+        submodule = _NAME_TO_SUBMODULE.get(name)
+        if submodule is not None:
+            value = getattr(
+                importlib.import_module('%s.%s' % (__name__, submodule)),
+                name)
+            globals()[name] = value
+            return value
+        if name == '__all__':
+            # Wildcard imports of this package get everything, including
+            # the names from the optional internal module.
+            names = sorted(set(_NAME_TO_SUBMODULE) | set(_SUBMODULES) |
+                           set(_InternalNames()))
+            globals()['__all__'] = names
+            return names
+        internal = _ImportInternal()
+        if internal is not None and name in _InternalNames():
+            return getattr(internal, name)
+        raise AttributeError('module %r has no attribute %r' % (
+            __name__, name))
+
+    def __dir__():  # pylint: disable=invalid-name
+        return sorted(set(globals()) | set(_NAME_TO_SUBMODULE) |
+                      set(_SUBMODULES))
+
+    def _ImportInternal():
+        try:
+            return importlib.import_module('%s.internal' % __name__)
+        except ImportError:
+            return None
+
+    def _InternalNames():
+        internal = _ImportInternal()
+        if internal is None:
+            return []
+        return getattr(internal, '__all__', [
+            name for name in vars(internal) if not name.startswith('_')])
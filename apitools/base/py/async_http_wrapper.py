@@ -0,0 +1,374 @@
+#!/usr/bin/env python
+#
+# Copyright 2015 Google Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""asyncio execution path for apitools.
+
+This module mirrors MakeRequest and BaseApiService._RunMethod with
+coroutines, sending requests through a pluggable AsyncTransport. It
+requires Python 3, and so is not imported by apitools.base.py; it is
+loaded on first use by BaseApiService.CallAsync.
+"""
+
+import asyncio
+import logging
+import threading
+import time
+
+import httplib2
+
+from apitools.base.py import exceptions
+from apitools.base.py import http_wrapper
+from apitools.base.py import util
+
+try:
+    import aiohttp
+except ImportError:
+    aiohttp = None
+
+__all__ = [
+    'AiohttpTransport',
+    'AsyncTransport',
+    'ExecutorTransport',
+    'GetTransport',
+    'HandleExceptionsAsync',
+    'MakeRequestAsync',
+    'RunMethodAsync',
+]
+
+# Status codes on which we refresh credentials and try again.
+_REFRESH_STATUS_CODES = (401,)
+
+# Connections per host of the pool GetTransport makes for a client whose
+# http isn't one.
+_MAX_CONNECTIONS_PER_HOST = 10
+
+# Settings of an httplib2.Http that GetTransport copies to its pool.
+_HTTP_SETTINGS = (
+    'ca_certs', 'disable_ssl_certificate_validation', 'proxy_info',
+    'timeout', 'tls_maximum_version', 'tls_minimum_version')
+
+
+class AsyncTransport(object):
+
+    """Interface for sending HTTP requests from a coroutine.
+
+    A transport has the same request() signature as httplib2.Http, but
+    request() is a coroutine. It returns an (info, content) pair, where
+    info is a dict of lowercased response headers plus the 'status' key.
+    """
+
+    async def request(self, uri, method='GET', body=None, headers=None,
+                      redirections=5, connection_type=None):
+        raise NotImplementedError()
+
+    def RebuildConnections(self):
+        """Hook for dropping cached connections before a retry."""
+
+    def EvictConnection(self, uri):
+        """Hook for dropping the connection to uri after it failed.
+
+        Defaults to RebuildConnections, for transports that can't drop a
+        single connection.
+        """
+        del uri  # Unused.
+        self.RebuildConnections()
+
+    async def close(self):
+        pass
+
+
+class ExecutorTransport(AsyncTransport):
+
+    """Transport running a synchronous http on an executor.
+
+    This preserves every feature of the wrapped http, including
+    credentials added by authorize(), at the cost of one executor thread
+    per request in flight. Unless http is an HttpConnectionPool, which is
+    thread-safe, requests are serialized on a lock.
+    """
+
+    def __init__(self, http, executor=None):
+        self.__http = http
+        self.__executor = executor
+        if isinstance(http, http_wrapper.HttpConnectionPool):
+            self.__lock = None
+        else:
+            self.__lock = threading.Lock()
+        # See the note on httplib2 0.16.0+ in http_wrapper.MakeRequest.
+        if hasattr(http, 'redirect_codes'):
+            http.redirect_codes = set(http.redirect_codes) - {308}
+
+    @property
+    def http(self):
+        return self.__http
+
+    def __Request(self, *args):
+        if self.__lock is None:
+            return self.__http.request(*args)
+        with self.__lock:
+            return self.__http.request(*args)
+
+    async def request(self, uri, method='GET', body=None, headers=None,
+                      redirections=5, connection_type=None):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(
+            self.__executor, self.__Request, uri, method, body, headers,
+            redirections, connection_type)
+
+    def RebuildConnections(self):
+        http_wrapper.RebuildHttpConnections(self.__http)
+
+    def EvictConnection(self, uri):
+        http_wrapper.EvictHttpConnection(self.__http, uri)
+
+
+class AiohttpTransport(AsyncTransport):
+
+    """Native asyncio transport using aiohttp, if installed.
+
+    If credentials are provided, they are applied to each request and
+    refreshed (on an executor, since oauth2client is synchronous) when
+    they have expired or the server replies with a 401.
+    """
+
+    def __init__(self, credentials=None, session=None, refresh_http=None):
+        if aiohttp is None:
+            raise exceptions.GeneratedClientError(
+                'aiohttp is required for AiohttpTransport')
+        self.__credentials = credentials
+        self.__session = session
+        self.__refresh_http = refresh_http
+        self.__refresh_lock = None
+
+    async def __GetSession(self):
+        if self.__session is None:
+            self.__session = aiohttp.ClientSession(auto_decompress=True)
+        return self.__session
+
+    async def __RefreshCredentials(self):
+        if self.__refresh_lock is None:
+            self.__refresh_lock = asyncio.Lock()
+        async with self.__refresh_lock:
+            if self.__refresh_http is None:
+                self.__refresh_http = http_wrapper.GetHttp()
+            loop = asyncio.get_running_loop()
+            await loop.run_in_executor(
+                None, self.__credentials.refresh, self.__refresh_http)
+
+    async def __Send(self, uri, method, body, headers, redirections):
+        session = await self.__GetSession()
+        try:
+            async with session.request(
+                    method, uri, data=body, headers=headers,
+                    allow_redirects=redirections > 0,
+                    max_redirects=max(redirections, 1)) as response:
+                content = await response.read()
+                info = dict((k.lower(), v)
+                            for k, v in response.headers.items())
+                info['status'] = str(response.status)
+                return info, content
+        except aiohttp.ClientError as e:
+            if isinstance(e, OSError):
+                raise
+            raise exceptions.RequestError(str(e))
+
+    async def request(self, uri, method='GET', body=None, headers=None,
+                      redirections=5, connection_type=None):
+        headers = dict(headers or {})
+        if self.__credentials is None:
+            return await self.__Send(uri, method, body, headers, redirections)
+        if (not self.__credentials.access_token or
+                self.__credentials.access_token_expired):
+            await self.__RefreshCredentials()
+        self.__credentials.apply(headers)
+        info, content = await self.__Send(
+            uri, method, body, headers, redirections)
+        if int(info['status']) in _REFRESH_STATUS_CODES:
+            logging.info('Refreshing due to a %s', info['status'])
+            await self.__RefreshCredentials()
+            self.__credentials.apply(headers)
+            info, content = await self.__Send(
+                uri, method, body, headers, redirections)
+        return info, content
+
+    async def close(self):
+        if self.__session is not None:
+            await self.__session.close()
+            self.__session = None
+
+
+def _PoolableSettings(http, credentials):
+    """Return the constructor settings of http, if a pool can copy it.
+
+    A pool can stand in for http if it is a plain httplib2.Http that is
+    either unauthorized or authorized with the client's credentials,
+    which the pool is authorized with in turn.
+
+    Returns:
+      A dict of keyword arguments for http_wrapper.GetHttp, or None if
+      http has state a pool of new connections would not have.
+    """
+    # pylint: disable=unidiomatic-typecheck
+    if type(http) is not httplib2.Http:
+        return None
+    # oauth2client's authorize() replaces request on the instance.
+    if credentials is None and 'request' in vars(http):
+        return None
+    if http.credentials.credentials or http.certificates.credentials:
+        return None
+    # Older versions of httplib2 lack some of the settings.
+    return dict((name, getattr(http, name)) for name in _HTTP_SETTINGS
+                if hasattr(http, name))
+
+
+def GetTransport(client):
+    """Return the async transport for client, creating it if needed.
+
+    The default transport is an ExecutorTransport. A single httplib2.Http
+    sends one request at a time, so if client.http is a plain
+    httplib2.Http, the transport gets a pool of connections with the same
+    settings, authorized with the client's credentials. Any other http
+    that isn't an HttpConnectionPool, such as a google-auth
+    AuthorizedHttp, is used as it is, one request at a time; pass an
+    HttpConnectionPool as the client's http, or set
+    client.async_transport, to send requests concurrently.
+    """
+    if client.async_transport is None:
+        http = client.http
+        # pylint: disable=protected-access
+        credentials = client._credentials
+        settings = _PoolableSettings(http, credentials)
+        if settings is not None:
+            http = http_wrapper.GetHttp(
+                max_connections_per_host=_MAX_CONNECTIONS_PER_HOST,
+                **settings)
+            if credentials is not None:
+                http = credentials.authorize(http)
+        client.async_transport = ExecutorTransport(http)
+    return client.async_transport
+
+
+async def HandleExceptionsAsync(retry_args):
+    """Exception handler for http failures from a transport.
+
+    This is the awaitable version of
+    http_wrapper.HandleExceptionsAndRebuildHttpConnections.
+
+    Args:
+      retry_args: An ExceptionRetryArgs tuple, whose http is the
+          AsyncTransport used for the request.
+    """
+    # pylint: disable=protected-access
+    retry_after = http_wrapper._CheckRetryableException(retry_args)
+    if http_wrapper._IsTransportError(retry_args.exc):
+        retry_args.http.EvictConnection(retry_args.http_request.url)
+    logging.debug('Retrying request to url %s after exception %s',
+                  retry_args.http_request.url, retry_args.exc)
+    await asyncio.sleep(
+        retry_after or util.CalculateWaitForRetry(
+            retry_args.num_retries, max_wait=retry_args.max_retry_wait))
+
+
+async def MakeRequestAsync(transport, http_request, retries=7,
+                           max_retry_wait=60, redirections=5,
+                           retry_func=HandleExceptionsAsync,
+                           check_response_func=http_wrapper.CheckResponse):
+    """Send http_request via the given transport, with error/retry handling.
+
+    This is the awaitable version of http_wrapper.MakeRequest.
+
+    Args:
+      transport: An AsyncTransport instance.
+      http_request: A Request to send.
+      retries: (int, default 7) Number of retries to attempt on retryable
+          replies (such as 429 or 5XX).
+      max_retry_wait: (int, default 60) Maximum number of seconds to wait
+          when retrying.
+      redirections: (int, default 5) Number of redirects to follow.
+      retry_func: Coroutine function to handle retries on exceptions.
+          Argument is an ExceptionRetryArgs tuple.
+      check_response_func: Function to validate the HTTP response.
+          Arguments are (Response, response content, url).
+
+    Returns:
+      A Response object.
+    """
+    retry = 0
+    first_req_time = time.time()
+    while True:
+        try:
+            return await _MakeRequestNoRetryAsync(
+                transport, http_request, redirections=redirections,
+                check_response_func=check_response_func)
+        # retry_func will consume the exception types it handles and raise.
+        # pylint: disable=broad-except
+        except Exception as e:
+            retry += 1
+            if retry >= retries:
+                raise
+            else:
+                total_wait_sec = time.time() - first_req_time
+                await retry_func(http_wrapper.ExceptionRetryArgs(
+                    transport, http_request, e, retry, max_retry_wait,
+                    total_wait_sec))
+
+
+async def _MakeRequestNoRetryAsync(
+        transport, http_request, redirections=5,
+        check_response_func=http_wrapper.CheckResponse):
+    """Send http_request via the given transport, without retries."""
+    info, content = await transport.request(
+        str(http_request.url), method=str(http_request.http_method),
+        body=http_request.body, headers=http_request.headers,
+        redirections=redirections)
+
+    if info is None:
+        raise exceptions.RequestError()
+
+    response = http_wrapper.Response(info, content, http_request.url)
+    check_response_func(response)
+    return response
+
+
+async def RunMethodAsync(service, method_config, request, global_params=None):
+    """Call the method described by method_config on service with request.
+
+    This is the awaitable version of BaseApiService._RunMethod; uploads
+    and downloads are not supported.
+
+    Args:
+      service: The BaseApiService to call.
+      method_config: The ApiMethodInfo for the method.
+      request: The request message.
+      global_params: (default: None) Global parameters for the request.
+
+    Returns:
+      The response message.
+    """
+    client = service.client
+    http_request = service.PrepareHttpRequest(
+        method_config, request, global_params=global_params)
+    opts = {
+        'retries': client.num_retries,
+        'max_retry_wait': client.max_retry_wait,
+    }
+    if client.check_response_func:
+        opts['check_response_func'] = client.check_response_func
+    if client.async_retry_func:
+        opts['retry_func'] = client.async_retry_func
+    http_response = await MakeRequestAsync(
+        GetTransport(client), http_request, **opts)
+    return service.ProcessHttpResponse(method_config, http_response, request)
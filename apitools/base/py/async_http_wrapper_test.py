@@ -0,0 +1,276 @@
+#
+# Copyright 2015 Google Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Tests for async_http_wrapper."""
+
+import asyncio
+import json
+import socket
+import sys
+import threading
+import unittest
+
+import httplib2
+from six.moves import BaseHTTPServer
+from six.moves import socketserver
+
+import mock
+
+from apitools.base.protorpclite import messages
+from apitools.base.py import async_http_wrapper
+from apitools.base.py import base_api
+from apitools.base.py import exceptions
+from apitools.base.py import http_wrapper
+
+
+class GetItemRequest(messages.Message):
+    name = messages.StringField(1)
+
+
+class Item(messages.Message):
+    name = messages.StringField(1)
+    size = messages.IntegerField(2)
+
+
+class StandardQueryParameters(messages.Message):
+    fields = messages.StringField(1)
+
+
+class FakeClient(base_api.BaseApiClient):
+    MESSAGES_MODULE = sys.modules[__name__]
+    _PACKAGE = 'package'
+    _SCOPES = ['scope1']
+
+
+class ItemsService(base_api.BaseApiService):
+
+    def Get(self, request, global_params=None):
+        config = self.GetMethodConfig('Get')
+        return self._RunMethod(config, request, global_params=global_params)
+
+    Get.method_config = lambda: base_api.ApiMethodInfo(
+        http_method='GET',
+        method_id='items.get',
+        ordered_params=['name'],
+        path_params=['name'],
+        query_params=[],
+        relative_path='items/{name}',
+        request_field='',
+        request_type_name='GetItemRequest',
+        response_type_name='Item',
+    )
+
+
+class _Handler(BaseHTTPServer.BaseHTTPRequestHandler):
+
+    # Number of requests to fail with a 503 before succeeding.
+    failures = 0
+    # Requests being handled, and the most there have been at once.
+    in_flight = 0
+    max_in_flight = 0
+    condition = threading.Condition()
+
+    def do_GET(self):  # pylint: disable=invalid-name
+        with _Handler.condition:
+            _Handler.in_flight += 1
+            _Handler.max_in_flight = max(
+                _Handler.max_in_flight, _Handler.in_flight)
+            _Handler.condition.notify_all()
+            # Give a second request a moment to arrive.
+            _Handler.condition.wait_for(
+                lambda: _Handler.max_in_flight > 1, timeout=5)
+        try:
+            self.__Respond()
+        finally:
+            with _Handler.condition:
+                _Handler.in_flight -= 1
+
+    def __Respond(self):
+        if _Handler.failures:
+            _Handler.failures -= 1
+            self.send_response(503)
+            self.send_header('content-length', '0')
+            self.end_headers()
+            return
+        name = self.path.split('?')[0].rpartition('/')[2]
+        body = json.dumps({'name': name, 'size': len(name)}).encode('utf8')
+        self.send_response(200)
+        self.send_header('content-type', 'application/json')
+        self.send_header('content-length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *unused_args):
+        pass
+
+
+class _ThreadingHTTPServer(socketserver.ThreadingMixIn,
+                           BaseHTTPServer.HTTPServer):
+    daemon_threads = True
+
+
+class _FakeTransport(async_http_wrapper.AsyncTransport):
+
+    def __init__(self, results):
+        self.results = list(results)
+        self.rebuilds = 0
+
+    async def request(self, uri, method='GET', body=None, headers=None,
+                      redirections=5, connection_type=None):
+        result = self.results.pop(0)
+        if isinstance(result, Exception):
+            raise result
+        return result
+
+    def RebuildConnections(self):
+        self.rebuilds += 1
+
+
+class AsyncHttpWrapperTest(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.server = _ThreadingHTTPServer(('127.0.0.1', 0), _Handler)
+        cls.server_thread = threading.Thread(target=cls.server.serve_forever)
+        cls.server_thread.daemon = True
+        cls.server_thread.start()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.shutdown()
+        cls.server.server_close()
+
+    def setUp(self):
+        _Handler.failures = 0
+        # Don't wait for a second request unless a test asks to.
+        _Handler.max_in_flight = 2
+        self.client = FakeClient(
+            'http://127.0.0.1:%d/' % self.server.server_port,
+            get_credentials=False,
+            http=http_wrapper.GetHttp(max_connections_per_host=4))
+        self.service = ItemsService(self.client)
+
+    def testCallAsync(self):
+        async def _Run():
+            return await self.service.CallAsync(
+                'Get', GetItemRequest(name='abc'))
+        self.assertEqual(Item(name='abc', size=3), asyncio.run(_Run()))
+        self.assertIsInstance(self.client.async_transport,
+                              async_http_wrapper.ExecutorTransport)
+
+    def testCallAsyncConcurrently(self):
+        names = ['item%d' % i for i in range(20)]
+
+        async def _Run():
+            return await asyncio.gather(*[
+                self.service.CallAsync('Get', GetItemRequest(name=name))
+                for name in names])
+        self.assertEqual([Item(name=name, size=len(name)) for name in names],
+                         asyncio.run(_Run()))
+
+    def testCallAsyncDefaultHttpConcurrently(self):
+        # The client's own http is a single httplib2.Http.
+        client = FakeClient(
+            'http://127.0.0.1:%d/' % self.server.server_port,
+            get_credentials=False)
+        service = ItemsService(client)
+        _Handler.max_in_flight = 0
+
+        async def _Run():
+            return await asyncio.gather(*[
+                service.CallAsync('Get', GetItemRequest(name=name))
+                for name in ('a', 'b')])
+        self.assertEqual([Item(name='a', size=1), Item(name='b', size=1)],
+                         asyncio.run(_Run()))
+        self.assertEqual(2, _Handler.max_in_flight)
+        self.assertIsInstance(client.async_transport.http,
+                              http_wrapper.HttpConnectionPool)
+
+    def testDefaultTransportCopiesHttpSettings(self):
+        client = FakeClient(
+            'http://127.0.0.1:%d/' % self.server.server_port,
+            get_credentials=False, http=httplib2.Http(timeout=7))
+        with mock.patch.object(
+                http_wrapper, 'GetHttp',
+                wraps=http_wrapper.GetHttp) as get_http:
+            transport = async_http_wrapper.GetTransport(client)
+        self.assertEqual(7, get_http.call_args[1]['timeout'])
+        self.assertIsInstance(transport.http, http_wrapper.HttpConnectionPool)
+
+    def testDefaultTransportKeepsAuthorizedHttp(self):
+        # An http authorized by something other than the client, such as
+        # google-auth's AuthorizedHttp.
+        sent_headers = []
+        http = httplib2.Http()
+        request = http.request
+
+        def AuthorizedRequest(uri, method='GET', body=None, headers=None,
+                              *args):
+            headers = dict(headers or {}, authorization='Bearer token')
+            sent_headers.append(headers)
+            return request(uri, method, body, headers, *args)
+        http.request = AuthorizedRequest
+        client = FakeClient(
+            'http://127.0.0.1:%d/' % self.server.server_port,
+            get_credentials=False, http=http)
+        service = ItemsService(client)
+
+        async def _Run():
+            return await service.CallAsync('Get', GetItemRequest(name='a'))
+        self.assertEqual(Item(name='a', size=1), asyncio.run(_Run()))
+        self.assertIs(http, client.async_transport.http)
+        self.assertEqual(
+            ['Bearer token'],
+            [headers['authorization'] for headers in sent_headers])
+
+    def testCallAsyncRetries(self):
+        _Handler.failures = 2
+
+        async def _Run():
+            return await self.service.CallAsync(
+                'Get', GetItemRequest(name='abc'))
+        with mock.patch.object(asyncio, 'sleep', new=mock.AsyncMock()):
+            self.assertEqual(Item(name='abc', size=3), asyncio.run(_Run()))
+
+    def testMakeRequestAsyncRetries(self):
+        transport = _FakeTransport([
+            socket.error(),
+            ({'status': '503'}, b''),
+            ({'status': '200'}, b'content'),
+        ])
+        request = http_wrapper.Request('http://www.example.com')
+        with mock.patch.object(asyncio, 'sleep',
+                               new=mock.AsyncMock()) as sleep:
+            response = asyncio.run(async_http_wrapper.MakeRequestAsync(
+                transport, request))
+        self.assertEqual(b'content', response.content)
+        # Only the socket error drops connections.
+        self.assertEqual(1, transport.rebuilds)
+        self.assertEqual(2, sleep.call_count)
+
+    def testMakeRequestAsyncRaisesUnknownErrors(self):
+        transport = _FakeTransport([exceptions.InvalidUserInputError()])
+        request = http_wrapper.Request('http://www.example.com')
+        with self.assertRaises(exceptions.InvalidUserInputError):
+            asyncio.run(async_http_wrapper.MakeRequestAsync(
+                transport, request))
+
+    def testMakeRequestAsyncExhaustsRetries(self):
+        transport = _FakeTransport([({'status': '503'}, b'')] * 3)
+        request = http_wrapper.Request('http://www.example.com')
+        with mock.patch.object(asyncio, 'sleep', new=mock.AsyncMock()):
+            with self.assertRaises(exceptions.BadStatusCodeError):
+                asyncio.run(async_http_wrapper.MakeRequestAsync(
+                    transport, request, retries=3))
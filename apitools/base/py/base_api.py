@@ -21,6 +21,7 @@ import contextlib
 import datetime
 import logging
 import pprint
+import threading
 
 
 import six
@@ -40,6 +41,7 @@ __all__ = [
     'ApiUploadInfo',
     'BaseApiClient',
     'BaseApiService',
+    'LazyService',
     'NormalizeApiEndpoint',
 ]
 
@@ -128,11 +130,151 @@ def _LoadClass(name, messages_module):
         _, _, classname = name.partition('.')
         return getattr(message_types, classname)
     elif '.' not in name:
-        return getattr(messages_module, name)
+        # Lazily loaded messages modules define the class here, through
+        # the module's __getattr__.
+        try:
+            return getattr(messages_module, name)
+        except AttributeError:
+            raise exceptions.GeneratedClientError('Unknown class %s' % name)
     else:
         raise exceptions.GeneratedClientError('Unknown class %s' % name)
 
 
+class LazyService(object):
+
+    """A client attribute that creates its service on first access.
+
+    Clients generated with --experimental_lazy_load use this in place
+    of creating every service in __init__.
+    """
+
+    def __init__(self, name, service_class_name):
+        self.__name = name
+        self.__service_class_name = service_class_name
+
+    def __get__(self, client, client_type=None):
+        if client is None:
+            return self
+        service_class = getattr(type(client), self.__service_class_name)
+        # If two threads race here, both get the service stored first.
+        return client.__dict__.setdefault(self.__name, service_class(client))
+
+
+class _RequestPlan(object):
+
+    """What PrepareHttpRequest needs to know about one method.
+
+    Plans are built on the first call of a method, from its ApiMethodInfo,
+    and rebuilt if codecs or custom JSON mappings are registered later.
+    """
+
+    def __init__(self, method_config, client):
+        self.method_config = method_config
+        self.generation = encoding.GetCodecGeneration()
+        self.__messages_module = client.MESSAGES_MODULE
+        self.__response_type = None
+        self.request_type = request_type = _LoadClass(
+            method_config.request_type_name, self.__messages_module)
+
+        # The body is the request, one of its fields, or nothing.
+        self.body_field = None
+        self.body_type = None
+        if method_config.request_field == REQUEST_IS_BODY:
+            self.body_type = request_type
+        elif method_config.request_field:
+            self.body_field = method_config.request_field
+            body_field = request_type.field_by_name(self.body_field)
+            util.Typecheck(body_field, messages.MessageField)
+            self.body_type = body_field.type
+
+        params_type = client.params_type
+        self.params_fields = list(params_type.all_fields())
+        self.global_params = [
+            (name, getattr(params_type, name))
+            for name in util.MapParamNames(
+                [field.name for field in self.params_fields], params_type)]
+        self.query_params = [
+            (name, getattr(request_type, name))
+            for name in util.MapParamNames(
+                method_config.query_params, request_type)]
+        # Renames and enum mappings applied to all of the URL parameters.
+        self.param_mappings = {}
+        for name, field in self.global_params + self.query_params:
+            self.param_mappings[name] = self.__ParamMapping(
+                request_type, name, field)
+        self.path_params = []
+        for name in util.MapParamNames(method_config.path_params,
+                                       request_type):
+            self.path_params.append((name,) + self.__ParamMapping(
+                request_type, name, getattr(request_type, name, None)))
+        # Compiled path templates, by template. Uploads and downloads may
+        # replace the method's path, so there can be more than one.
+        self.__compiled_paths = {}
+
+    @property
+    def response_type(self):
+        if self.__response_type is None:
+            self.__response_type = _LoadClass(
+                self.method_config.response_type_name,
+                self.__messages_module)
+        return self.__response_type
+
+    @staticmethod
+    def __ParamMapping(request_type, name, field):
+        """Return the wire name and enum value names for a parameter."""
+        wire_name = encoding.GetCustomJsonFieldMapping(
+            request_type, python_name=name) or name
+        enum_names = None
+        if isinstance(field, messages.EnumField):
+            enum_names = dict(
+                (str(value), encoding.GetCustomJsonEnumMapping(
+                    field.type, python_name=str(value)) or str(value))
+                for value in field.type)
+        return wire_name, enum_names
+
+    def MapParams(self, params):
+        """Rename params and map enum values, as util.MapRequestParams."""
+        mapped = {}
+        for name, value in params.items():
+            mapping = self.param_mappings.get(name)
+            if mapping is None:
+                mapping = self.param_mappings[name] = self.__ParamMapping(
+                    self.request_type, name, None)
+            wire_name, enum_names = mapping
+            if isinstance(value, messages.Enum):
+                value = _MapEnumValue(value, enum_names)
+            mapped[wire_name] = value
+        return mapped
+
+    def PathParams(self, request):
+        """Return the path parameters of request, by wire name."""
+        params = {}
+        for name, wire_name, enum_names in self.path_params:
+            value = getattr(request, name, None)
+            if isinstance(value, messages.Enum):
+                value = _MapEnumValue(value, enum_names)
+            params[wire_name] = value
+        return params
+
+    def ExpandPath(self, relative_path, request):
+        """Expand the path template relative_path for request."""
+        compiled_path = self.__compiled_paths.get(relative_path)
+        if compiled_path is None:
+            compiled_path = util.CompileRelativePath(
+                relative_path, self.method_config.path_params)
+            self.__compiled_paths[relative_path] = compiled_path
+        return util.ExpandCompiledRelativePath(
+            compiled_path, self.PathParams(request))
+
+
+def _MapEnumValue(value, enum_names):
+    name = str(value)
+    if enum_names is not None and name in enum_names:
+        return enum_names[name]
+    return encoding.GetCustomJsonEnumMapping(
+        type(value), python_name=name) or name
+
+
 def _RequireClassAttrs(obj, attrs):
     for attr in attrs:
         attr_name = attr.upper()
@@ -269,11 +411,25 @@ class BaseApiClient(object):
             self._http = self._credentials.authorize(self._http)
         # TODO(craigcitro): Remove this field when we switch to proto2.
         self.__include_fields = None
+        # Set by ResponseFields, separately on each thread.
+        self.__response_fields_local = threading.local()
 
         self.additional_http_headers = additional_http_headers or {}
         self.check_response_func = check_response_func
         self.retry_func = retry_func
+        # Optional http_wrapper.RetryBudget and http_wrapper.CircuitBreaker
+        # applied to every request; share them between clients to pool
+        # their state.
+        self.retry_budget = None
+        self.circuit_breaker = None
+        # Optional http_wrapper.AdaptiveRateLimiter that every request
+        # waits on; share it between clients to throttle them together.
+        self.rate_limiter = None
         self.response_encoding = response_encoding
+        # Transport and retry coroutine used by BaseApiService.CallAsync;
+        # see async_http_wrapper.
+        self.async_transport = None
+        self.async_retry_func = None
         # Since we can't change the init arguments without regenerating clients,
         # offer this hook to affect FinalizeTransferUrl behavior.
         self.overwrite_transfer_urls_with_client_base = False
@@ -368,6 +524,32 @@ class BaseApiClient(object):
         yield
         self.__include_fields = None
 
+    @property
+    def response_fields(self):
+        return getattr(self.__response_fields_local, 'fields', None)
+
+    @contextlib.contextmanager
+    def ResponseFields(self, fields):
+        """In this context, ask the server for only the given fields.
+
+        This applies only to calls made on the current thread, so other
+        threads can share the client.
+
+        Args:
+          fields: List of paths of fields in the response message, each a
+              dotted string or a tuple of field names. Calls that set
+              the fields global parameter themselves are unaffected.
+
+        Yields:
+          None
+        """
+        old_fields = self.response_fields
+        self.__response_fields_local.fields = fields
+        try:
+            yield
+        finally:
+            self.__response_fields_local.fields = old_fields
+
     @property
     def response_type_model(self):
         return self.__response_type_model
@@ -476,6 +658,7 @@ class BaseApiService(object):
         self.__client = client
         self._method_configs = {}
         self._upload_configs = {}
+        self.__request_plans = {}
 
     @property
     def _client(self):
@@ -517,12 +700,28 @@ class BaseApiService(object):
         return getattr(self.client.MESSAGES_MODULE,
                        method_config.response_type_name)
 
-    def __CombineGlobalParams(self, global_params, default_params):
+    def __GetRequestPlan(self, method_config):
+        """Return the _RequestPlan for method_config, building it if needed.
+
+        Plans are cached per method, so that a caller building a new
+        config for each call replaces the method's plan rather than
+        adding one.
+        """
+        key = (method_config.method_id, method_config.http_method,
+               method_config.relative_path)
+        plan = self.__request_plans.get(key)
+        if (plan is None or plan.method_config is not method_config or
+                plan.generation != encoding.GetCodecGeneration()):
+            plan = _RequestPlan(method_config, self.__client)
+            self.__request_plans[key] = plan
+        return plan
+
+    def __CombineGlobalParams(self, plan, global_params, default_params):
         """Combine the given params with the defaults."""
         util.Typecheck(global_params, (type(None), self.__client.params_type))
         result = self.__client.params_type()
         global_params = global_params or self.__client.params_type()
-        for field in result.all_fields():
+        for field in plan.params_fields:
             value = global_params.get_assigned_value(field.name)
             if value is None:
                 value = default_params.get_assigned_value(field.name)
@@ -553,44 +752,41 @@ class BaseApiService(object):
             return value.isoformat()
         return value
 
-    def __ConstructQueryParams(self, query_params, request, global_params):
+    def __ConstructQueryParams(self, plan, request, global_params):
         """Construct a dictionary of query parameters for this request."""
         # First, handle the global params.
         global_params = self.__CombineGlobalParams(
-            global_params, self.__client.global_params)
-        global_param_names = util.MapParamNames(
-            [x.name for x in self.__client.params_type.all_fields()],
-            self.__client.params_type)
-        global_params_type = type(global_params)
+            plan, global_params, self.__client.global_params)
         query_info = dict(
-            (param,
-             self.__FinalUrlValue(getattr(global_params, param),
-                                  getattr(global_params_type, param)))
-            for param in global_param_names)
+            (param, self.__FinalUrlValue(getattr(global_params, param), field))
+            for param, field in plan.global_params)
         # Next, add the query params.
-        query_param_names = util.MapParamNames(query_params, type(request))
-        request_type = type(request)
         query_info.update(
-            (param,
-             self.__FinalUrlValue(getattr(request, param, None),
-                                  getattr(request_type, param)))
-            for param in query_param_names)
+            (param, self.__FinalUrlValue(getattr(request, param, None), field))
+            for param, field in plan.query_params)
         query_info = dict((k, v) for k, v in query_info.items()
                           if v is not None)
         query_info = self.__EncodePrettyPrint(query_info)
-        query_info = util.MapRequestParams(query_info, type(request))
-        return query_info
+        return plan.MapParams(query_info)
+
+    def __AddResponseFields(self, plan, global_params):
+        """Set the fields global param from the client's response_fields."""
+        fields = self.__client.response_fields
+        if not fields or (global_params is not None and
+                          getattr(global_params, 'fields', None)):
+            return global_params
+        if global_params is None:
+            global_params = self.__client.params_type()
+        else:
+            global_params = encoding.CopyProtoMessage(global_params)
+        global_params.fields = encoding.PartialResponseFields(
+            plan.response_type, fields)
+        return global_params
 
-    def __ConstructRelativePath(self, method_config, request,
-                                relative_path=None):
+    def __ConstructRelativePath(self, plan, request, relative_path=None):
         """Determine the relative path for request."""
-        python_param_names = util.MapParamNames(
-            method_config.path_params, type(request))
-        params = dict([(param, getattr(request, param, None))
-                       for param in python_param_names])
-        params = util.MapRequestParams(params, type(request))
-        return util.ExpandRelativePath(method_config, params,
-                                       relative_path=relative_path)
+        return plan.ExpandPath(
+            relative_path or plan.method_config.relative_path or '', request)
 
     def __FinalizeRequest(self, http_request, url_builder):
         """Make any final general adjustments to the request."""
@@ -643,22 +839,16 @@ class BaseApiService(object):
           http_request.headers['X-Goog-Api-Version'] = (
               method_config.api_version_param)
 
-    def __SetBody(self, http_request, method_config, request, upload):
+    def __SetBody(self, http_request, plan, request, upload):
         """Fill in the body on http_request."""
-        if not method_config.request_field:
+        body_type = plan.body_type
+        if body_type is None:
             return
 
-        request_type = _LoadClass(
-            method_config.request_type_name, self.__client.MESSAGES_MODULE)
-        if method_config.request_field == REQUEST_IS_BODY:
+        if plan.body_field is None:
             body_value = request
-            body_type = request_type
         else:
-            body_value = getattr(request, method_config.request_field)
-            body_field = request_type.field_by_name(
-                method_config.request_field)
-            util.Typecheck(body_field, messages.MessageField)
-            body_type = body_field.type
+            body_value = getattr(request, plan.body_field)
 
         # If there was no body provided, we use an empty message of the
         # appropriate type.
@@ -673,21 +863,21 @@ class BaseApiService(object):
     def PrepareHttpRequest(self, method_config, request, global_params=None,
                            upload=None, upload_config=None, download=None):
         """Prepares an HTTP request to be sent."""
-        request_type = _LoadClass(
-            method_config.request_type_name, self.__client.MESSAGES_MODULE)
-        util.Typecheck(request, request_type)
+        plan = self.__GetRequestPlan(method_config)
+        util.Typecheck(request, plan.request_type)
         request = self.__client.ProcessRequest(method_config, request)
 
         http_request = http_wrapper.Request(
             http_method=method_config.http_method)
         self.__SetBaseHeaders(http_request, self.__client)
         self.__SetBaseSystemParams(http_request, method_config)
-        self.__SetBody(http_request, method_config, request, upload)
+        self.__SetBody(http_request, plan, request, upload)
 
         url_builder = _UrlBuilder(
             self.__client.url, relative_path=method_config.relative_path)
+        global_params = self.__AddResponseFields(plan, global_params)
         url_builder.query_params = self.__ConstructQueryParams(
-            method_config.query_params, request, global_params)
+            plan, request, global_params)
 
         # It's important that upload and download go before we fill in the
         # relative path, so that they can replace it.
@@ -697,7 +887,7 @@ class BaseApiService(object):
             download.ConfigureRequest(http_request, url_builder)
 
         url_builder.relative_path = self.__ConstructRelativePath(
-            method_config, request, relative_path=url_builder.relative_path)
+            plan, request, relative_path=url_builder.relative_path)
         self.__FinalizeRequest(http_request, url_builder)
 
         return self.__client.ProcessHttpRequest(http_request)
@@ -741,11 +931,58 @@ class BaseApiService(object):
                 opts['check_response_func'] = self.__client.check_response_func
             if self.__client.retry_func:
                 opts['retry_func'] = self.__client.retry_func
+            self.__AddRetryPolicies(http_request, opts)
+            if self.__client.rate_limiter is not None:
+                opts['rate_limiter'] = self.__client.rate_limiter
+                opts['method_id'] = method_config.method_id
             http_response = http_wrapper.MakeRequest(
                 http, http_request, **opts)
 
         return self.ProcessHttpResponse(method_config, http_response, request)
 
+    def __AddRetryPolicies(self, http_request, opts):
+        """Wrap the MakeRequest hooks in opts with the client's policies."""
+        policies = [policy for policy in (self.__client.retry_budget,
+                                          self.__client.circuit_breaker)
+                    if policy is not None]
+        if not policies:
+            return
+        retry_func = opts.get(
+            'retry_func',
+            http_wrapper.HandleExceptionsAndRebuildHttpConnections)
+        check_response_func = opts.get(
+            'check_response_func', http_wrapper.CheckResponse)
+        for policy in policies:
+            retry_func = policy.WrapRetryFunc(retry_func)
+            check_response_func = policy.WrapCheckResponseFunc(
+                check_response_func)
+        opts['retry_func'] = retry_func
+        opts['check_response_func'] = check_response_func
+        if self.__client.circuit_breaker is not None:
+            self.__client.circuit_breaker.Check(http_request.url)
+
+    def CallAsync(self, method, request, global_params=None):
+        """Return an awaitable calling the named method with request.
+
+        For example, `await client.objects.CallAsync('Get', request)`
+        sends the request through client.async_transport without blocking
+        the event loop. Requires Python 3; uploads and downloads are not
+        supported.
+
+        Args:
+          method: (str) Name of the method, such as 'Get'.
+          request: The request message for the method.
+          global_params: (default: None) Global parameters for the request.
+
+        Returns:
+          An awaitable resolving to the response message.
+        """
+        # Imported here since the module uses Python 3-only syntax.
+        from apitools.base.py import async_http_wrapper
+        return async_http_wrapper.RunMethodAsync(
+            self, self.GetMethodConfig(method), request,
+            global_params=global_params)
+
     def ProcessHttpResponse(self, method_config, http_response, request=None):
         """Convert an HTTP response to the expected message type."""
         return self.__client.ProcessResponse(
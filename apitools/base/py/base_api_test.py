@@ -17,6 +17,7 @@ import base64
 import datetime
 import sys
 import contextlib
+import threading
 import unittest
 
 import six
@@ -66,12 +67,19 @@ encoding.AddCustomJsonEnumMapping(
     MessageWithRemappings.AnEnum, 'value_one', 'ONE/TWO')
 
 
+class MessageWithLateRemapping(messages.Message):
+
+    path_field = messages.StringField(1)
+    query_field = messages.StringField(2)
+
+
 class StandardQueryParameters(messages.Message):
     field = messages.StringField(1)
     prettyPrint = messages.BooleanField(
         5, default=True)  # pylint: disable=invalid-name
     pp = messages.BooleanField(6, default=True)
     nextPageToken = messages.BytesField(7)  # pylint:disable=invalid-name
+    fields = messages.StringField(8)
 
 
 class FakeCredentials(object):
@@ -105,6 +113,25 @@ class BaseApiTest(unittest.TestCase):
         client = FakeClient('http://www.googleapis.com', get_credentials=False)
         self.assertTrue(client.url.endswith('/'))
 
+    def testLazyService(self):
+
+        class LazyClient(FakeClient):
+            fake = base_api.LazyService('fake', 'FakeService')
+            FakeService = FakeService
+
+        client = LazyClient('', get_credentials=False)
+        self.assertNotIn('fake', vars(client))
+        service = client.fake
+        self.assertIsInstance(service, FakeService)
+        self.assertIs(client, service.client)
+        self.assertIs(service, client.fake)
+        self.assertIsInstance(LazyClient.fake, base_api.LazyService)
+
+    def testLoadUnknownClass(self):
+        with self.assertRaisesRegex(exceptions.GeneratedClientError,
+                                    'Unknown class NoSuchMessage'):
+            base_api._LoadClass('NoSuchMessage', sys.modules[__name__])
+
     def testNoCredentials(self):
         client = FakeClient('', get_credentials=False)
         self.assertIsNotNone(client)
@@ -204,6 +231,49 @@ class BaseApiTest(unittest.TestCase):
         with mock(base_api.http_wrapper, 'MakeRequest', fakeMakeRequest):
             service._RunMethod(method_config, request)
 
+    def testCircuitBreaker(self):
+        responses = []
+
+        def fakeMakeRequest(http, http_request, **kwargs):
+            response = http_wrapper.Response(
+                info={'status': '503'}, content='',
+                request_url=http_request.url)
+            responses.append(response)
+            kwargs['check_response_func'](response)
+        method_config = base_api.ApiMethodInfo(
+            request_type_name='SimpleMessage',
+            response_type_name='SimpleMessage')
+        client = self.__GetFakeClient()
+        client.circuit_breaker = http_wrapper.CircuitBreaker(
+            min_requests=2, window_size=2)
+        service = FakeService(client=client)
+        with mock(base_api.http_wrapper, 'MakeRequest', fakeMakeRequest):
+            for _ in range(2):
+                with self.assertRaises(exceptions.BadStatusCodeError):
+                    service._RunMethod(method_config, SimpleMessage())
+            with self.assertRaises(exceptions.CircuitOpenError):
+                service._RunMethod(method_config, SimpleMessage())
+        self.assertEqual(2, len(responses))
+
+    def testRateLimiter(self):
+        calls = []
+
+        def fakeMakeRequest(http, http_request, **kwargs):
+            calls.append((kwargs['rate_limiter'], kwargs['method_id']))
+            return http_wrapper.Response(
+                info={'status': '200'}, content='{}',
+                request_url=http_request.url)
+        method_config = base_api.ApiMethodInfo(
+            method_id='fake.simple.get',
+            request_type_name='SimpleMessage',
+            response_type_name='SimpleMessage')
+        client = self.__GetFakeClient()
+        client.rate_limiter = http_wrapper.AdaptiveRateLimiter()
+        service = FakeService(client=client)
+        with mock(base_api.http_wrapper, 'MakeRequest', fakeMakeRequest):
+            service._RunMethod(method_config, SimpleMessage())
+        self.assertEqual([(client.rate_limiter, 'fake.simple.get')], calls)
+
     def testHttpError(self):
         def fakeMakeRequest(*unused_args, **unused_kwargs):
             return http_wrapper.Response(
@@ -300,6 +370,58 @@ class BaseApiTest(unittest.TestCase):
         expected_params = {'enum_field': 'ONE%2FTWO', 'remapped_field': 'foo'}
         self.assertTrue(expected_params, result_params)
 
+    def testResponseFields(self):
+        method_config = base_api.ApiMethodInfo(
+            request_type_name='SimpleMessage',
+            response_type_name='MessageWithRemappings')
+        service = FakeService()
+        with service.client.ResponseFields(['str_field', 'enum_field']):
+            http_request = service.PrepareHttpRequest(
+                method_config, SimpleMessage())
+            self.assertEqual(
+                {'fields': ['remapped_field,enum_field']},
+                urllib_parse.parse_qs(
+                    urllib_parse.urlparse(http_request.url).query))
+
+            global_params = StandardQueryParameters(fields='enum_field')
+            http_request = service.PrepareHttpRequest(
+                method_config, SimpleMessage(), global_params=global_params)
+            self.assertIn('fields=enum_field', http_request.url)
+            self.assertIsNone(
+                service.client.global_params.fields)
+
+            with self.assertRaises(exceptions.InvalidUserInputError):
+                with service.client.ResponseFields(['no_such_field']):
+                    service.PrepareHttpRequest(method_config, SimpleMessage())
+
+        http_request = service.PrepareHttpRequest(
+            method_config, SimpleMessage())
+        self.assertNotIn('fields', http_request.url)
+
+    def testResponseFieldsRestoredOnError(self):
+        method_config = base_api.ApiMethodInfo(
+            request_type_name='SimpleMessage',
+            response_type_name='MessageWithRemappings')
+        service = FakeService()
+        with self.assertRaises(exceptions.HttpError):
+            with service.client.ResponseFields(['str_field']):
+                raise exceptions.HttpError({'status': 500}, 'error', 'url')
+        self.assertIsNone(service.client.response_fields)
+        http_request = service.PrepareHttpRequest(
+            method_config, SimpleMessage())
+        self.assertNotIn('fields', http_request.url)
+
+    def testResponseFieldsPerThread(self):
+        service = FakeService()
+        other_thread_fields = []
+        thread = threading.Thread(target=lambda: other_thread_fields.append(
+            service.client.response_fields))
+        with service.client.ResponseFields(['str_field']):
+            thread.start()
+            thread.join()
+            self.assertEqual(['str_field'], service.client.response_fields)
+        self.assertEqual([None], other_thread_fields)
+
     def testPathRemapping(self):
         method_config = base_api.ApiMethodInfo(
             relative_path='parameters/{remapped_field}/remap/{enum_field}',
@@ -319,6 +441,54 @@ class BaseApiTest(unittest.TestCase):
         http_request = service.PrepareHttpRequest(method_config, request)
         self.assertEqual(expected_url, http_request.url)
 
+    def testRequestPlanCache(self):
+        method_config = base_api.ApiMethodInfo(
+            relative_path='parameters/{path_field}',
+            request_type_name='MessageWithLateRemapping',
+            path_params=['path_field'],
+            query_params=['query_field'])
+        request = MessageWithLateRemapping(path_field='foo', query_field='bar')
+        service = FakeService()
+        plans = []
+        request_plan = base_api._RequestPlan
+
+        def RecordPlan(*args):
+            plans.append(request_plan(*args))
+            return plans[-1]
+
+        with mock(base_api, '_RequestPlan', RecordPlan):
+            http_request = service.PrepareHttpRequest(method_config, request)
+            self.assertEqual(
+                service.client.url + 'parameters/foo?query_field=bar',
+                http_request.url)
+            service.PrepareHttpRequest(method_config, request)
+            self.assertEqual(1, len(plans))
+
+            # Registering a mapping invalidates the plan.
+            encoding.AddCustomJsonFieldMapping(
+                MessageWithLateRemapping, 'query_field', 'queryField')
+            http_request = service.PrepareHttpRequest(method_config, request)
+            self.assertEqual(2, len(plans))
+            self.assertEqual(
+                service.client.url + 'parameters/foo?queryField=bar',
+                http_request.url)
+
+    def testRequestPlanCacheWithNewConfigs(self):
+        service = FakeService()
+        for _ in range(3):
+            method_config = base_api.ApiMethodInfo(
+                relative_path='parameters/{path_field}',
+                request_type_name='MessageWithLateRemapping',
+                path_params=['path_field'])
+            service.PrepareHttpRequest(
+                method_config, MessageWithLateRemapping(path_field='foo'))
+        other_config = base_api.ApiMethodInfo(
+            relative_path='other', request_type_name='SimpleMessage')
+        service.PrepareHttpRequest(other_config, SimpleMessage())
+        # One plan per method, however many configs were passed.
+        # pylint: disable=protected-access
+        self.assertEqual(2, len(service._BaseApiService__request_plans))
+
     def testColonInRelativePath(self):
         method_config = base_api.ApiMethodInfo(
             relative_path='path:withJustColon',
@@ -18,15 +18,21 @@
 
 import collections
 import email.generator as generator
+import email.message as email_message
 import email.mime.multipart as mime_multipart
 import email.mime.nonmultipart as mime_nonmultipart
 import email.parser as email_parser
+import email.policy as email_policy
 import itertools
+import re
+import sys
+import threading
 import time
 import uuid
 
 import six
 from six.moves import http_client
+from six.moves import queue
 from six.moves import urllib_parse
 from six.moves import range  # pylint: disable=redefined-builtin
 
@@ -37,6 +43,20 @@ __all__ = [
     'BatchApiRequest',
 ]
 
+# Size of the chunks fed to _MultipartParser from a response body.
+_PARSE_CHUNK_SIZE = 64 * 1024
+
+_LINE_END_RE = re.compile(br'\r\n|\r|\n')
+_DELIMITER_TAIL_RE = re.compile(br'(--)?[ \t]*\Z')
+# Header names as recognized by email.feedparser.
+_HEADER_NAME_RE = re.compile(br'([\041-\071\073-\176]+):')
+
+_TEXT_LINE_END_RE = re.compile(r'\r\n|\r')
+_FROM_LINE_RE = re.compile(r'^From ', re.MULTILINE)
+# Header values that email.generator writes out unchanged.
+_SIMPLE_HEADER_RE = re.compile(r'[\041-\176]+( [\041-\176]+)*\Z')
+_HEADER_POLICY = email_policy.compat32.clone(linesep='\n', max_line_length=0)
+
 
 class RequestResponseAndHandler(collections.namedtuple(
         'RequestResponseAndHandler', ['request', 'response', 'handler'])):
@@ -185,7 +205,8 @@ class BatchApiRequest(object):
         self.api_requests.append(api_request)
 
     def Execute(self, http, sleep_between_polls=5, max_retries=5,
-                max_batch_size=None, batch_request_callback=None):
+                max_batch_size=None, batch_request_callback=None,
+                max_concurrency=None, http_factory=None):
         """Execute all of the requests in the batch.
 
         Args:
@@ -199,6 +220,14 @@ class BatchApiRequest(object):
               of given size.
           batch_request_callback: function of (http_response, exception) passed
               to BatchHttpRequest which will be run on any given results.
+          max_concurrency: int, if specified and greater than 1, up to this
+              many batches are sent at once, each worker using its own
+              http object. Responses are still handled in order, on the
+              calling thread.
+          http_factory: function of no arguments returning the http object
+              for each concurrent worker. By default, http itself is shared
+              if it is an http_wrapper.HttpConnectionPool, and otherwise a
+              new http is created and authorized with http's credentials.
 
         Returns:
           List of ApiCalls.
@@ -211,25 +240,18 @@ class BatchApiRequest(object):
             if attempt:
                 time.sleep(sleep_between_polls)
 
-            for i in range(0, len(requests), batch_size):
-                # Create a batch_http_request object and populate it with
-                # incomplete requests.
-                batch_http_request = BatchHttpRequest(
-                    batch_url=self.batch_url,
-                    callback=batch_request_callback,
-                    response_encoding=self.response_encoding
-                )
-                for request in itertools.islice(requests,
-                                                i, i + batch_size):
-                    batch_http_request.Add(
-                        request.http_request, request.HandleResponse)
-                batch_http_request.Execute(http)
-
-                if hasattr(http.request, 'credentials'):
-                    if any(request.authorization_failed
-                           for request in itertools.islice(requests,
-                                                           i, i + batch_size)):
-                        http.request.credentials.refresh(http)
+            batches = [requests[i:i + batch_size]
+                       for i in range(0, len(requests), batch_size)]
+            if max_concurrency and max_concurrency > 1 and len(batches) > 1:
+                self.__ExecuteConcurrently(
+                    http, batches, batch_request_callback, max_concurrency,
+                    http_factory or self.__GetHttpFactory(http))
+            else:
+                for batch_requests in batches:
+                    batch_http_request = self.__NewBatchHttpRequest(
+                        batch_requests, batch_request_callback)
+                    batch_http_request.Execute(http)
+                    self.__RefreshIfUnauthorized(http, batch_requests)
 
             # Collect retryable requests.
             requests = [request for request in self.api_requests if not
@@ -239,6 +261,283 @@ class BatchApiRequest(object):
 
         return self.api_requests
 
+    def __NewBatchHttpRequest(self, requests, callback):
+        """Create a BatchHttpRequest for the given ApiCalls."""
+        batch_http_request = BatchHttpRequest(
+            batch_url=self.batch_url,
+            callback=callback,
+            response_encoding=self.response_encoding
+        )
+        for request in requests:
+            batch_http_request.Add(
+                request.http_request, request.HandleResponse)
+        return batch_http_request
+
+    @staticmethod
+    def __RefreshIfUnauthorized(http, requests):
+        """Refresh http's credentials if any of requests was unauthorized.
+
+        Returns:
+          True if the credentials were refreshed.
+        """
+        if hasattr(http.request, 'credentials'):
+            if any(request.authorization_failed for request in requests):
+                http.request.credentials.refresh(http)
+                return True
+        return False
+
+    @staticmethod
+    def __GetHttpFactory(http):
+        """Return the default http_factory for concurrent workers."""
+        if isinstance(http, http_wrapper.HttpConnectionPool):
+            return lambda: http
+
+        def NewHttp():
+            new_http = http_wrapper.GetHttp()
+            # oauth2client records the credentials on the wrapped request
+            # method. Sharing them means a refresh applies to all workers.
+            credentials = getattr(http.request, 'credentials', None)
+            if credentials is not None:
+                new_http = credentials.authorize(new_http)
+            return new_http
+        return NewHttp
+
+    def __ExecuteConcurrently(self, http, batches, callback, max_concurrency,
+                              http_factory):
+        """Send batches in parallel, and handle their responses in order.
+
+        Workers only send batches and parse the responses; the ApiCall
+        and user callbacks all run on this thread, in batch order. If any
+        batches were unauthorized, the credentials are refreshed once, and
+        the failed requests are left for the next retry pass.
+
+        Args:
+          http: The http object passed to Execute, used for refreshing
+              credentials.
+          batches: List of lists of ApiCalls, each to send as one batch.
+          callback: The batch_request_callback passed to Execute.
+          max_concurrency: Maximum number of batches to send at once.
+          http_factory: Function returning the http object for a worker.
+
+        Raises:
+          The first error raised while sending a batch, in batch order.
+        """
+        # pylint: disable=protected-access
+        batch_http_requests = [self.__NewBatchHttpRequest(requests, callback)
+                               for requests in batches]
+        pending = queue.Queue()
+        for index in range(len(batch_http_requests)):
+            pending.put(index)
+        finished = queue.Queue()
+        stop = threading.Event()
+
+        def SendBatches(worker_http):
+            while not stop.is_set():
+                try:
+                    index = pending.get_nowait()
+                except queue.Empty:
+                    return
+                try:
+                    batch_http_requests[index]._Execute(worker_http)
+                    finished.put((index, None))
+                # Hand the failure to the calling thread.
+                # pylint: disable=broad-except
+                except Exception:
+                    finished.put((index, sys.exc_info()))
+
+        workers = []
+        try:
+            for _ in range(min(max_concurrency, len(batches))):
+                worker = threading.Thread(target=SendBatches,
+                                          args=(http_factory(),))
+                worker.daemon = True
+                worker.start()
+                workers.append(worker)
+
+            results = {}
+            refreshed = False
+            for index, batch_http_request in enumerate(batch_http_requests):
+                while index not in results:
+                    finished_index, exc_info = finished.get()
+                    results[finished_index] = exc_info
+                if results[index] is not None:
+                    six.reraise(*results[index])
+                batch_http_request._HandleResponses()
+                if not refreshed:
+                    refreshed = self.__RefreshIfUnauthorized(
+                        http, batches[index])
+        finally:
+            stop.set()
+            for worker in workers:
+                worker.join()
+
+
+def _NormalizeLines(text):
+    """End all lines with \\n, as email.generator does."""
+    return _TEXT_LINE_END_RE.sub('\n', text)
+
+
+def _AppendHeader(chunks, name, value):
+    """Append a header line to chunks, as email.generator writes it.
+
+    Args:
+      chunks: List of bytes to append to.
+      name: The header name.
+      value: The header value.
+    """
+    if isinstance(value, six.text_type) and _SIMPLE_HEADER_RE.match(value):
+        chunks.append(('%s: %s\n' % (name, value)).encode('ascii'))
+    else:
+        chunks.append(_NormalizeLines(
+            _HEADER_POLICY.fold(name, value)).encode('utf-8'))
+
+
+def _MakeBoundary(parts):
+    """Choose a boundary which does not appear in any of the parts.
+
+    Args:
+      parts: List of bytes, the serialized parts.
+
+    Returns:
+      A boundary like the ones email.generator makes.
+    """
+    # pylint: disable=protected-access
+    boundary = generator.Generator._make_boundary()
+    candidate = boundary
+    for counter in itertools.count():
+        delimiter = re.compile(
+            b'^--' + re.escape(candidate.encode('ascii')) + b'(--)?$',
+            re.MULTILINE)
+        if not any(delimiter.search(part) for part in parts):
+            return candidate
+        candidate = '%s.%d' % (boundary, counter)
+
+
+class _MultipartParseError(exceptions.BatchError):
+
+    """The response needs the email package to be parsed."""
+
+
+def _SplitHeaders(data):
+    """Split raw headers and body the way email.parser does.
+
+    Args:
+      data: bytes, a header block optionally followed by a body.
+
+    Returns:
+      A list of (name, value) bytes tuples, and the body bytes.
+
+    Raises:
+      _MultipartParseError: if a header is folded over several lines.
+    """
+    headers = []
+    position = 0
+    while position < len(data):
+        match = _LINE_END_RE.search(data, position)
+        line_end, next_line = (
+            (match.start(), match.end()) if match else (len(data),) * 2)
+        line = data[position:line_end]
+        if not line:
+            return headers, data[next_line:]
+        if line[:1] in (b' ', b'\t'):
+            raise _MultipartParseError('Folded header in batch response.')
+        name = _HEADER_NAME_RE.match(line)
+        if name is None:
+            # Like email.parser, treat the first non-header line as the
+            # start of the body.
+            return headers, data[position:]
+        headers.append(
+            (name.group(1), line[name.end():].lstrip(b' \t')))
+        position = next_line
+    return headers, b''
+
+
+class _MultipartParser(object):
+
+    """Incremental parser for multipart bodies.
+
+    Data is given to Feed as it arrives. Each part is split on the
+    boundary and passed to part_callback as soon as the next delimiter
+    line is seen, so only the current part is held in memory.
+    """
+
+    def __init__(self, boundary, part_callback):
+        """Initialize a parser.
+
+        Args:
+          boundary: bytes, the boundary of the multipart body.
+          part_callback: Function called with the (headers, body) of each
+              part, where headers is a list of (name, value) bytes tuples.
+        """
+        self.__delimiter = b'--' + boundary
+        self.__part_callback = part_callback
+        self.__buffer = bytearray()
+        # Offset of the current part in the buffer, or None in the preamble.
+        self.__part_start = None
+        self.__scan_position = 0
+        self.__done = False
+
+    def Feed(self, data):
+        """Parse the next chunk of the body."""
+        if not self.__done:
+            self.__buffer += data
+            self.__Parse(final=False)
+
+    def Close(self):
+        """Finish parsing the body.
+
+        Raises:
+          _MultipartParseError: if the body has no closing delimiter.
+        """
+        if not self.__done:
+            self.__Parse(final=True)
+        if not self.__done:
+            raise _MultipartParseError(
+                'Batch response has no closing delimiter.')
+
+    def __Parse(self, final):
+        """Find delimiters in the buffer and emit the parts between them."""
+        buf = self.__buffer
+        while not self.__done:
+            index = buf.find(self.__delimiter, self.__scan_position)
+            if index < 0:
+                self.__scan_position = max(
+                    self.__scan_position, len(buf) - len(self.__delimiter))
+                break
+            if index and buf[index - 1:index] not in (b'\r', b'\n'):
+                self.__scan_position = index + 1
+                continue
+            line_end = _LINE_END_RE.search(buf, index)
+            if not final and (line_end is None or (
+                    line_end.group() == b'\r' and
+                    line_end.end() == len(buf))):
+                # Wait for the rest of the line; a trailing '\r' may be
+                # followed by '\n'.
+                self.__scan_position = index
+                break
+            line_end, next_line = (
+                (line_end.start(), line_end.end()) if line_end
+                else (len(buf),) * 2)
+            tail = _DELIMITER_TAIL_RE.match(
+                bytes(buf[index + len(self.__delimiter):line_end]))
+            if tail is None:
+                self.__scan_position = index + 1
+                continue
+            if self.__part_start is not None:
+                self.__EmitPart(bytes(buf[self.__part_start:index]))
+            self.__done = bool(tail.group(1))
+            del buf[:next_line]
+            self.__part_start = 0
+            self.__scan_position = 0
+
+    def __EmitPart(self, part):
+        """Pass a part to the callback, without its final line break."""
+        if part.endswith(b'\r\n'):
+            part = part[:-2]
+        elif part.endswith((b'\r', b'\n')):
+            part = part[:-1]
+        self.__part_callback(*_SplitHeaders(part))
+
 
 class BatchHttpRequest(object):
 
@@ -362,6 +661,107 @@ class BatchHttpRequest(object):
 
         return status_line + body
 
+    def _SerializeBatch(self):
+        """Serialize all the requests into a multipart/mixed body.
+
+        This writes the same bytes as _SerializeBatchWithEmail, without
+        building and flattening a tree of email messages.
+
+        Returns:
+          The boundary, and the body as bytes.
+        """
+        parts = []
+        for key in self.__request_response_handlers:
+            part = [b'Content-Type: application/http\n'
+                    b'MIME-Version: 1.0\n'
+                    b'Content-Transfer-Encoding: binary\n']
+            _AppendHeader(part, 'Content-ID', self._ConvertIdToHeader(key))
+            part.append(b'\n')
+            self.__AppendRequest(
+                part, self.__request_response_handlers[key].request)
+            parts.append(b''.join(part))
+
+        boundary = _MakeBoundary(parts)
+        delimiter = b'--' + boundary.encode('ascii')
+        body = [delimiter, b'\n']
+        for index, part in enumerate(parts):
+            if index:
+                body.extend((b'\n', delimiter, b'\n'))
+            body.append(part)
+        body.extend((b'\n', delimiter, b'--\n'))
+        return boundary, b''.join(body)
+
+    def __AppendRequest(self, chunks, request):
+        """Append a request in application/http format to chunks.
+
+        This is equivalent to _SerializeRequest, as it is written out in
+        a batch body.
+
+        Args:
+          chunks: List of bytes to append to.
+          request: A http_wrapper.Request to serialize.
+        """
+        body = request.body
+        if isinstance(body, bytes):
+            try:
+                body = body.decode('ascii')
+            except UnicodeDecodeError:
+                body = None
+        if body is None and request.body is not None:
+            # Leave undecodable bodies to the email package.
+            chunks.append(_NormalizeLines(
+                self._SerializeRequest(request)).encode(
+                    'utf-8', 'surrogateescape'))
+            return
+
+        parsed = urllib_parse.urlsplit(request.url)
+        request_line = urllib_parse.urlunsplit(
+            ('', '', parsed.path, parsed.query, ''))
+        if not isinstance(request_line, six.text_type):
+            request_line = request_line.decode('utf-8')
+        chunks.append(u' '.join((
+            request.http_method, request_line, u'HTTP/1.1\n')).encode('utf-8'))
+
+        major, minor = request.headers.get(
+            'content-type', 'application/json').split('/')
+        _AppendHeader(chunks, 'Content-Type', '%s/%s' % (major, minor))
+        chunks.append(b'MIME-Version: 1.0\n')
+        for key, value in request.headers.items():
+            if key == 'content-type':
+                continue
+            _AppendHeader(chunks, key, value)
+        _AppendHeader(chunks, 'Host', parsed.netloc)
+        chunks.append(b'\n')
+
+        if body:
+            # email.generator escapes lines starting with "From ".
+            body = _NormalizeLines(_FROM_LINE_RE.sub('>From ', body))
+            chunks.append(body.encode('utf-8'))
+
+    def _SerializeBatchWithEmail(self):
+        """Serialize all the requests with the email package.
+
+        Returns:
+          The boundary, and the body as a string.
+        """
+        message = mime_multipart.MIMEMultipart('mixed')
+        # Message should not write out its own headers.
+        setattr(message, '_write_headers', lambda self: None)
+
+        # Add all the individual requests.
+        for key in self.__request_response_handlers:
+            msg = mime_nonmultipart.MIMENonMultipart('application', 'http')
+            msg['Content-Transfer-Encoding'] = 'binary'
+            msg['Content-ID'] = self._ConvertIdToHeader(key)
+
+            body = self._SerializeRequest(
+                self.__request_response_handlers[key].request)
+            msg.set_payload(body)
+            message.attach(msg)
+
+        body = message.as_string()
+        return message.get_boundary(), body
+
     def _DeserializeResponse(self, payload):
         """Convert string into Response and content.
 
@@ -426,31 +826,96 @@ class BatchHttpRequest(object):
           httplib2.HttpLib2Error if a transport error has occured.
           apiclient.errors.BatchError if the response is the wrong format.
         """
-        message = mime_multipart.MIMEMultipart('mixed')
-        # Message should not write out its own headers.
-        setattr(message, '_write_headers', lambda self: None)
-
-        # Add all the individual requests.
-        for key in self.__request_response_handlers:
-            msg = mime_nonmultipart.MIMENonMultipart('application', 'http')
-            msg['Content-Transfer-Encoding'] = 'binary'
-            msg['Content-ID'] = self._ConvertIdToHeader(key)
-
-            body = self._SerializeRequest(
-                self.__request_response_handlers[key].request)
-            msg.set_payload(body)
-            message.attach(msg)
-
+        boundary, body = self._SerializeBatch()
         request = http_wrapper.Request(self.__batch_url, 'POST')
-        request.body = message.as_string()
+        request.body = body
         request.headers['content-type'] = (
-            'multipart/mixed; boundary="%s"') % message.get_boundary()
+            'multipart/mixed; boundary="%s"') % boundary
 
         response = http_wrapper.MakeRequest(http, request)
 
         if response.status_code >= 300:
             raise exceptions.HttpError.FromResponse(response)
 
+        try:
+            self.__ParseResponse(response)
+        except _MultipartParseError:
+            self.__ParseResponseWithEmail(response)
+
+    def __ParseResponse(self, response):
+        """Split a batch response into responses with _MultipartParser.
+
+        Args:
+          response: The http_wrapper.Response for the batch request.
+
+        Raises:
+          _MultipartParseError: if the response must be parsed with the
+              email package instead.
+        """
+        header = email_message.Message()
+        header['content-type'] = response.info['content-type']
+        boundary = header.get_boundary()
+        if header.get_content_maintype() != 'multipart' or not boundary:
+            raise _MultipartParseError(
+                'Response not in multipart/mixed format.')
+
+        content = response.content
+        encoding = self.__response_encoding
+        if isinstance(content, six.text_type):
+            content, encoding = content.encode('utf-8'), 'utf-8'
+
+        def HandlePart(headers, body):
+            content_id = None
+            for name, value in headers:
+                if name.lower() == b'content-id':
+                    content_id = value.decode('ascii')
+                    break
+            self.__SetResponse(self._ConvertHeaderToId(content_id),
+                               self.__DeserializeResponseBytes(
+                                   body, encoding))
+
+        parser = _MultipartParser(boundary.encode('ascii'), HandlePart)
+        for start in range(0, len(content), _PARSE_CHUNK_SIZE):
+            parser.Feed(content[start:start + _PARSE_CHUNK_SIZE])
+        parser.Close()
+
+    def __DeserializeResponseBytes(self, payload, encoding):
+        """Convert the bytes of one response part into a Response.
+
+        This is the bytes equivalent of _DeserializeResponse.
+
+        Args:
+          payload: bytes, the status line, headers and body of a response.
+          encoding: The encoding of the payload, or None to leave the
+              content as bytes.
+
+        Returns:
+          A Response object.
+        """
+        status_line, payload = payload.split(b'\n', 1)
+        _, status, _ = status_line.split(b' ', 2)
+        headers, content = _SplitHeaders(payload)
+
+        header_encoding = encoding or 'iso-8859-1'
+        info = {}
+        for name, value in headers:
+            info.setdefault(name.decode(header_encoding),
+                            value.decode(header_encoding))
+        info['status'] = status.decode(header_encoding)
+        if encoding:
+            content = content.decode(encoding)
+
+        return http_wrapper.Response(info, content, self.__batch_url)
+
+    def __ParseResponseWithEmail(self, response):
+        """Split a batch response into responses with the email package.
+
+        Args:
+          response: The http_wrapper.Response for the batch request.
+
+        Raises:
+          BatchError: if the response is not a multipart message.
+        """
         # Prepend with a content-type header so Parser can handle it.
         header = 'content-type: %s\r\n\r\n' % response.info['content-type']
 
@@ -467,14 +932,17 @@ class BatchHttpRequest(object):
 
         for part in mime_response.get_payload():
             request_id = self._ConvertHeaderToId(part['Content-ID'])
-            response = self._DeserializeResponse(part.get_payload())
-
-            # Disable protected access because namedtuple._replace(...)
-            # is not actually meant to be protected.
-            # pylint: disable=protected-access
-            self.__request_response_handlers[request_id] = (
-                self.__request_response_handlers[request_id]._replace(
-                    response=response))
+            self.__SetResponse(
+                request_id, self._DeserializeResponse(part.get_payload()))
+
+    def __SetResponse(self, request_id, response):
+        """Record the response for the request with the given id."""
+        # Disable protected access because namedtuple._replace(...)
+        # is not actually meant to be protected.
+        # pylint: disable=protected-access
+        self.__request_response_handlers[request_id] = (
+            self.__request_response_handlers[request_id]._replace(
+                response=response))
 
     def Execute(self, http):
         """Execute all the requests as a single batched HTTP request.
@@ -490,7 +958,10 @@ class BatchHttpRequest(object):
         """
 
         self._Execute(http)
+        self._HandleResponses()
 
+    def _HandleResponses(self):
+        """Call the callbacks with the responses from _Execute."""
         for key in self.__request_response_handlers:
             response = self.__request_response_handlers[key].response
             callback = self.__request_response_handlers[key].handler
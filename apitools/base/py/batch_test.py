@@ -15,7 +15,9 @@
 
 """Tests for apitools.base.py.batch."""
 
+import re
 import textwrap
+import threading
 import unittest
 
 import mock
@@ -333,6 +335,131 @@ class BatchTest(unittest.TestCase):
             self.assertEqual('content', response.content)
             self.assertEqual(desired_url, response.request_url)
 
+    def _ExecuteConcurrently(self, number_of_requests, statuses,
+                             retryable_codes=None, **kwds):
+        """Execute a batch, replying to each request from statuses.
+
+        Args:
+          number_of_requests: Number of requests to add to the batch.
+          statuses: Function of (name, attempt) returning the status line
+              to reply with.
+          retryable_codes: Retryable codes for the BatchApiRequest.
+          **kwds: Additional arguments for Execute.
+
+        Returns:
+          The responses from Execute, and the names sent in each batch.
+        """
+        desired_url = 'https://www.example.com'
+        batch_api_request = batch.BatchApiRequest(
+            batch_url=desired_url, retryable_codes=retryable_codes)
+        for i in range(number_of_requests):
+            batch_api_request.Add(
+                FakeService(), 'unused', None,
+                {'desired_request': self._MakeSampleRequest(
+                    desired_url, 'Sample-{0}'.format(i))})
+
+        lock = threading.Lock()
+        attempts = {}
+        sent_batches = []
+
+        def Reply(unused_http, request, **unused_kwds):
+            names = [name.decode('ascii') for name in
+                     re.findall(br'Sample-\d+', request.body)]
+            parts = []
+            with lock:
+                sent_batches.append(names)
+                for i, name in enumerate(names):
+                    attempt = attempts.get(name, 0)
+                    attempts[name] = attempt + 1
+                    parts.append(textwrap.dedent("""\
+                        content-type: text/plain
+                        content-id: <id+{0}>
+
+                        HTTP/1.1 {1}
+                        {2} content
+
+                        """).format(i, statuses(name, attempt), name))
+            return http_wrapper.Response(
+                info={
+                    'status': '200',
+                    'content-type': 'multipart/mixed; boundary="boundary"',
+                },
+                content=('--boundary\n' + '--boundary\n'.join(parts) +
+                         '--boundary--'),
+                request_url=None)
+
+        with mock.patch.object(http_wrapper, 'MakeRequest',
+                               autospec=True) as mock_request:
+            mock_request.side_effect = Reply
+            responses = batch_api_request.Execute(
+                max_batch_size=3, max_concurrency=3, sleep_between_polls=0,
+                **kwds)
+        return responses, sent_batches
+
+    def testConcurrentBatchesKeepOrder(self):
+        worker_https = []
+
+        def HttpFactory():
+            worker_https.append(FakeHttp())
+            return worker_https[-1]
+
+        responses, sent_batches = self._ExecuteConcurrently(
+            10, lambda name, attempt: '200 OK', http=FakeHttp(),
+            http_factory=HttpFactory)
+
+        self.assertEqual(4, len(sent_batches))
+        self.assertEqual(3, len(worker_https))
+        self.assertEqual(
+            ['Sample-{0} content'.format(i) for i in range(10)],
+            [response.response.content.strip() for response in responses])
+
+    def testConcurrentBatchesRefreshOnce(self):
+        credentials = FakeCredentials()
+
+        def Statuses(unused_name, attempt):
+            return '401 UNAUTHORIZED' if attempt == 0 else '200 OK'
+
+        responses, sent_batches = self._ExecuteConcurrently(
+            10, Statuses, http=FakeHttp(credentials=credentials),
+            http_factory=FakeHttp)
+
+        self.assertEqual(8, len(sent_batches))
+        self.assertEqual(1, credentials.num_refreshes)
+        self.assertFalse(any(response.is_error for response in responses))
+
+    def testConcurrentBatchesRetryOnlyNonTerminal(self):
+
+        def Statuses(name, attempt):
+            if name in ('Sample-1', 'Sample-7') and attempt == 0:
+                return '503 SERVICE UNAVAILABLE'
+            return '200 OK'
+
+        responses, sent_batches = self._ExecuteConcurrently(
+            10, Statuses, retryable_codes=[http_client.SERVICE_UNAVAILABLE],
+            http=FakeHttp(), http_factory=FakeHttp)
+
+        self.assertEqual(5, len(sent_batches))
+        self.assertEqual(['Sample-1', 'Sample-7'], sent_batches[-1])
+        self.assertFalse(any(response.is_error for response in responses))
+
+    def testConcurrentBatchesRaiseErrors(self):
+        desired_url = 'https://www.example.com'
+        batch_api_request = batch.BatchApiRequest(batch_url=desired_url)
+        for i in range(4):
+            batch_api_request.Add(
+                FakeService(), 'unused', None,
+                {'desired_request': self._MakeSampleRequest(
+                    desired_url, 'Sample-{0}'.format(i))})
+
+        with mock.patch.object(http_wrapper, 'MakeRequest',
+                               autospec=True) as mock_request:
+            mock_request.side_effect = exceptions.BadStatusCodeError(
+                {'status': '500'}, 'error', desired_url)
+            with self.assertRaises(exceptions.BadStatusCodeError):
+                batch_api_request.Execute(
+                    FakeHttp(), max_batch_size=1, max_concurrency=2,
+                    http_factory=FakeHttp)
+
     def testNoAttempts(self):
         desired_url = 'https://www.example.com'
         batch_api_request = batch.BatchApiRequest(batch_url=desired_url)
@@ -445,6 +572,39 @@ class BatchTest(unittest.TestCase):
         self.assertEqual(expected_serialized_request,
                          batch_request._SerializeRequest(request))
 
+    def testSerializeBatchMatchesEmailPackage(self):
+        batch_request = batch.BatchHttpRequest('https://www.example.com')
+        batch_request.Add(http_wrapper.Request(
+            url='https://www.example.com/my/path?query=param',
+            http_method='POST',
+            body='{"a": "\u00e9"}\r\nFrom here\n',
+            headers={'content-type': 'application/json; charset=UTF-8',
+                     'X-Spaced': ' two  spaces',
+                     'X-Unicode': u'\u00fcn\u00efcode'}))
+        batch_request.Add(http_wrapper.Request(
+            url='https://www.example.com/other', body=b'bytes'))
+        batch_request.Add(http_wrapper.Request(
+            url='https://www.example.com/empty'))
+
+        boundary, body = batch_request._SerializeBatch()
+        email_boundary, email_body = batch_request._SerializeBatchWithEmail()
+        self.assertEqual(
+            email_body.replace(email_boundary, boundary).encode('utf-8'),
+            body)
+
+    def testSerializeBatchAvoidsBoundaryInBody(self):
+        batch_request = batch.BatchHttpRequest('https://www.example.com')
+        batch_request.Add(http_wrapper.Request(body='placeholder'))
+        _, body = batch_request._SerializeBatch()
+        boundary = body.split(b'\n', 1)[0][2:].decode('ascii')
+
+        batch_request = batch.BatchHttpRequest('https://www.example.com')
+        batch_request.Add(http_wrapper.Request(body='--%s\n' % boundary))
+        with mock.patch.object(batch.generator.Generator, '_make_boundary',
+                               return_value=boundary):
+            new_boundary, _ = batch_request._SerializeBatch()
+        self.assertEqual(boundary + '.0', new_boundary)
+
     def testDeserializeRequest(self):
         serialized_payload = '\n'.join([
             'GET  HTTP/1.1',
@@ -625,6 +785,68 @@ class BatchTest(unittest.TestCase):
             self.assertIn(
                 'response', test_responses['1'].response.content)
 
+    def testInternalExecuteWithFoldedHeader(self):
+        with mock.patch.object(http_wrapper, 'MakeRequest',
+                               autospec=True) as mock_request:
+            self.__ConfigureMock(
+                mock_request,
+                http_wrapper.Request('https://www.example.com', 'POST', {
+                    'content-type': 'multipart/mixed; boundary="None"',
+                    'content-length': 274,
+                }, 'x' * 274),
+                http_wrapper.Response({
+                    'status': '200',
+                    'content-type': 'multipart/mixed; boundary="boundary"',
+                }, textwrap.dedent("""\
+                --boundary
+                content-type: text/plain
+                content-id:
+                 <id+1>
+
+                HTTP/1.1 200 OK
+                response
+                --boundary--"""), None))
+
+            batch_request = batch.BatchHttpRequest('https://www.example.com')
+            batch_request.Add(http_wrapper.Request(body='first'))
+            batch_request.Add(http_wrapper.Request(body='second'))
+
+            # The email package is used for headers it can unfold.
+            with mock.patch.object(batch, '_MultipartParser',
+                                   wraps=batch._MultipartParser) as parser:
+                batch_request._Execute(FakeHttp())
+            self.assertEqual(1, parser.call_count)
+
+            test_responses = (
+                batch_request._BatchHttpRequest__request_response_handlers)
+            self.assertIsNone(test_responses['0'].response)
+            self.assertEqual('response', test_responses['1'].response.content)
+
+    def testMultipartParserFeedsPartsIncrementally(self):
+        parts = []
+        parser = batch._MultipartParser(
+            b'boundary', lambda *part: parts.append(part))
+
+        parser.Feed(b'preamble\r\n--boundary\r\ncontent-id: <a+0>\r\n\r\n')
+        parser.Feed(b'HTTP/1.1 200 OK\r\n\r\nfirst\r\n--boun')
+        self.assertEqual([], parts)
+        parser.Feed(b'dary\r')
+        self.assertEqual([], parts)
+        parser.Feed(b'\ncontent-id: <a+1>\r\n\r\nsecond --boundary\r\n')
+        self.assertEqual(
+            [([(b'content-id', b'<a+0>')], b'HTTP/1.1 200 OK\r\n\r\nfirst')],
+            parts)
+        parser.Feed(b'--boundary-- \r\nepilogue')
+        parser.Close()
+        self.assertEqual(
+            ([(b'content-id', b'<a+1>')], b'second --boundary'), parts[1])
+
+    def testMultipartParserRequiresClosingDelimiter(self):
+        parser = batch._MultipartParser(b'boundary', lambda *part: None)
+        parser.Feed(b'--boundary\r\n\r\nbody\r\n')
+        with self.assertRaises(exceptions.BatchError):
+            parser.Close()
+
     def testPublicExecute(self):
 
         def LocalCallback(response, exception):
@@ -65,10 +65,15 @@ class BufferedStream(object):
                 (size, self.__stream, self.__start_pos, self.__end_pos,
                  self._bytes_remaining))
 
-        data = ''
+        # Slicing keeps the type of the wrapped stream's reads; a
+        # memoryview is sliced without copying.
+        data = self.__buffered_data[0:0]
         if self._bytes_remaining:
             size = min(size, self._bytes_remaining)
-            data = self.__buffered_data[
-                self.__buffer_pos:self.__buffer_pos + size]
+            if self.__buffer_pos == 0 and size == len(self.__buffered_data):
+                data = self.__buffered_data
+            else:
+                data = self.__buffered_data[
+                    self.__buffer_pos:self.__buffer_pos + size]
             self.__buffer_pos += size
         return data
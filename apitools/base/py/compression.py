@@ -17,6 +17,13 @@
 """Compression support for apitools."""
 
 from collections import deque
+import struct
+import sys
+import threading
+import time
+import zlib
+
+import six
 
 from apitools.base.py import gzip
 
@@ -28,7 +35,7 @@ __all__ = [
 # pylint: disable=invalid-name
 # Note: Apitools only uses the default chunksize when compressing.
 def CompressStream(in_stream, length=None, compresslevel=2,
-                   chunksize=16777216):
+                   chunksize=16777216, num_threads=None):
 
     """Compresses an input stream into a file-like buffer.
 
@@ -60,6 +67,8 @@ def CompressStream(in_stream, length=None, compresslevel=2,
         chunksize: Optional, defaults to 16MiB. The chunk size used when
             reading data from the input stream to write into the output
             buffer.
+        num_threads: Optional. If greater than 1, each chunk is compressed
+            by a ParallelGzipFile on this many threads.
 
     Returns:
         A file-like output buffer of compressed bytes, the number of bytes read
@@ -69,9 +78,13 @@ def CompressStream(in_stream, length=None, compresslevel=2,
     in_read = 0
     in_exhausted = False
     out_stream = StreamingBuffer()
-    with gzip.GzipFile(mode='wb',
-                       fileobj=out_stream,
-                       compresslevel=compresslevel) as compress_stream:
+    if num_threads is not None and num_threads > 1:
+        gzip_file = ParallelGzipFile(out_stream, compresslevel=compresslevel,
+                                     num_threads=num_threads)
+    else:
+        gzip_file = gzip.GzipFile(mode='wb', fileobj=out_stream,
+                                  compresslevel=compresslevel)
+    with gzip_file as compress_stream:
         # Read until we've written at least length bytes to the output stream.
         while not length or out_stream.length < length:
             data = in_stream.read(chunksize)
@@ -85,6 +98,175 @@ def CompressStream(in_stream, length=None, compresslevel=2,
     return out_stream, in_read, in_exhausted
 
 
+def _Gf2MatrixTimes(matrix, vector):
+    """Multiply a 32x32 matrix over GF(2), given by columns, by vector."""
+    total = 0
+    column = 0
+    while vector:
+        if vector & 1:
+            total ^= matrix[column]
+        vector >>= 1
+        column += 1
+    return total
+
+
+def _Gf2MatrixMultiply(a, b):
+    return [_Gf2MatrixTimes(a, column) for column in b]
+
+
+def _Crc32ZerosOperator(length):
+    """Return the matrix appending length zero bytes to a CRC-32.
+
+    This is the operator zlib's crc32_combine applies, so that
+    _Gf2MatrixTimes(_Crc32ZerosOperator(len(b)), crc32(a)) ^ crc32(b)
+    is crc32(a + b).
+    """
+    # The operator for one zero bit, squared three times for one byte.
+    power = [0xedb88320] + [1 << n for n in range(31)]
+    for _ in range(3):
+        power = _Gf2MatrixMultiply(power, power)
+    operator = [1 << n for n in range(32)]
+    while length:
+        if length & 1:
+            operator = _Gf2MatrixMultiply(power, operator)
+        power = _Gf2MatrixMultiply(power, power)
+        length >>= 1
+    return operator
+
+
+class ParallelGzipFile(object):
+
+    """Writes a single gzip member, deflating blocks on several threads.
+
+    Like pigz, each write is split into blocks of block_size bytes,
+    which are deflated concurrently (zlib releases the GIL) and joined
+    with sync flushes into one deflate stream. Each block is primed with
+    the 32KiB of input before it, so the ratio stays close to that of
+    GzipFile. The CRC-32 of the blocks is combined without reading the
+    data again.
+
+    This supports the subset of the GzipFile interface that
+    CompressStream uses: write, close and use as a context manager.
+    """
+
+    _DICTIONARY_SIZE = 32768
+
+    def __init__(self, fileobj, compresslevel=9, num_threads=4,
+                 block_size=131072):
+        self.__fileobj = fileobj
+        self.__compresslevel = compresslevel
+        self.__num_threads = num_threads
+        self.__block_size = block_size
+        self.__crc = 0
+        self.__size = 0
+        self.__dictionary = b''
+        # Map from block length to its _Crc32ZerosOperator.
+        self.__crc_operators = {}
+        self.__closed = False
+        self.__WriteHeader()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *unused_args):
+        self.close()
+
+    def __WriteHeader(self):
+        if self.__compresslevel == 9:
+            extra_flags = 2
+        elif self.__compresslevel == 1:
+            extra_flags = 4
+        else:
+            extra_flags = 0
+        # Magic, deflate, no flags, mtime, extra flags, unknown OS.
+        self.__fileobj.write(struct.pack(
+            '<BBBBLBB', 0x1f, 0x8b, 8, 0, int(time.time()), extra_flags, 255))
+
+    def __Compressor(self, dictionary):
+        if dictionary and six.PY3:
+            return zlib.compressobj(
+                self.__compresslevel, zlib.DEFLATED, -zlib.MAX_WBITS,
+                zlib.DEF_MEM_LEVEL, zlib.Z_DEFAULT_STRATEGY, dictionary)
+        return zlib.compressobj(
+            self.__compresslevel, zlib.DEFLATED, -zlib.MAX_WBITS)
+
+    def __CompressBlock(self, data, start):
+        """Return the deflated block of data at start, and its CRC-32."""
+        block = data[start:start + self.__block_size]
+        if start:
+            dictionary = data[max(0, start - self._DICTIONARY_SIZE):start]
+        else:
+            dictionary = self.__dictionary
+        compressor = self.__Compressor(bytes(dictionary))
+        deflated = (compressor.compress(block) +
+                    compressor.flush(zlib.Z_SYNC_FLUSH))
+        return deflated, zlib.crc32(block) & 0xffffffff, len(block)
+
+    def __CombineCrc(self, crc, length):
+        operator = self.__crc_operators.get(length)
+        if operator is None:
+            operator = self.__crc_operators[length] = _Crc32ZerosOperator(
+                length)
+        self.__crc = _Gf2MatrixTimes(operator, self.__crc) ^ crc
+
+    def write(self, data):  # pylint: disable=invalid-name
+        """Compress data and write it to the underlying file."""
+        if self.__closed:
+            raise ValueError('write() on closed ParallelGzipFile')
+        data = memoryview(data)
+        starts = six.moves.queue.Queue()
+        for start in range(0, len(data), self.__block_size):
+            starts.put(start)
+        blocks = {}
+        errors = []
+
+        def CompressBlocks():
+            while not errors:
+                try:
+                    start = starts.get_nowait()
+                except six.moves.queue.Empty:
+                    return
+                try:
+                    blocks[start] = self.__CompressBlock(data, start)
+                # Hand the failure to the writing thread.
+                # pylint: disable=broad-except
+                except Exception:
+                    errors.append(sys.exc_info())
+                    return
+
+        workers = []
+        for _ in range(min(self.__num_threads, starts.qsize())):
+            worker = threading.Thread(target=CompressBlocks)
+            worker.daemon = True
+            worker.start()
+            workers.append(worker)
+        for worker in workers:
+            worker.join()
+        if errors:
+            six.reraise(*errors[0])
+        for start in sorted(blocks):
+            deflated, crc, length = blocks[start]
+            self.__fileobj.write(deflated)
+            self.__CombineCrc(crc, length)
+        self.__size += len(data)
+        if len(data) >= self._DICTIONARY_SIZE:
+            self.__dictionary = data[-self._DICTIONARY_SIZE:].tobytes()
+        else:
+            self.__dictionary = (self.__dictionary +
+                                 data.tobytes())[-self._DICTIONARY_SIZE:]
+        return len(data)
+
+    def close(self):
+        """Finish the deflate stream and write the gzip trailer."""
+        if self.__closed:
+            return
+        self.__closed = True
+        # An empty final block ends the deflate stream.
+        self.__fileobj.write(self.__Compressor(b'').flush(zlib.Z_FINISH))
+        self.__fileobj.write(struct.pack(
+            '<LL', self.__crc, self.__size & 0xffffffff))
+
+
 class StreamingBuffer(object):
 
     """Provides a file-like object that writes to a temporary buffer.
@@ -17,6 +17,7 @@
 """Tests for compression."""
 
 import unittest
+import zlib
 
 from apitools.base.py import compression
 from apitools.base.py import gzip
@@ -98,6 +99,45 @@ class CompressionTest(unittest.TestCase):
         # Ensure the input stream was exhausted.
         self.assertTrue(exhausted)
 
+    def testParallelCompressionIntegrity(self):
+        """Test that data compressed on several threads decompresses."""
+        output, read, exhausted = compression.CompressStream(
+            self.stream,
+            self.length,
+            9,
+            num_threads=4)
+        with gzip.GzipFile(fileobj=output) as f:
+            self.assertEqual(f.read(), self.sample_data)
+        self.assertEqual(read, self.length)
+        self.assertTrue(exhausted)
+
+
+class ParallelGzipFileTest(unittest.TestCase):
+
+    def testCrc32ZerosOperator(self):
+        # pylint: disable=protected-access
+        first, second = b'apitools' * 1000, b'compression' * 77
+        operator = compression._Crc32ZerosOperator(len(second))
+        combined = compression._Gf2MatrixTimes(
+            operator, zlib.crc32(first)) ^ zlib.crc32(second)
+        self.assertEqual(zlib.crc32(first + second) & 0xffffffff, combined)
+
+    def testBlocksAcrossWrites(self):
+        """Test a single gzip member is written for many blocks and writes."""
+        data = b''.join(six.int2byte(i % 251) * (i % 7) for i in range(50000))
+        output = six.BytesIO()
+        with compression.ParallelGzipFile(
+                output, compresslevel=6, num_threads=3,
+                block_size=1000) as gzip_file:
+            for start in range(0, len(data), 12345):
+                gzip_file.write(data[start:start + 12345])
+        self.assertEqual(data, zlib.decompress(output.getvalue(), 31))
+
+    def testEmpty(self):
+        output = six.BytesIO()
+        compression.ParallelGzipFile(output).close()
+        self.assertEqual(b'', zlib.decompress(output.getvalue(), 31))
+
 
 class StreamingBufferTest(unittest.TestCase):
 
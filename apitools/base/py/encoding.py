@@ -35,4 +35,5 @@ __all__ = [
     'AddCustomJsonFieldMapping',
     'GetCustomJsonEnumMapping',
     'AddCustomJsonEnumMapping',
+    'PartialResponseFields',
 ]
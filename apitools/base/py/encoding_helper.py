@@ -18,8 +18,8 @@
 
 import base64
 import collections
+import copy
 import datetime
-import json
 
 import six
 
@@ -70,22 +70,36 @@ class ProtoEdge(collections.namedtuple('ProtoEdge',
 # TODO(craigcitro): Make these non-global.
 _UNRECOGNIZED_FIELD_MAPPINGS = {}
 _CUSTOM_MESSAGE_CODECS = {}
+_CUSTOM_MESSAGE_PY_CODECS = {}
 _CUSTOM_FIELD_CODECS = {}
 _FIELD_TYPE_CODECS = {}
+_CODEC_GENERATION = 0
 
 
 def MapUnrecognizedFields(field_name):
     """Register field_name as a container for unrecognized fields."""
     def Register(cls):
         _UNRECOGNIZED_FIELD_MAPPINGS[cls] = field_name
+        _InvalidateCodecPlans()
         return cls
     return Register
 
 
-def RegisterCustomMessageCodec(encoder, decoder):
-    """Register a custom encoder/decoder for this message class."""
+def RegisterCustomMessageCodec(encoder, decoder, py_encoder=None,
+                               py_decoder=None):
+    """Register a custom encoder/decoder for this message class.
+
+    The encoder and decoder convert between a message and a JSON string.
+    If py_encoder and py_decoder are provided, they convert between a
+    message and the equivalent python value, as passed to json.dumps or
+    returned by json.loads; they are used for nested instances of this
+    class to avoid going through a JSON string.
+    """
     def Register(cls):
         _CUSTOM_MESSAGE_CODECS[cls] = _Codec(encoder=encoder, decoder=decoder)
+        _CUSTOM_MESSAGE_PY_CODECS[cls] = _Codec(
+            encoder=py_encoder, decoder=py_decoder)
+        _InvalidateCodecPlans()
         return cls
     return Register
 
@@ -94,6 +108,7 @@ def RegisterCustomFieldCodec(encoder, decoder):
     """Register a custom encoder/decoder for this field."""
     def Register(field):
         _CUSTOM_FIELD_CODECS[field] = _Codec(encoder=encoder, decoder=decoder)
+        _InvalidateCodecPlans()
         return field
     return Register
 
@@ -103,19 +118,41 @@ def RegisterFieldTypeCodec(encoder, decoder):
     def Register(field_type):
         _FIELD_TYPE_CODECS[field_type] = _Codec(
             encoder=encoder, decoder=decoder)
+        _InvalidateCodecPlans()
         return field_type
     return Register
 
 
 def CopyProtoMessage(message):
-    """Make a deep copy of a message."""
-    return JsonToMessage(type(message), MessageToJson(message))
+    """Make a deep copy of a message.
+
+    This copies field values directly, and is equivalent to
+    copy.deepcopy(message). Use copy.copy(message) for a shallow copy,
+    which shares nested messages with the original.
+    """
+    return copy.deepcopy(message)
+
 
+def MessageToJson(message, include_fields=None, sort_keys=False):
+    """Convert the given message to JSON.
 
-def MessageToJson(message, include_fields=None):
-    """Convert the given message to JSON."""
-    result = _ProtoJsonApiTools.Get().encode_message(message)
-    return _IncludeFields(result, message, include_fields)
+    Args:
+      message: The message to encode.
+      include_fields: (default: None) Dotted field paths to include in
+          the output as null (or []) even if they are unset.
+      sort_keys: (default: False) If True, sort the keys of each JSON
+          object, for output which is stable across field definition
+          order. Otherwise keys follow the message's field order.
+
+    Returns:
+      The JSON encoding of message.
+    """
+    codec = _ProtoJsonApiTools.Get()
+    if include_fields is None:
+        return codec.encode_message(message, sort_keys=sort_keys)
+    result = codec.encode_dictionary(message)
+    _IncludeFields(result, message, include_fields)
+    return protojson.get_json_backend().dumps(result, sort_keys=sort_keys)
 
 
 def JsonToMessage(message_type, message):
@@ -123,15 +160,14 @@ def JsonToMessage(message_type, message):
     return _ProtoJsonApiTools.Get().decode_message(message_type, message)
 
 
-# TODO(craigcitro): Do this directly, instead of via JSON.
 def DictToMessage(d, message_type):
     """Convert the given dictionary to a message of type message_type."""
-    return JsonToMessage(message_type, json.dumps(d))
+    return _ProtoJsonApiTools.Get().decode_dictionary(message_type, d)
 
 
 def MessageToDict(message):
     """Convert the given message to a dictionary."""
-    return json.loads(MessageToJson(message))
+    return protojson.get_json_backend().loads(MessageToJson(message))
 
 
 def DictToAdditionalPropertyMessage(properties, additional_property_type,
@@ -149,12 +185,12 @@ def DictToAdditionalPropertyMessage(properties, additional_property_type,
 
 def PyValueToMessage(message_type, value):
     """Convert the given python value to a message of type message_type."""
-    return JsonToMessage(message_type, json.dumps(value))
+    return _ProtoJsonApiTools.Get().decode_dictionary(message_type, value)
 
 
 def MessageToPyValue(message):
     """Convert the given message to a python value."""
-    return json.loads(MessageToJson(message))
+    return protojson.get_json_backend().loads(MessageToJson(message))
 
 
 def MessageToRepr(msg, multiline=False, **kwargs):
@@ -263,10 +299,7 @@ def _SetField(dictblob, field_path, value):
 
 
 def _IncludeFields(encoded_message, message, include_fields):
-    """Add the requested fields to the encoded message."""
-    if include_fields is None:
-        return encoded_message
-    result = json.loads(encoded_message)
+    """Add the requested fields to the encoded message dictionary."""
     for field_name in include_fields:
         try:
             value = _GetField(message, field_name.split('.'))
@@ -277,8 +310,7 @@ def _IncludeFields(encoded_message, message, include_fields):
             raise exceptions.InvalidDataError(
                 'No field named %s in message of type %s' % (
                     field_name, type(message)))
-        _SetField(result, field_name.split('.'), nullvalue)
-    return json.dumps(result)
+        _SetField(encoded_message, field_name.split('.'), nullvalue)
 
 
 def _GetFieldCodecs(field, attr):
@@ -289,6 +321,97 @@ def _GetFieldCodecs(field, attr):
     return [x for x in result if x is not None]
 
 
+# Codec plans, keyed by field and by message class. These only depend on
+# the registrations above and the custom JSON mappings below, so they're
+# built on first use and dropped whenever any of those change.
+_FIELD_PLANS = {}
+_MESSAGE_PLANS = {}
+
+
+def _InvalidateCodecPlans():
+    global _CODEC_GENERATION  # pylint: disable=global-statement
+    _CODEC_GENERATION += 1
+    _FIELD_PLANS.clear()
+    _MESSAGE_PLANS.clear()
+
+
+def GetCodecGeneration():
+    """Return a number that changes whenever a codec or mapping is added.
+
+    Callers caching anything derived from the registered codecs and
+    custom JSON mappings can compare this to know when to rebuild.
+    """
+    return _CODEC_GENERATION
+
+
+class _FieldPlan(object):
+
+    """How to encode and decode values for a field."""
+
+    def __init__(self, field):
+        self.field = field
+        self.name = field.name
+        self.number = field.number
+        self.repeated = field.repeated
+        self.encoders = _GetFieldCodecs(field, 'encoder')
+        self.decoders = _GetFieldCodecs(field, 'decoder')
+        self.is_enum = isinstance(field, messages.EnumField)
+        self.enum_json_names = {}
+        self.enum_python_names = {}
+        if self.is_enum:
+            self.enum_json_names = dict(
+                _JSON_ENUM_MAPPINGS.get(field.type, {}))
+            self.enum_python_names = dict(
+                (json_name, python_name) for python_name, json_name
+                in self.enum_json_names.items())
+        self.message_type = None
+        if isinstance(field, messages.MessageField):
+            self.message_type = field.message_type
+        # DateTimeFields are MessageFields, but are encoded as strings.
+        self.encodes_message = (
+            self.message_type is not None and
+            not isinstance(field, message_types.DateTimeField))
+        # Values of these fields are the same in python and JSON. (In
+        # python 3, StringFields may hold bytes, which json can't encode.)
+        self.encode_as_is = isinstance(field, (messages.BooleanField,
+                                               messages.FloatField,
+                                               messages.IntegerField))
+        self.decode_as_is = isinstance(field, (messages.BooleanField,
+                                               messages.StringField))
+
+
+def _GetFieldPlan(field):
+    plan = _FIELD_PLANS.get(field)
+    if plan is None:
+        plan = _FIELD_PLANS[field] = _FieldPlan(field)
+    return plan
+
+
+class _MessagePlan(object):
+
+    """How to encode and decode messages of a given class."""
+
+    def __init__(self, message_type):
+        self.codec = _CUSTOM_MESSAGE_CODECS.get(message_type)
+        py_codec = _CUSTOM_MESSAGE_PY_CODECS.get(message_type)
+        self.py_encoder = getattr(py_codec, 'encoder', None)
+        self.py_decoder = getattr(py_codec, 'decoder', None)
+        if self.codec is not None:
+            self.fields = []
+        else:
+            self.fields = [_GetFieldPlan(field)
+                           for field in message_type.all_fields()]
+        self.field_names = frozenset(x.name for x in self.fields)
+        self.enum_fields = [x for x in self.fields if x.is_enum]
+
+
+def _GetMessagePlan(message_type):
+    plan = _MESSAGE_PLANS.get(message_type)
+    if plan is None:
+        plan = _MESSAGE_PLANS[message_type] = _MessagePlan(message_type)
+    return plan
+
+
 class _ProtoJsonApiTools(protojson.ProtoJson):
 
     """JSON encoder used by apitools clients."""
@@ -304,12 +427,32 @@ class _ProtoJsonApiTools(protojson.ProtoJson):
         if message_type in _CUSTOM_MESSAGE_CODECS:
             return _CUSTOM_MESSAGE_CODECS[
                 message_type].decoder(encoded_message)
-        result = _DecodeCustomFieldNames(message_type, encoded_message)
-        result = super(_ProtoJsonApiTools, self).decode_message(
+        return super(_ProtoJsonApiTools, self).decode_message(
+            message_type, encoded_message)
+
+    def decode_dictionary(self, message_type, dictionary):
+        """Decode the given parsed JSON value as a message_type.
+
+        Args:
+          message_type: the Message class to decode to.
+          dictionary: a python value, as returned by json.loads. This is
+              a dict unless message_type has a custom message codec.
+
+        Returns:
+          An instance of message_type.
+        """
+        plan = _GetMessagePlan(message_type)
+        if plan.codec is not None:
+            if plan.py_decoder is not None:
+                return plan.py_decoder(dictionary)
+            return plan.codec.decoder(
+                protojson.get_json_backend().dumps(dictionary))
+        result = _DecodeCustomFieldNames(message_type, dictionary)
+        result = super(_ProtoJsonApiTools, self).decode_dictionary(
             message_type, result)
-        result = _ProcessUnknownEnums(result, encoded_message)
-        result = _ProcessUnknownMessages(result, encoded_message)
-        return _DecodeUnknownFields(result, encoded_message)
+        result = _ProcessUnknownEnums(result, dictionary)
+        result = _ProcessUnknownMessages(result, dictionary)
+        return _DecodeUnknownFields(result, dictionary)
 
     def decode_field(self, field, value):
         """Decode the given JSON value.
@@ -321,42 +464,110 @@ class _ProtoJsonApiTools(protojson.ProtoJson):
         Returns:
           A value suitable for assignment to field.
         """
-        for decoder in _GetFieldCodecs(field, 'decoder'):
+        plan = _GetFieldPlan(field)
+        for decoder in plan.decoders:
             result = decoder(field, value)
             value = result.value
             if result.complete:
                 return value
-        if isinstance(field, messages.MessageField):
-            field_value = self.decode_message(
-                field.message_type, json.dumps(value))
-        elif isinstance(field, messages.EnumField):
-            value = GetCustomJsonEnumMapping(
-                field.type, json_name=value) or value
+        if plan.message_type is not None:
+            return self.decode_dictionary(plan.message_type, value)
+        if plan.decode_as_is:
+            return value
+        if plan.is_enum:
+            if isinstance(value, six.string_types):
+                value = plan.enum_python_names.get(value, value)
             try:
-                field_value = super(
+                return super(
                     _ProtoJsonApiTools, self).decode_field(field, value)
             except messages.DecodeError:
                 if not isinstance(value, six.string_types):
                     raise
-                field_value = None
-        else:
-            field_value = super(
-                _ProtoJsonApiTools, self).decode_field(field, value)
-        return field_value
+                return None
+        return super(_ProtoJsonApiTools, self).decode_field(field, value)
 
-    def encode_message(self, message):
-        if isinstance(message, messages.FieldList):
-            return '[%s]' % (', '.join(self.encode_message(x)
-                                       for x in message))
+    def encode_message(self, message, sort_keys=False):
+        """Encode the given message as a JSON string.
 
+        The message is converted to python values in a single walk
+        (see encode_dictionary) and serialized once.
+
+        Args:
+          message: the Message (or FieldList of messages) to encode.
+          sort_keys: (default: False) If True, sort the keys of each
+              JSON object.
+
+        Returns:
+          The JSON encoding of message.
+        """
         # pylint: disable=unidiomatic-typecheck
         if type(message) in _CUSTOM_MESSAGE_CODECS:
             return _CUSTOM_MESSAGE_CODECS[type(message)].encoder(message)
+        return protojson.get_json_backend().dumps(
+            self.encode_dictionary(message), sort_keys=sort_keys)
+
+    def encode_dictionary(self, message):
+        """Encode the given message as a python value.
 
-        message = _EncodeUnknownFields(message)
-        result = super(_ProtoJsonApiTools, self).encode_message(message)
-        result = _EncodeCustomFieldNames(message, result)
-        return json.dumps(json.loads(result), sort_keys=True)
+        Args:
+          message: the Message (or FieldList of messages) to encode.
+
+        Returns:
+          The value json.loads would return for the JSON encoding of
+          message. This is a dict unless message has a custom message
+          codec, or a list for a FieldList.
+        """
+        if isinstance(message, messages.FieldList):
+            for item in message:
+                item.check_initialized()
+        else:
+            message.check_initialized()
+        return self.__encode_dictionary(message)
+
+    def __encode_dictionary(self, message):
+        if isinstance(message, messages.FieldList):
+            return [self.__encode_dictionary(x) for x in message]
+
+        plan = _GetMessagePlan(type(message))
+        if plan.codec is not None:
+            if plan.py_encoder is not None:
+                return plan.py_encoder(message)
+            return protojson.get_json_backend().loads(
+                plan.codec.encoder(message))
+
+        # pylint: disable=protected-access
+        tags = message._Message__tags
+        result = {}
+        for field_plan in plan.fields:
+            value = tags.get(field_plan.number)
+            if value is None or (field_plan.repeated and not value):
+                continue
+            result[field_plan.name] = self.__encode_field(field_plan, value)
+        # Unrecognized fields are included so that they're preserved when
+        # a message is decoded then encoded.
+        for key in message.all_unrecognized_fields():
+            result[key], _ = message.get_unrecognized_field_info(key)
+        _EncodeUnknownFields(message, result)
+        return _EncodeCustomFieldNames(message, result)
+
+    def __encode_field(self, plan, value):
+        for encoder in plan.encoders:
+            result = encoder(plan.field, value)
+            value = result.value
+            if result.complete:
+                return _JsonSafeValue(value)
+        if plan.is_enum:
+            if plan.repeated:
+                return [plan.enum_json_names.get(e.name) or e.name
+                        for e in value]
+            return plan.enum_json_names.get(value.name) or value.name
+        if plan.encodes_message:
+            # Messages were already checked as part of their parent.
+            return self.__encode_dictionary(value)
+        if plan.encode_as_is:
+            return value
+        return _JsonSafeValue(
+            super(_ProtoJsonApiTools, self).encode_field(plan.field, value))
 
     def encode_field(self, field, value):
         """Encode the given value as JSON.
@@ -368,28 +579,20 @@ class _ProtoJsonApiTools(protojson.ProtoJson):
         Returns:
           A python value suitable for json.dumps.
         """
-        for encoder in _GetFieldCodecs(field, 'encoder'):
-            result = encoder(field, value)
-            value = result.value
-            if result.complete:
-                return value
-        if isinstance(field, messages.EnumField):
-            if field.repeated:
-                remapped_value = [GetCustomJsonEnumMapping(
-                    field.type, python_name=e.name) or e.name for e in value]
-            else:
-                remapped_value = GetCustomJsonEnumMapping(
-                    field.type, python_name=value.name)
-            if remapped_value:
-                return remapped_value
-        if (isinstance(field, messages.MessageField) and
-                not isinstance(field, message_types.DateTimeField)):
-            value = json.loads(self.encode_message(value))
-        return super(_ProtoJsonApiTools, self).encode_field(field, value)
+        return self.__encode_field(_GetFieldPlan(field), value)
+
+
+def _JsonSafeValue(value):
+    """Convert bytes, as produced by field codecs, to text."""
+    if isinstance(value, list):
+        return [_JsonSafeValue(x) for x in value]
+    if six.PY3 and isinstance(value, bytes):
+        return value.decode('utf8')
+    return value
 
 
 # TODO(craigcitro): Fold this and _IncludeFields in as codecs.
-def _DecodeUnknownFields(message, encoded_message):
+def _DecodeUnknownFields(message, decoded_message):
     """Rewrite unknown fields in message into message.destination."""
     destination = _UNRECOGNIZED_FIELD_MAPPINGS.get(type(message))
     if destination is None:
@@ -404,7 +607,7 @@ def _DecodeUnknownFields(message, encoded_message):
     # type being exactly what we suspect (field names, etc).
     if isinstance(pair_type.value, messages.MessageField):
         new_values = _DecodeUnknownMessages(
-            message, json.loads(encoded_message), pair_type)
+            message, decoded_message, pair_type)
     else:
         new_values = _DecodeUnrecognizedFields(message, pair_type)
     setattr(message, destination, new_values)
@@ -414,12 +617,12 @@ def _DecodeUnknownFields(message, encoded_message):
     return message
 
 
-def _DecodeUnknownMessages(message, encoded_message, pair_type):
-    """Process unknown fields in encoded_message of a message type."""
+def _DecodeUnknownMessages(message, decoded_message, pair_type):
+    """Process unknown fields in decoded_message of a message type."""
     field_type = pair_type.value.type
     new_values = []
-    all_field_names = [x.name for x in message.all_fields()]
-    for name, value_dict in six.iteritems(encoded_message):
+    all_field_names = _GetMessagePlan(type(message)).field_names
+    for name, value_dict in six.iteritems(decoded_message):
         if name in all_field_names:
             continue
         value = PyValueToMessage(field_type, value_dict)
@@ -456,33 +659,26 @@ def _DecodeUnrecognizedFields(message, pair_type):
     return new_values
 
 
-def _CopyProtoMessageVanillaProtoJson(message):
-    codec = protojson.ProtoJson()
-    return codec.decode_message(type(message), codec.encode_message(message))
+def _EncodeUnknownFields(message, encoded_message):
+    """Remap unknown fields in message out of message.source.
 
-
-def _EncodeUnknownFields(message):
-    """Remap unknown fields in message out of message.source."""
+    Args:
+      message: Proto message being encoded.
+      encoded_message: Dictionary encoding of message's fields, which
+          is updated in place.
+    """
     source = _UNRECOGNIZED_FIELD_MAPPINGS.get(type(message))
     if source is None:
-        return message
-    # CopyProtoMessage uses _ProtoJsonApiTools, which uses this message. Use
-    # the vanilla protojson-based copy function to avoid infinite recursion.
-    result = _CopyProtoMessageVanillaProtoJson(message)
+        return
     pairs_field = message.field_by_name(source)
     if not isinstance(pairs_field, messages.MessageField):
         raise exceptions.InvalidUserInputError(
             'Invalid pairs field %s' % pairs_field)
-    pairs_type = pairs_field.message_type
-    value_field = pairs_type.field_by_name('value')
-    value_variant = value_field.variant
-    pairs = getattr(message, source)
+    value_field = pairs_field.message_type.field_by_name('value')
+    encoded_message.pop(source, None)
     codec = _ProtoJsonApiTools.Get()
-    for pair in pairs:
-        encoded_value = codec.encode_field(value_field, pair.value)
-        result.set_unrecognized_field(pair.key, encoded_value, value_variant)
-    setattr(result, source, [])
-    return result
+    for pair in getattr(message, source):
+        encoded_message[pair.key] = codec.encode_field(value_field, pair.value)
 
 
 def _SafeEncodeBytes(field, value):
@@ -510,7 +706,7 @@ def _SafeDecodeBytes(unused_field, value):
     return CodecResult(value=result, complete=complete)
 
 
-def _ProcessUnknownEnums(message, encoded_message):
+def _ProcessUnknownEnums(message, decoded_message):
     """Add unknown enum values from encoded_message as unknown fields.
 
     ProtoRPC diverges from the usual protocol buffer behavior here and
@@ -521,26 +717,26 @@ def _ProcessUnknownEnums(message, encoded_message):
 
     Args:
       message: Proto message we've decoded thus far.
-      encoded_message: JSON string we're decoding.
+      decoded_message: Parsed JSON dictionary we're decoding.
 
     Returns:
       message, with any unknown enums stored as unrecognized fields.
     """
-    if not encoded_message:
+    if not decoded_message:
         return message
-    decoded_message = json.loads(six.ensure_str(encoded_message))
-    for field in message.all_fields():
-        if (isinstance(field, messages.EnumField) and
-                field.name in decoded_message):
-            value = message.get_assigned_value(field.name)
-            if ((field.repeated and len(value) != len(decoded_message[field.name])) or
+    for field_plan in _GetMessagePlan(type(message)).enum_fields:
+        name = field_plan.name
+        if name in decoded_message:
+            value = message.get_assigned_value(name)
+            if ((field_plan.repeated and
+                 len(value) != len(decoded_message[name])) or
                     value is None):
                 message.set_unrecognized_field(
-                    field.name, decoded_message[field.name], messages.Variant.ENUM)
+                    name, decoded_message[name], messages.Variant.ENUM)
     return message
 
 
-def _ProcessUnknownMessages(message, encoded_message):
+def _ProcessUnknownMessages(message, decoded_message):
     """Store any remaining unknown fields as strings.
 
     ProtoRPC currently ignores unknown values for which no type can be
@@ -551,18 +747,17 @@ def _ProcessUnknownMessages(message, encoded_message):
 
     Args:
       message: Proto message we've decoded thus far.
-      encoded_message: JSON string we're decoding.
+      decoded_message: Parsed JSON dictionary we're decoding.
 
     Returns:
       message, with any remaining unrecognized fields saved.
     """
-    if not encoded_message:
+    if not decoded_message:
         return message
-    decoded_message = json.loads(six.ensure_str(encoded_message))
-    message_fields = [x.name for x in message.all_fields()] + list(
-        message.all_unrecognized_fields())
+    field_names = _GetMessagePlan(type(message)).field_names
+    unrecognized_fields = set(message.all_unrecognized_fields())
     missing_fields = [x for x in decoded_message.keys()
-                      if x not in message_fields]
+                      if x not in field_names and x not in unrecognized_fields]
     for field_name in missing_fields:
         message.set_unrecognized_field(field_name, decoded_message[field_name],
                                        messages.Variant.STRING)
@@ -600,6 +795,7 @@ def AddCustomJsonEnumMapping(enum_type, python_name, json_name,
     field_mappings = _JSON_ENUM_MAPPINGS.setdefault(enum_type, {})
     _CheckForExistingMappings('enum', enum_type, python_name, json_name)
     field_mappings[python_name] = json_name
+    _InvalidateCodecPlans()
 
 
 def AddCustomJsonFieldMapping(message_type, python_name, json_name,
@@ -628,6 +824,7 @@ def AddCustomJsonFieldMapping(message_type, python_name, json_name,
     field_mappings = _JSON_FIELD_MAPPINGS.setdefault(message_type, {})
     _CheckForExistingMappings('field', message_type, python_name, json_name)
     field_mappings[python_name] = json_name
+    _InvalidateCodecPlans()
 
 
 def GetCustomJsonEnumMapping(enum_type, python_name=None, json_name=None):
@@ -644,6 +841,73 @@ def GetCustomJsonFieldMapping(message_type, python_name=None, json_name=None):
                            mappings=_JSON_FIELD_MAPPINGS)
 
 
+def PartialResponseFields(message_type, field_paths):
+    """Return the partial response fields parameter for field_paths.
+
+    For example, ['items.name', 'items.owner.entity', 'nextPageToken']
+    gives 'items(name,owner(entity)),nextPageToken'. Custom JSON field
+    names are used in place of the python names.
+
+    Args:
+      message_type: (messages.Message) The response message type.
+      field_paths: ([basestring or tuple]) Paths of fields to include,
+          each a dotted string or a tuple of python field names.
+
+    Returns:
+      The value for the fields query parameter.
+
+    Raises:
+      InvalidUserInputError: if a path does not name a field.
+    """
+    # Maps wire names to subtrees, or to None for a whole field.
+    tree = collections.OrderedDict()
+    for path in field_paths:
+        if isinstance(path, six.string_types):
+            path = path.split('.')
+        wire_path = []
+        current_type = message_type
+        for index, name in enumerate(path):
+            if current_type is None:
+                raise exceptions.InvalidUserInputError(
+                    'Field %s of %s has no subfields' % (
+                        '.'.join(path[:index]), message_type.__name__))
+            try:
+                field = current_type.field_by_name(name)
+            except KeyError:
+                if (current_type not in _UNRECOGNIZED_FIELD_MAPPINGS and
+                        current_type not in _CUSTOM_MESSAGE_CODECS):
+                    raise exceptions.InvalidUserInputError(
+                        'No field %s in %s' % (
+                            '.'.join(path[:index + 1]),
+                            message_type.__name__))
+                # Keys of maps and custom encoded messages are not known
+                # in advance.
+                wire_path.extend(path[index:])
+                break
+            wire_path.append(
+                GetCustomJsonFieldMapping(current_type, python_name=name) or
+                name)
+            current_type = (field.type if isinstance(
+                field, messages.MessageField) else None)
+        node = tree
+        for name in wire_path[:-1]:
+            if node.get(name, ()) is None:
+                break
+            node = node.setdefault(name, collections.OrderedDict())
+        else:
+            node[wire_path[-1]] = None
+    return _FormatPartialResponseFields(tree)
+
+
+def _FormatPartialResponseFields(tree):
+    parts = []
+    for name, subtree in tree.items():
+        if subtree is not None:
+            name = '%s(%s)' % (name, _FormatPartialResponseFields(subtree))
+        parts.append(name)
+    return ','.join(parts)
+
+
 def _FetchRemapping(type_name, mapping_type, python_name=None, json_name=None,
                     mappings=None):
     """Common code for fetching a key or value from a remapping dict."""
@@ -686,26 +950,22 @@ def _CheckForExistingMappings(mapping_type, message_type,
 
 
 def _EncodeCustomFieldNames(message, encoded_value):
-    field_remappings = list(_JSON_FIELD_MAPPINGS.get(type(message), {})
-                            .items())
-    if field_remappings:
-        decoded_value = json.loads(encoded_value)
-        for python_name, json_name in field_remappings:
-            if python_name in encoded_value:
-                decoded_value[json_name] = decoded_value.pop(python_name)
-        encoded_value = json.dumps(decoded_value)
+    field_remappings = _JSON_FIELD_MAPPINGS.get(type(message), {})
+    for python_name, json_name in list(field_remappings.items()):
+        if python_name in encoded_value:
+            encoded_value[json_name] = encoded_value.pop(python_name)
     return encoded_value
 
 
-def _DecodeCustomFieldNames(message_type, encoded_message):
+def _DecodeCustomFieldNames(message_type, decoded_message):
     field_remappings = _JSON_FIELD_MAPPINGS.get(message_type, {})
     if field_remappings:
-        decoded_message = json.loads(encoded_message)
+        # Copy, so we don't modify the caller's dictionary.
+        decoded_message = dict(decoded_message)
         for python_name, json_name in list(field_remappings.items()):
             if json_name in decoded_message:
                 decoded_message[python_name] = decoded_message.pop(json_name)
-        encoded_message = json.dumps(decoded_message)
-    return encoded_message
+    return decoded_message
 
 
 def _AsMessageList(msg):
@@ -19,6 +19,8 @@ import json
 import sys
 import unittest
 
+import mock
+
 from apitools.base.protorpclite import message_types
 from apitools.base.protorpclite import messages
 from apitools.base.protorpclite import util
@@ -240,6 +242,35 @@ encoding.AddCustomJsonFieldMapping(MessageWithRemappings,
 
 class EncodingTest(unittest.TestCase):
 
+    def testPartialResponseFields(self):
+        self.assertEqual(
+            'nested(nested(additionalProperties,key1,key2),nested_list)',
+            encoding.PartialResponseFields(ExtraNestedMessage, [
+                'nested.nested.additionalProperties',
+                ('nested', 'nested', 'key1'),
+                'nested.nested.key2',
+                'nested.nested_list',
+            ]))
+        self.assertEqual(
+            'doubleEncoding,anotherField,enum_field',
+            encoding.PartialResponseFields(MessageWithRemappings, [
+                'double_encoding', 'another_field', 'enum_field']))
+        # A whole field includes all of its subfields.
+        self.assertEqual(
+            'msg_field',
+            encoding.PartialResponseFields(RepeatedNestedMessage, [
+                'msg_field.field', 'msg_field', 'msg_field.field']))
+
+    def testPartialResponseFieldsInvalid(self):
+        with self.assertRaises(exceptions.InvalidUserInputError):
+            encoding.PartialResponseFields(ExtraNestedMessage, ['missing'])
+        with self.assertRaises(exceptions.InvalidUserInputError):
+            encoding.PartialResponseFields(
+                ExtraNestedMessage, ['nested.nested_list.value'])
+        with self.assertRaises(exceptions.InvalidUserInputError):
+            encoding.PartialResponseFields(
+                MessageWithRemappings, ['anotherField'])
+
     def testCopyProtoMessage(self):
         msg = SimpleMessage(field='abc')
         new_msg = encoding.CopyProtoMessage(msg)
@@ -304,6 +335,35 @@ class EncodingTest(unittest.TestCase):
                     'field_three', value_default=None),
                 (['VALUE_ONE', 'BAD_VALUE'], messages.Variant.ENUM))
 
+    def testCopyProtoMessageDoesNotSerialize(self):
+        msg = ExtraNestedMessage(nested=HasNestedMessage(
+            nested=AdditionalPropertiesMessage(additionalProperties=[
+                AdditionalPropertiesMessage.AdditionalProperty(
+                    key='key', value='value')]),
+            nested_list=['a']))
+        msg.set_unrecognized_field('extra', {'a': [1]},
+                                   messages.Variant.STRING)
+        with mock.patch.object(encoding, 'MessageToJson') as to_json:
+            new_msg = encoding.CopyProtoMessage(msg)
+        self.assertFalse(to_json.called)
+        self.assertEqual(msg, new_msg)
+        self.assertIsNot(msg.nested, new_msg.nested)
+        self.assertIsNot(msg.nested.nested_list, new_msg.nested.nested_list)
+        new_msg.nested.nested_list.append('b')
+        self.assertEqual(['a'], msg.nested.nested_list)
+        self.assertEqual(({'a': [1]}, messages.Variant.STRING),
+                         new_msg.get_unrecognized_field_info('extra'))
+        self.assertIsNot(msg.get_unrecognized_field_info('extra')[0],
+                         new_msg.get_unrecognized_field_info('extra')[0])
+
+    def testCopyProtoMessageDateTimeAndBytes(self):
+        msg = BytesMessage(field=b'\x00\xff', repfield=[b'a'])
+        self.assertEqual(msg, encoding.CopyProtoMessage(msg))
+        msg = TimeMessage(timefield=datetime.datetime(
+            2020, 1, 2, 3, 4, 5, 6, tzinfo=util.TimeZoneOffset(0)))
+        self.assertEqual(msg.timefield,
+                         encoding.CopyProtoMessage(msg).timefield)
+
     def testBytesEncoding(self):
         b64_str = 'AAc+'
         b64_msg = '{"field": "%s"}' % b64_str
@@ -431,6 +491,51 @@ class EncodingTest(unittest.TestCase):
             encoding.MessageToJson(
                 msg, include_fields=['nested.nested.additionalProperties']))
 
+    def testSortKeys(self):
+        msg = MessageWithRemappings(
+            repeated_field=['abc'],
+            another_field='def',
+            enum_field=MessageWithRemappings.SomeEnum.enum_value)
+        self.assertEqual(
+            '{"anotherField": "def", "enum_field": "wire_name", '
+            '"repeatedField": ["abc"]}',
+            encoding.MessageToJson(msg, sort_keys=True))
+        msg = SimpleMessage(repfield=['abc'])
+        self.assertEqual(
+            '{"repfield": ["abc"], "field": null}',
+            encoding.MessageToJson(msg, include_fields=['field']))
+        self.assertEqual(
+            '{"field": null, "repfield": ["abc"]}',
+            encoding.MessageToJson(
+                msg, include_fields=['field'], sort_keys=True))
+
+    def testEncodeNestedInOnePass(self):
+        msg = RepeatedNestedMessage(msg_field=[
+            SimpleMessage(field='a', repfield=['b']),
+            SimpleMessage(field='c'),
+        ])
+        with mock.patch.object(json, 'loads',
+                               side_effect=AssertionError('loads called')):
+            with mock.patch.object(json, 'dumps',
+                                   wraps=json.dumps) as dumps:
+                encoded_msg = encoding.MessageToJson(msg)
+        self.assertEqual(1, dumps.call_count)
+        self.assertEqual(
+            {'msg_field': [{'field': 'a', 'repfield': ['b']},
+                           {'field': 'c'}]},
+            json.loads(encoded_msg))
+
+    def testEncodeNestedJsonValue(self):
+        msg = RepeatedJsonValueMessage(additionalProperties=[
+            RepeatedJsonValueMessage.AdditionalProperty(
+                key='a', value=[extra_types.JsonValue(integer_value=1),
+                                extra_types.JsonValue(string_value='b')]),
+        ])
+        with mock.patch.object(json, 'loads',
+                               side_effect=AssertionError('loads called')):
+            encoded_msg = encoding.MessageToJson(msg)
+        self.assertEqual('{"a": [1, "b"]}', encoded_msg)
+
     def testAdditionalPropertyMapping(self):
         msg = AdditionalPropertiesMessage()
         msg.additionalProperties = [
@@ -580,6 +685,49 @@ class EncodingTest(unittest.TestCase):
         self.assertEqual(
             msg, encoding.JsonToMessage(MessageWithRemappings, json_message))
 
+    def testLateFieldRemapping(self):
+
+        class LateRemappingMessage(messages.Message):
+
+            class SomeEnum(messages.Enum):
+                enum_value = 1
+
+            field = messages.StringField(1)
+            enum_field = messages.EnumField(SomeEnum, 2)
+
+        msg = LateRemappingMessage(
+            field='abc',
+            enum_field=LateRemappingMessage.SomeEnum.enum_value)
+        self.assertEqual('{"enum_field": "enum_value", "field": "abc"}',
+                         encoding.MessageToJson(msg, sort_keys=True))
+        encoding.AddCustomJsonFieldMapping(
+            LateRemappingMessage, 'field', 'wireField')
+        encoding.AddCustomJsonEnumMapping(
+            LateRemappingMessage.SomeEnum, 'enum_value', 'wire_value')
+        json_message = encoding.MessageToJson(msg, sort_keys=True)
+        self.assertEqual('{"enum_field": "wire_value", "wireField": "abc"}',
+                         json_message)
+        self.assertEqual(
+            msg, encoding.JsonToMessage(LateRemappingMessage, json_message))
+
+    def testLateCustomFieldCodec(self):
+
+        class LateCodecMessage(messages.Message):
+            field = messages.StringField(1)
+
+        msg = LateCodecMessage(field='abc')
+        self.assertEqual('{"field": "abc"}', encoding.MessageToJson(msg))
+        self.assertEqual(
+            msg, encoding.JsonToMessage(LateCodecMessage, '{"field": "abc"}'))
+        encoding.RegisterCustomFieldCodec(
+            lambda unused_field, value: encoding.CodecResult(
+                value=value.upper(), complete=True),
+            lambda unused_field, value: encoding.CodecResult(
+                value=value.lower(), complete=True))(LateCodecMessage.field)
+        self.assertEqual('{"field": "ABC"}', encoding.MessageToJson(msg))
+        self.assertEqual(
+            msg, encoding.JsonToMessage(LateCodecMessage, '{"field": "ABC"}'))
+
     def testFieldRemapping(self):
         msg = MessageWithRemappings(another_field='abc')
         json_message = encoding.MessageToJson(msg)
@@ -703,6 +851,57 @@ class EncodingTest(unittest.TestCase):
             'timefield=datetime.datetime(2014, 7, 2, 23, 33, 25, 541000, '
             'tzinfo=TimeZoneOffset(datetime.timedelta(0))),\n)')
 
+    def testDecodeNestedWithoutReserializing(self):
+        json_message = json.dumps({
+            'nested': {
+                'nested': {'key_one': 'value_one'},
+                'nested_list': ['a', 'b'],
+            },
+        })
+        with mock.patch.object(json, 'dumps',
+                               side_effect=AssertionError('dumps called')):
+            msg = encoding.JsonToMessage(ExtraNestedMessage, json_message)
+        self.assertEqual(['a', 'b'], msg.nested.nested_list)
+        self.assertEqual(
+            [AdditionalPropertiesMessage.AdditionalProperty(
+                key='key_one', value='value_one')],
+            msg.nested.nested.additionalProperties)
+
+    def testDictToMessageNested(self):
+        value = {
+            'msg_field': {
+                'field_one': 'VALUE_ONE',
+                'field_three': ['VALUE_TWO', 'BAD_VALUE'],
+            },
+            'enum_field': 'VALUE_TWO',
+            'extra': {'a': 1},
+        }
+        msg = encoding.DictToMessage(value, NestedWithEnumMessage)
+        self.assertEqual(MessageWithEnum.ThisEnum.VALUE_ONE,
+                         msg.msg_field.field_one)
+        self.assertEqual(
+            (['VALUE_TWO', 'BAD_VALUE'], messages.Variant.ENUM),
+            msg.msg_field.get_unrecognized_field_info('field_three'))
+        self.assertEqual(value, encoding.MessageToDict(msg))
+
+    def testDictToMessageRemapping(self):
+        value = {'anotherField': 'abc', 'enum_field': 'wire_name'}
+        msg = encoding.DictToMessage(value, MessageWithRemappings)
+        self.assertEqual('abc', msg.another_field)
+        self.assertEqual(MessageWithRemappings.SomeEnum.enum_value,
+                         msg.enum_field)
+        # The caller's dictionary is left alone.
+        self.assertEqual({'anotherField': 'abc', 'enum_field': 'wire_name'},
+                         value)
+
+    def testPyValueToMessageJsonValue(self):
+        msg = encoding.PyValueToMessage(extra_types.JsonValue, [1, 'a'])
+        self.assertEqual(
+            extra_types.JsonValue(array_value=extra_types.JsonArray(entries=[
+                extra_types.JsonValue(integer_value=1),
+                extra_types.JsonValue(string_value='a')])),
+            msg)
+
     def testRepeatedJsonValuesAsRepeatedProperty(self):
         encoded_msg = '{"a": [{"one": 1}]}'
         msg = encoding.JsonToMessage(RepeatedJsonValueMessage, encoded_msg)
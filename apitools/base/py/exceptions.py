@@ -197,6 +197,11 @@ class BadStatusCodeError(HttpError):
     """The request completed but returned a bad status code."""
 
 
+class CircuitOpenError(CommunicationError):
+
+    """Requests to a host are failing fast after repeated errors."""
+
+
 class NotYetImplementedError(GeneratedClientError):
 
     """This functionality is not yet implemented."""
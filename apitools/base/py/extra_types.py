@@ -17,7 +17,6 @@
 """Extra types understood by apitools."""
 
 import datetime
-import json
 import numbers
 
 import six
@@ -223,15 +222,18 @@ def _PythonValueToJsonProto(py_value):
 
 
 def _JsonProtoToJson(json_proto, unused_encoder=None):
-    return json.dumps(_JsonProtoToPythonValue(json_proto))
+    return protojson.get_json_backend().dumps(
+        _JsonProtoToPythonValue(json_proto))
 
 
 def _JsonToJsonProto(json_data, unused_decoder=None):
-    return _PythonValueToJsonProto(json.loads(json_data))
+    return _PythonValueToJsonProto(
+        protojson.get_json_backend().loads(json_data))
 
 
 def _JsonToJsonValue(json_data, unused_decoder=None):
-    result = _PythonValueToJsonProto(json.loads(json_data))
+    result = _PythonValueToJsonProto(
+        protojson.get_json_backend().loads(json_data))
     if isinstance(result, JsonValue):
         return result
     elif isinstance(result, JsonObject):
@@ -248,11 +250,17 @@ JsonProtoEncoder = _JsonProtoToJson
 JsonProtoDecoder = _JsonToJsonProto
 # pylint:enable=invalid-name
 encoding.RegisterCustomMessageCodec(
-    encoder=JsonProtoEncoder, decoder=_JsonToJsonValue)(JsonValue)
+    encoder=JsonProtoEncoder, decoder=_JsonToJsonValue,
+    py_encoder=_JsonProtoToPythonValue,
+    py_decoder=_PythonValueToJsonValue)(JsonValue)
 encoding.RegisterCustomMessageCodec(
-    encoder=JsonProtoEncoder, decoder=JsonProtoDecoder)(JsonObject)
+    encoder=JsonProtoEncoder, decoder=JsonProtoDecoder,
+    py_encoder=_JsonProtoToPythonValue,
+    py_decoder=_PythonValueToJsonProto)(JsonObject)
 encoding.RegisterCustomMessageCodec(
-    encoder=JsonProtoEncoder, decoder=JsonProtoDecoder)(JsonArray)
+    encoder=JsonProtoEncoder, decoder=JsonProtoDecoder,
+    py_encoder=_JsonProtoToPythonValue,
+    py_decoder=_PythonValueToJsonProto)(JsonArray)
 
 
 def _EncodeDateTimeField(field, value):
@@ -316,8 +316,9 @@ class GzipFile(io.BufferedIOBase):
         if self.fileobj is None:
             raise ValueError("write() on closed GzipFile object")
 
-        # Convert data type if called by io.BufferedWriter.
-        if isinstance(data, memoryview):
+        # Convert data type if called by io.BufferedWriter. zlib in
+        # Python 3 compresses a memoryview without the copy.
+        if isinstance(data, memoryview) and six.PY2:
             data = data.tobytes()
 
         if len(data) > 0:
@@ -24,6 +24,7 @@ import collections
 import contextlib
 import logging
 import socket
+import threading
 import time
 
 import httplib2
@@ -41,14 +42,20 @@ except ImportError:
     from oauth2client.client import AccessTokenRefreshError as TokenRefreshError  # noqa
 
 __all__ = [
+    'AdaptiveRateLimiter',
     'CheckResponse',
+    'CircuitBreaker',
+    'EvictHttpConnection',
+    'GetConnectionStats',
     'GetHttp',
     'HandleExceptionsAndRebuildHttpConnections',
+    'HttpConnectionPool',
     'MakeRequest',
     'RebuildHttpConnections',
     'Request',
     'Response',
     'RethrowExceptionHandler',
+    'RetryBudget',
 ]
 
 
@@ -236,26 +243,125 @@ def RebuildHttpConnections(http):
     next request httplib2 will rebuild them from the connection types.
 
     Args:
-      http: An httplib2.Http instance.
+      http: An httplib2.Http or HttpConnectionPool instance.
     """
+    if isinstance(http, HttpConnectionPool):
+        http.RebuildConnections()
+        return
     if getattr(http, 'connections', None):
         for conn_key in list(http.connections.keys()):
             if ':' in conn_key:
                 del http.connections[conn_key]
 
 
+def _ConnectionKey(uri):
+    """Return the key httplib2 caches the connection for uri under."""
+    url_parts = parse.urlsplit(uri)
+    return '%s:%s' % (url_parts.scheme.lower(), url_parts.netloc.lower())
+
+
+# opened: Number of requests that opened a new connection.
+# reused: Number of requests sent on a kept-alive connection.
+# evicted: Number of connections dropped after a transport error.
+ConnectionStats = collections.namedtuple(
+    'ConnectionStats', ['opened', 'reused', 'evicted'])
+
+_connection_stats_lock = threading.Lock()
+_connection_stats = {}
+
+
+def _CountConnection(uri, field):
+    host = _HostKey(uri)
+    with _connection_stats_lock:
+        stats = _connection_stats.get(host, ConnectionStats(0, 0, 0))
+        _connection_stats[host] = stats._replace(
+            **{field: getattr(stats, field) + 1})
+
+
+def GetConnectionStats(reset=False):
+    """Return a dict mapping each host to its ConnectionStats.
+
+    Requests are counted when sent through MakeRequest or an
+    HttpConnectionPool on an httplib2.Http, which exposes its cached
+    connections. Every opened connection costs a TCP (and for https, a
+    TLS) handshake.
+
+    Args:
+      reset: (bool, default False) If True, also clear the counters.
+
+    Returns:
+      The counters since the process started or they were last reset.
+    """
+    global _connection_stats  # pylint: disable=global-statement
+    with _connection_stats_lock:
+        stats = _connection_stats
+        if reset:
+            _connection_stats = {}
+        return dict(stats)
+
+
+def _RequestCountingConnections(http, uri, **kwds):
+    """Call http.request, counting whether it reused a connection."""
+    connections = getattr(http, 'connections', None)
+    if (isinstance(connections, dict) and
+            not isinstance(http, HttpConnectionPool)):
+        _CountConnection(uri, 'reused' if _ConnectionKey(uri) in connections
+                         else 'opened')
+    return http.request(uri, **kwds)
+
+
+def EvictHttpConnection(http, uri):
+    """Drop the connection http holds to the host of uri, if any.
+
+    Unlike RebuildHttpConnections, connections to other hosts stay
+    open. HttpConnectionPool already drops each connection that fails,
+    so there is nothing to do for one.
+
+    Args:
+      http: An httplib2.Http or HttpConnectionPool instance.
+      uri: (str) URL of the request that failed.
+    """
+    if isinstance(http, HttpConnectionPool):
+        return
+    connections = getattr(http, 'connections', None)
+    if not isinstance(connections, dict):
+        return
+    connection = connections.pop(_ConnectionKey(uri), None)
+    if connection is not None:
+        _CountConnection(uri, 'evicted')
+        connection.close()
+
+
 def RethrowExceptionHandler(*unused_args):
     # pylint: disable=misplaced-bare-raise
     raise
 
 
-def HandleExceptionsAndRebuildHttpConnections(retry_args):
-    """Exception handler for http failures.
+# Exceptions after which the connection the request was sent on can't be
+# trusted. Socket errors include gaierror and timeout.
+_TRANSPORT_ERRORS = (
+    http_client.BadStatusLine,
+    http_client.IncompleteRead,
+    http_client.ResponseNotReady,
+    socket.error,
+    httplib2.ServerNotFoundError,
+    exceptions.RequestError,
+)
+
+
+def _IsTransportError(exc):
+    return isinstance(exc, _TRANSPORT_ERRORS)
 
-    This catches known failures and rebuilds the underlying HTTP connections.
+
+def _CheckRetryableException(retry_args):
+    """Re-raise retry_args.exc unless it is a known retryable failure.
 
     Args:
       retry_args: An ExceptionRetryArgs tuple.
+
+    Returns:
+      The number of seconds the server asked us to wait before retrying,
+      or None.
     """
     # If the server indicates how long to wait, use that value.  Otherwise,
     # calculate the wait time on our own.
@@ -302,7 +408,23 @@ def HandleExceptionsAndRebuildHttpConnections(retry_args):
         retry_after = retry_args.exc.retry_after
     else:
         raise retry_args.exc
-    RebuildHttpConnections(retry_args.http)
+    return retry_after
+
+
+def HandleExceptionsAndRebuildHttpConnections(retry_args):
+    """Exception handler for http failures.
+
+    This catches known failures and, after a transport failure, evicts
+    the connection the request was sent on. Connections stay open after
+    API-level failures such as an error status, since the server replied
+    on them.
+
+    Args:
+      retry_args: An ExceptionRetryArgs tuple.
+    """
+    retry_after = _CheckRetryableException(retry_args)
+    if _IsTransportError(retry_args.exc):
+        EvictHttpConnection(retry_args.http, retry_args.http_request.url)
     logging.debug('Retrying request to url %s after exception %s',
                   retry_args.http_request.url, retry_args.exc)
     time.sleep(
@@ -313,7 +435,8 @@ def HandleExceptionsAndRebuildHttpConnections(retry_args):
 def MakeRequest(http, http_request, retries=7, max_retry_wait=60,
                 redirections=5,
                 retry_func=HandleExceptionsAndRebuildHttpConnections,
-                check_response_func=CheckResponse):
+                check_response_func=CheckResponse,
+                rate_limiter=None, method_id=None):
     """Send http_request via the given http, performing error/retry handling.
 
     Args:
@@ -329,6 +452,10 @@ def MakeRequest(http, http_request, retries=7, max_retry_wait=60,
           ExceptionRetryArgs tuple.
       check_response_func: Function to validate the HTTP response.
           Arguments are (Response, response content, url).
+      rate_limiter: (AdaptiveRateLimiter, optional) Limiter to wait on
+          before each attempt and to report each result to.
+      method_id: (str, optional) ID of the API method, used to key the
+          rate_limiter.
 
     Raises:
       InvalidDataFromServerError: if there is no response after retries.
@@ -344,13 +471,21 @@ def MakeRequest(http, http_request, retries=7, max_retry_wait=60,
     if hasattr(http, 'redirect_codes'):
         http.redirect_codes = set(http.redirect_codes) - {308}
     while True:
+        slot = None
+        if rate_limiter is not None:
+            slot = rate_limiter.Acquire(http_request.url, method_id=method_id)
         try:
-            return _MakeRequestNoRetry(
+            response = _MakeRequestNoRetry(
                 http, http_request, redirections=redirections,
                 check_response_func=check_response_func)
+            if slot is not None:
+                rate_limiter.Release(slot, response.info)
+            return response
         # retry_func will consume the exception types it handles and raise.
         # pylint: disable=broad-except
         except Exception as e:
+            if slot is not None:
+                rate_limiter.Release(slot, getattr(e, 'response', None))
             retry += 1
             if retry >= retries:
                 raise
@@ -394,8 +529,9 @@ def _MakeRequestNoRetry(http, http_request, redirections=5,
     # Custom printing only at debuglevel 4
     new_debuglevel = 4 if httplib2.debuglevel == 4 else 0
     with _Httplib2Debuglevel(http_request, new_debuglevel, http=http):
-        info, content = http.request(
-            str(http_request.url), method=str(http_request.http_method),
+        info, content = _RequestCountingConnections(
+            http, str(http_request.url),
+            method=str(http_request.http_method),
             body=http_request.body, headers=http_request.headers,
             redirections=redirections, connection_type=connection_type)
 
@@ -407,6 +543,481 @@ def _MakeRequestNoRetry(http, http_request, redirections=5,
     return response
 
 
+def _HostKey(url):
+    return parse.urlsplit(url).netloc
+
+
+# limit: Number of requests allowed in flight at once.
+# in_flight: Number of requests in flight.
+# paused_for: Seconds until requests may be sent again after a
+#     Retry-After, or 0.
+RateLimiterState = collections.namedtuple(
+    'RateLimiterState', ['limit', 'in_flight', 'paused_for'])
+
+
+class _RateLimiterSlot(collections.namedtuple(
+        '_RateLimiterSlot', ['host', 'key', 'acquired_at'])):
+
+    """A request admitted by an AdaptiveRateLimiter."""
+
+
+class AdaptiveRateLimiter(object):
+
+    """Limits concurrent requests per host using AIMD.
+
+    Each host, or each (host, method ID) pair if per_method is set, may
+    have limit requests in flight at once; MakeRequest waits for a free
+    slot before each attempt. Every successful response raises the limit
+    by increase / limit, so roughly by increase per round trip, up to
+    max_limit. A 429 or 503 response multiplies it by decrease_factor, at
+    most once per round trip, down to min_limit. A Retry-After header
+    pauses all requests to the host for that many seconds.
+
+    Share one instance between clients and threads to throttle them
+    together. BaseApiClient.rate_limiter passes it to MakeRequest.
+    """
+
+    _OVERLOAD_STATUS_CODES = (TOO_MANY_REQUESTS,
+                              http_client.SERVICE_UNAVAILABLE)
+
+    def __init__(self, initial_limit=10, min_limit=1, max_limit=100,
+                 increase=1.0, decrease_factor=0.5, per_method=False):
+        self.__initial_limit = float(initial_limit)
+        self.__min_limit = min_limit
+        self.__max_limit = max_limit
+        self.__increase = increase
+        self.__decrease_factor = decrease_factor
+        self.__per_method = per_method
+        self.__condition = threading.Condition()
+        # Map from key to [limit, in flight, time of last decrease].
+        self.__limits = {}
+        # Map from host to the time requests to it may resume.
+        self.__paused_until = {}
+
+    def __Limit(self, key):
+        limit = self.__limits.get(key)
+        if limit is None:
+            limit = self.__limits[key] = [self.__initial_limit, 0, 0]
+        return limit
+
+    def Acquire(self, url, method_id=None):
+        """Wait until a request to url may be sent, and admit it.
+
+        Args:
+          url: (str) URL of the request.
+          method_id: (str, optional) ID of the API method being called.
+
+        Returns:
+          A slot to pass to Release once the request completes.
+        """
+        host = _HostKey(url)
+        key = (host, method_id if self.__per_method else None)
+        with self.__condition:
+            limit = self.__Limit(key)
+            while True:
+                pause = self.__paused_until.get(host, 0) - time.time()
+                if pause > 0:
+                    self.__condition.wait(pause)
+                elif limit[1] >= max(1, int(limit[0])):
+                    self.__condition.wait()
+                else:
+                    break
+            limit[1] += 1
+            return _RateLimiterSlot(host, key, time.time())
+
+    def Release(self, slot, response_info=None):
+        """Record the result of the request admitted as slot.
+
+        Args:
+          slot: The slot returned by Acquire.
+          response_info: (dict, optional) Headers and status of the
+              response, or None if the request failed without one.
+        """
+        status = retry_after = None
+        if response_info is not None:
+            try:
+                status = int(response_info.get('status'))
+                retry_after = int(response_info.get('retry-after'))
+            except (TypeError, ValueError):
+                pass
+        with self.__condition:
+            limit = self.__Limit(slot.key)
+            limit[1] -= 1
+            if retry_after:
+                self.__paused_until[slot.host] = max(
+                    self.__paused_until.get(slot.host, 0),
+                    time.time() + retry_after)
+            if status in self._OVERLOAD_STATUS_CODES:
+                # Only the first overload from each round trip counts.
+                if slot.acquired_at >= limit[2]:
+                    limit[0] = max(self.__min_limit,
+                                   limit[0] * self.__decrease_factor)
+                    limit[2] = time.time()
+            elif status is not None and status < 500:
+                limit[0] = min(self.__max_limit,
+                               limit[0] + self.__increase / limit[0])
+            self.__condition.notify_all()
+
+    def State(self):
+        """Return a dict mapping each key to its RateLimiterState.
+
+        Keys are hosts, or (host, method ID) pairs if per_method is set.
+        """
+        now = time.time()
+        with self.__condition:
+            return dict(
+                (key if self.__per_method else key[0], RateLimiterState(
+                    limit, in_flight,
+                    max(0, self.__paused_until.get(key[0], 0) - now)))
+                for key, (limit, in_flight, _) in self.__limits.items())
+
+
+# tokens: Retry tokens left; each retry costs one.
+# retries: Number of retries the budget has allowed.
+# denied: Number of retries the budget has refused.
+RetryBudgetState = collections.namedtuple(
+    'RetryBudgetState', ['tokens', 'retries', 'denied'])
+
+
+class RetryBudget(object):
+
+    """Per-host token bucket that limits retries to a fraction of requests.
+
+    Every response from a host deposits retry_ratio tokens in its bucket,
+    up to max_tokens, and the bucket also refills at min_retries_per_sec
+    so that rarely used hosts can still retry. Each retry takes a token;
+    when none are left the failure is raised instead of retried. Share one
+    instance between clients to give the whole process a single budget.
+
+    The budget plugs into MakeRequest by wrapping its hooks:
+
+      MakeRequest(http, request,
+                  retry_func=budget.WrapRetryFunc(retry_func),
+                  check_response_func=budget.WrapCheckResponseFunc(
+                      check_response_func))
+    """
+
+    def __init__(self, retry_ratio=0.1, min_retries_per_sec=1.0,
+                 max_tokens=10.0):
+        self.__retry_ratio = retry_ratio
+        self.__min_retries_per_sec = min_retries_per_sec
+        self.__max_tokens = max_tokens
+        self.__lock = threading.Lock()
+        # Map from host to a [tokens, last refill time, retries, denied].
+        self.__hosts = {}
+
+    def __Bucket(self, host):
+        """Return the refilled bucket for host. Requires the lock."""
+        now = time.time()
+        bucket = self.__hosts.get(host)
+        if bucket is None:
+            bucket = self.__hosts[host] = [self.__max_tokens, now, 0, 0]
+        else:
+            bucket[0] = min(self.__max_tokens, bucket[0] + (
+                now - bucket[1]) * self.__min_retries_per_sec)
+            bucket[1] = now
+        return bucket
+
+    def Deposit(self, url):
+        """Record a response from the host of url."""
+        with self.__lock:
+            bucket = self.__Bucket(_HostKey(url))
+            bucket[0] = min(self.__max_tokens,
+                            bucket[0] + self.__retry_ratio)
+
+    def Withdraw(self, url):
+        """Take a retry token for the host of url, if one is left."""
+        with self.__lock:
+            bucket = self.__Bucket(_HostKey(url))
+            if bucket[0] < 1:
+                bucket[3] += 1
+                return False
+            bucket[0] -= 1
+            bucket[2] += 1
+            return True
+
+    def __Refund(self, url):
+        with self.__lock:
+            bucket = self.__Bucket(_HostKey(url))
+            bucket[0] = min(self.__max_tokens, bucket[0] + 1)
+            bucket[2] -= 1
+
+    def State(self):
+        """Return a dict mapping each host to its RetryBudgetState."""
+        states = {}
+        with self.__lock:
+            for host in list(self.__hosts):
+                tokens, _, retries, denied = self.__Bucket(host)
+                states[host] = RetryBudgetState(tokens, retries, denied)
+        return states
+
+    def WrapRetryFunc(self, retry_func):
+        """Return a MakeRequest retry_func that spends from this budget."""
+        def RetryFunc(retry_args):
+            url = retry_args.http_request.url
+            if not self.Withdraw(url):
+                logging.debug('Retry budget for %s exhausted, not retrying',
+                              _HostKey(url))
+                raise retry_args.exc
+            try:
+                retry_func(retry_args)
+            except Exception:
+                # retry_func chose not to retry.
+                self.__Refund(url)
+                raise
+        return RetryFunc
+
+    def WrapCheckResponseFunc(self, check_response_func):
+        """Return a MakeRequest check_response_func that fills this budget."""
+        def CheckResponseFunc(response):
+            self.Deposit(response.request_url)
+            check_response_func(response)
+        return CheckResponseFunc
+
+
+# state: One of CircuitBreaker.CLOSED, OPEN or HALF_OPEN.
+# failure_rate: Fraction of the recent requests that failed.
+# requests: Number of recent requests the failure rate is computed over.
+# rejected: Number of requests failed fast while the circuit was open.
+CircuitBreakerState = collections.namedtuple(
+    'CircuitBreakerState', ['state', 'failure_rate', 'requests', 'rejected'])
+
+
+class _Circuit(object):
+
+    """Circuit breaker state for one host."""
+
+    def __init__(self, window_size):
+        self.state = CircuitBreaker.CLOSED
+        self.outcomes = collections.deque(maxlen=window_size)
+        self.changed_at = 0
+        self.probes = 0
+        self.rejected = 0
+
+
+class CircuitBreaker(object):
+
+    """Per-host circuit breaker that fails fast while a host is unhealthy.
+
+    The breaker watches the outcome of the last window_size requests to
+    each host. Once at least min_requests have been seen and the fraction
+    that failed (a 5XX or 429 response, or a transport error) reaches
+    failure_threshold, the circuit opens and requests to the host raise
+    CircuitOpenError without being sent. After reset_timeout seconds the
+    circuit is half open: half_open_requests probe requests are let
+    through, and the first result closes or reopens the circuit.
+
+    The breaker plugs into MakeRequest by wrapping its hooks, as for
+    RetryBudget, which fails retries fast; call Check before the first
+    attempt to fail that fast too. BaseApiClient.circuit_breaker does
+    both.
+    """
+
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half_open'
+
+    def __init__(self, failure_threshold=0.5, min_requests=10,
+                 window_size=20, reset_timeout=30, half_open_requests=1):
+        self.__failure_threshold = failure_threshold
+        self.__min_requests = min_requests
+        self.__window_size = window_size
+        self.__reset_timeout = reset_timeout
+        self.__half_open_requests = half_open_requests
+        self.__lock = threading.Lock()
+        self.__circuits = {}
+        # The last exception each thread's check_response_func recorded.
+        self.__recorded = threading.local()
+
+    def __Circuit(self, host):
+        circuit = self.__circuits.get(host)
+        if circuit is None:
+            circuit = self.__circuits[host] = _Circuit(self.__window_size)
+        return circuit
+
+    def __SetState(self, host, circuit, state):
+        logging.log(logging.WARNING if state == self.OPEN else logging.INFO,
+                    'Circuit for %s is now %s', host, state)
+        circuit.state = state
+        circuit.changed_at = time.time()
+        circuit.outcomes.clear()
+        circuit.probes = 0
+
+    def Allow(self, url):
+        """Return whether a request to the host of url may be sent."""
+        host = _HostKey(url)
+        with self.__lock:
+            circuit = self.__Circuit(host)
+            if circuit.state == self.CLOSED:
+                return True
+            expired = time.time() - circuit.changed_at >= self.__reset_timeout
+            if circuit.state == self.OPEN and expired:
+                self.__SetState(host, circuit, self.HALF_OPEN)
+            elif circuit.state == self.HALF_OPEN and expired:
+                # The probes never reported back; let more through.
+                circuit.changed_at = time.time()
+                circuit.probes = 0
+            if (circuit.state == self.HALF_OPEN and
+                    circuit.probes < self.__half_open_requests):
+                circuit.probes += 1
+                return True
+            circuit.rejected += 1
+            return False
+
+    def Check(self, url):
+        """Raise CircuitOpenError unless a request to url may be sent."""
+        if not self.Allow(url):
+            raise exceptions.CircuitOpenError(
+                'Circuit for %s is open after repeated failures' %
+                _HostKey(url))
+
+    def Record(self, url, success):
+        """Record the outcome of a request to the host of url."""
+        host = _HostKey(url)
+        with self.__lock:
+            circuit = self.__Circuit(host)
+            if circuit.state == self.HALF_OPEN:
+                self.__SetState(
+                    host, circuit, self.CLOSED if success else self.OPEN)
+                return
+            if circuit.state == self.OPEN:
+                # A request sent before the circuit opened.
+                return
+            circuit.outcomes.append(success)
+            failures = circuit.outcomes.count(False)
+            if (len(circuit.outcomes) >= self.__min_requests and
+                    failures >= self.__failure_threshold *
+                    len(circuit.outcomes)):
+                self.__SetState(host, circuit, self.OPEN)
+
+    def State(self):
+        """Return a dict mapping each host to its CircuitBreakerState."""
+        with self.__lock:
+            return dict(
+                (host, CircuitBreakerState(
+                    circuit.state,
+                    (float(circuit.outcomes.count(False)) /
+                     len(circuit.outcomes)) if circuit.outcomes else 0.0,
+                    len(circuit.outcomes), circuit.rejected))
+                for host, circuit in self.__circuits.items())
+
+    def WrapRetryFunc(self, retry_func):
+        """Return a MakeRequest retry_func that fails fast when open."""
+        def RetryFunc(retry_args):
+            url = retry_args.http_request.url
+            if retry_args.exc is not getattr(self.__recorded, 'exc', None):
+                self.Record(url, False)
+            self.__recorded.exc = None
+            self.Check(url)
+            retry_func(retry_args)
+        return RetryFunc
+
+    def WrapCheckResponseFunc(self, check_response_func):
+        """Return a MakeRequest check_response_func that records results."""
+        def CheckResponseFunc(response):
+            try:
+                check_response_func(response)
+            except Exception as e:
+                self.Record(response.request_url, False)
+                self.__recorded.exc = e
+                raise
+            self.Record(response.request_url, True)
+        return CheckResponseFunc
+
+
+class HttpConnectionPool(object):
+
+    """A thread-safe pool of keep-alive http connections.
+
+    httplib2.Http instances are not thread-safe, so this pool checks one
+    out for each request in flight and checks it back in afterwards,
+    keeping its connection warm for the next request to the same host.
+    At most max_connections_per_host connections are kept for any one
+    host; requests beyond that block until a connection is returned.
+
+    The pool has the same request() signature as httplib2.Http, so it
+    can be shared across threads anywhere an http is expected, including
+    MakeRequest and credentials.authorize().
+    """
+
+    def __init__(self, http_factory=None, max_connections_per_host=10):
+        if max_connections_per_host < 1:
+            raise exceptions.InvalidUserInputError(
+                'max_connections_per_host must be positive, got %s' %
+                max_connections_per_host)
+        self.__http_factory = http_factory or httplib2.Http
+        self.__max_connections_per_host = max_connections_per_host
+        self.__lock = threading.Lock()
+        # Map from scheme + authority to idle httplib2.Http instances
+        # and to the semaphore bounding connections to that host.
+        self.__idle = {}
+        self.__slots = {}
+        # Connection type overrides keyed by scheme, as on httplib2.Http.
+        self.connections = {}
+        if hasattr(httplib2, 'REDIRECT_CODES'):
+            self.redirect_codes = set(httplib2.REDIRECT_CODES)
+
+    @property
+    def max_connections_per_host(self):
+        return self.__max_connections_per_host
+
+    def __Checkout(self, host_key):
+        with self.__lock:
+            slots = self.__slots.get(host_key)
+            if slots is None:
+                slots = self.__slots[host_key] = threading.BoundedSemaphore(
+                    self.__max_connections_per_host)
+        slots.acquire()
+        with self.__lock:
+            idle = self.__idle.get(host_key)
+            if idle:
+                return idle.pop()
+        try:
+            return self.__http_factory()
+        except:  # pylint: disable=bare-except
+            slots.release()
+            raise
+
+    def __Checkin(self, host_key, http):
+        if http is not None:
+            with self.__lock:
+                self.__idle.setdefault(host_key, []).append(http)
+        self.__slots[host_key].release()
+
+    def request(self, uri, method='GET', body=None, headers=None,
+                redirections=httplib2.DEFAULT_MAX_REDIRECTS,
+                connection_type=None):
+        """Send a request on a connection checked out of the pool."""
+        host_key = _ConnectionKey(uri)
+        http = self.__Checkout(host_key)
+        if hasattr(self, 'redirect_codes') and hasattr(http,
+                                                       'redirect_codes'):
+            http.redirect_codes = self.redirect_codes
+        try:
+            result = _RequestCountingConnections(
+                http, uri, method=method, body=body, headers=headers,
+                redirections=redirections, connection_type=connection_type)
+        except:  # pylint: disable=bare-except
+            # Don't hand a connection in an unknown state to anyone else.
+            self.__Checkin(host_key, None)
+            _CountConnection(uri, 'evicted')
+            http.close()
+            raise
+        self.__Checkin(host_key, http)
+        return result
+
+    def RebuildConnections(self):
+        """Drop all idle connections, so that new ones are opened."""
+        with self.__lock:
+            idle, self.__idle = self.__idle, {}
+        for http_list in idle.values():
+            for http in http_list:
+                http.close()
+
+    def close(self):
+        self.RebuildConnections()
+
+
 _HTTP_FACTORIES = []
 
 
@@ -414,7 +1025,23 @@ def _RegisterHttpFactory(factory):
     _HTTP_FACTORIES.append(factory)
 
 
-def GetHttp(**kwds):
+def GetHttp(max_connections_per_host=None, **kwds):
+    """Create a new http object.
+
+    Args:
+      max_connections_per_host: (int, default: None) If provided, return a
+          thread-safe HttpConnectionPool keeping at most this many
+          keep-alive connections per host, instead of a single http.
+      **kwds: Additional keyword arguments are passed on to the http
+          constructor.
+
+    Returns:
+      An httplib2.Http (or compatible) instance.
+    """
+    if max_connections_per_host is not None:
+        return HttpConnectionPool(
+            http_factory=lambda: GetHttp(**kwds),
+            max_connections_per_host=max_connections_per_host)
     for factory in _HTTP_FACTORIES:
         http = factory(**kwds)
         if http is not None:
@@ -15,6 +15,7 @@
 
 """Tests for http_wrapper."""
 import socket
+import threading
 import unittest
 
 import httplib2
@@ -26,6 +27,7 @@ from apitools.base.py import exceptions
 from apitools.base.py import http_wrapper
 
 # pylint: disable=ungrouped-imports
+from oauth2client.client import AccessTokenCredentials
 try:
     from oauth2client.client import HttpAccessTokenRefreshError
     from oauth2client.client import AccessTokenRefreshError
@@ -137,3 +139,353 @@ class HttpWrapperTest(unittest.TestCase):
             with patch('time.sleep', return_value=None):
                 http_wrapper.HandleExceptionsAndRebuildHttpConnections(
                     retry_args)
+
+    def _HandleException(self, http, exc):
+        retry_args = http_wrapper.ExceptionRetryArgs(
+            http=http, http_request=http_wrapper.Request('https://a.com/x'),
+            exc=exc, num_retries=0, max_retry_wait=0, total_wait_sec=0)
+        with patch('time.sleep', return_value=None):
+            http_wrapper.HandleExceptionsAndRebuildHttpConnections(retry_args)
+
+    def testEvictsOnlyFailedConnection(self):
+        http = _KeepAliveHttp()
+        http.request('https://a.com/x')
+        http.request('https://b.com/x')
+        connections = dict(http.connections)
+        # The server replied, so the connection is still good.
+        self._HandleException(http, exceptions.BadStatusCodeError(
+            {'status': 503}, b'', 'https://a.com/x'))
+        self.assertEqual(connections, http.connections)
+        self._HandleException(http, socket.error())
+        self.assertEqual(['https:b.com'], list(http.connections))
+        self.assertTrue(connections['https:a.com'].closed)
+        self.assertFalse(connections['https:b.com'].closed)
+
+    def testConnectionStats(self):
+        http_wrapper.GetConnectionStats(reset=True)
+        http = _KeepAliveHttp()
+        for url in ('https://a.com/x', 'https://a.com/y', 'https://b.com/'):
+            http_wrapper.MakeRequest(http, http_wrapper.Request(url))
+        http_wrapper.EvictHttpConnection(http, 'https://a.com/z')
+        http_wrapper.MakeRequest(http, http_wrapper.Request('https://a.com/'))
+        stats = http_wrapper.GetConnectionStats(reset=True)
+        self.assertEqual((2, 1, 1), stats['a.com'])
+        self.assertEqual((1, 0, 0), stats['b.com'])
+        self.assertEqual({}, http_wrapper.GetConnectionStats())
+
+
+class _FakeConnection(object):
+
+    def __init__(self):
+        self.closed = False
+
+    def close(self):
+        self.closed = True
+
+
+class _KeepAliveHttp(object):
+
+    """Stands in for an httplib2.Http, caching a connection per host."""
+
+    def __init__(self):
+        self.connections = {}
+
+    def request(self, uri, **unused_kwds):
+        # pylint: disable=protected-access
+        self.connections.setdefault(
+            http_wrapper._ConnectionKey(uri), _FakeConnection())
+        return httplib2.Response({'status': '200'}), b''
+
+
+class _StatusHttp(object):
+
+    """Stands in for an httplib2.Http, replying with the given statuses."""
+
+    def __init__(self, statuses):
+        self.statuses = list(statuses)
+        self.requests = 0
+
+    def request(self, uri, **unused_kwds):
+        self.requests += 1
+        status = self.statuses.pop(0) if self.statuses else '200'
+        return httplib2.Response({'status': status}), b''
+
+
+def _MakeRequest(http, policy, retries=5):
+    return http_wrapper.MakeRequest(
+        http, http_wrapper.Request(url='https://www.example.com/x'),
+        retries=retries,
+        retry_func=policy.WrapRetryFunc(
+            http_wrapper.HandleExceptionsAndRebuildHttpConnections),
+        check_response_func=policy.WrapCheckResponseFunc(
+            http_wrapper.CheckResponse))
+
+
+@patch('time.sleep', return_value=None)
+class RetryBudgetTest(unittest.TestCase):
+
+    def testRetriesWithinBudget(self, _):
+        budget = http_wrapper.RetryBudget(max_tokens=3)
+        http = _StatusHttp(['503', '503'])
+        self.assertEqual(200, _MakeRequest(http, budget).status_code)
+        state = budget.State()['www.example.com']
+        self.assertEqual(2, state.retries)
+        self.assertEqual(0, state.denied)
+
+    def testExhaustedBudgetStopsRetries(self, _):
+        budget = http_wrapper.RetryBudget(
+            retry_ratio=0, min_retries_per_sec=0, max_tokens=2)
+        http = _StatusHttp(['503'] * 10)
+        with self.assertRaises(exceptions.BadStatusCodeError):
+            _MakeRequest(http, budget)
+        self.assertEqual(3, http.requests)
+        # Later requests to the host fail without retrying.
+        with self.assertRaises(exceptions.BadStatusCodeError):
+            _MakeRequest(http, budget)
+        self.assertEqual(4, http.requests)
+        state = budget.State()['www.example.com']
+        self.assertEqual((0, 2, 2), state)
+
+    def testRefillsOverTime(self, _):
+        budget = http_wrapper.RetryBudget(
+            retry_ratio=0, min_retries_per_sec=1, max_tokens=1)
+        url = 'https://www.example.com/x'
+        with patch('time.time', return_value=100):
+            self.assertTrue(budget.Withdraw(url))
+            self.assertFalse(budget.Withdraw(url))
+        with patch('time.time', return_value=101):
+            self.assertTrue(budget.Withdraw(url))
+
+    def testNonRetryableErrorRefunds(self, _):
+        budget = http_wrapper.RetryBudget(max_tokens=1)
+
+        def Raise(*unused_args):
+            raise ValueError()
+        retry_args = http_wrapper.ExceptionRetryArgs(
+            http=None, http_request=http_wrapper.Request(url='https://h/'),
+            exc=ValueError(), num_retries=1, max_retry_wait=0,
+            total_wait_sec=0)
+        with self.assertRaises(ValueError):
+            budget.WrapRetryFunc(Raise)(retry_args)
+        self.assertEqual((1, 0, 0), budget.State()['h'])
+
+
+@patch('time.sleep', return_value=None)
+class CircuitBreakerTest(unittest.TestCase):
+
+    def testOpensAfterFailures(self, _):
+        breaker = http_wrapper.CircuitBreaker(
+            failure_threshold=0.5, min_requests=4, window_size=4)
+        http = _StatusHttp(['200', '503', '200', '503'])
+        for status in http.statuses[:]:
+            if status == '200':
+                _MakeRequest(http, breaker, retries=1)
+            else:
+                with self.assertRaises(exceptions.BadStatusCodeError):
+                    _MakeRequest(http, breaker, retries=1)
+        state = breaker.State()['www.example.com']
+        self.assertEqual(http_wrapper.CircuitBreaker.OPEN, state.state)
+        # Retries and new requests fail fast.
+        with self.assertRaises(exceptions.CircuitOpenError):
+            breaker.Check('https://www.example.com/y')
+        self.assertTrue(breaker.Allow('https://other.example.com/'))
+        self.assertEqual(1, breaker.State()['www.example.com'].rejected)
+
+    def testRetryFailsFastWhenOpen(self, _):
+        breaker = http_wrapper.CircuitBreaker(min_requests=2, window_size=2)
+        http = _StatusHttp(['503'] * 10)
+        with self.assertRaises(exceptions.CircuitOpenError):
+            _MakeRequest(http, breaker)
+        self.assertEqual(2, http.requests)
+
+    def testHalfOpenProbes(self, _):
+        breaker = http_wrapper.CircuitBreaker(
+            min_requests=1, window_size=1, reset_timeout=10)
+        url = 'https://www.example.com/'
+        with patch('time.time', return_value=100):
+            breaker.Record(url, False)
+            self.assertFalse(breaker.Allow(url))
+        with patch('time.time', return_value=110):
+            # One probe at a time while half open.
+            self.assertTrue(breaker.Allow(url))
+            self.assertFalse(breaker.Allow(url))
+            self.assertEqual(http_wrapper.CircuitBreaker.HALF_OPEN,
+                             breaker.State()['www.example.com'].state)
+            breaker.Record(url, False)
+            self.assertFalse(breaker.Allow(url))
+        with patch('time.time', return_value=120):
+            self.assertTrue(breaker.Allow(url))
+            breaker.Record(url, True)
+            self.assertTrue(breaker.Allow(url))
+            self.assertTrue(breaker.Allow(url))
+        self.assertEqual(http_wrapper.CircuitBreaker.CLOSED,
+                         breaker.State()['www.example.com'].state)
+
+    def testTransportErrorsCount(self, _):
+        breaker = http_wrapper.CircuitBreaker(min_requests=2, window_size=2)
+        http = _FakeHttp(fail=True)
+        with self.assertRaises(exceptions.CircuitOpenError):
+            _MakeRequest(http, breaker)
+        self.assertEqual(2, len(http.uris))
+
+
+@patch('time.sleep', return_value=None)
+class AdaptiveRateLimiterTest(unittest.TestCase):
+
+    def _MakeRequest(self, http, limiter, method_id=None):
+        return http_wrapper.MakeRequest(
+            http, http_wrapper.Request(url='https://www.example.com/x'),
+            retries=5, rate_limiter=limiter, method_id=method_id)
+
+    def testIncreasesOnSuccess(self, _):
+        limiter = http_wrapper.AdaptiveRateLimiter(initial_limit=2)
+        for _ in range(4):
+            self._MakeRequest(_StatusHttp([]), limiter)
+        state = limiter.State()['www.example.com']
+        self.assertEqual(3, int(state.limit))
+        self.assertEqual(0, state.in_flight)
+
+    def testDecreasesOnOverload(self, _):
+        limiter = http_wrapper.AdaptiveRateLimiter(
+            initial_limit=8, min_limit=3)
+        http = _StatusHttp(['429', '503', '429'])
+        self.assertEqual(200, self._MakeRequest(http, limiter).status_code)
+        # Lowered to min_limit, then raised by the final success.
+        self.assertAlmostEqual(
+            3 + 1 / 3.0, limiter.State()['www.example.com'].limit)
+
+    def testOneDecreasePerRoundTrip(self, _):
+        limiter = http_wrapper.AdaptiveRateLimiter(initial_limit=8)
+        url = 'https://www.example.com/'
+        slots = [limiter.Acquire(url) for _ in range(4)]
+        for slot in slots:
+            limiter.Release(slot, {'status': '503'})
+        self.assertEqual(4, limiter.State()['www.example.com'].limit)
+
+    def testRetryAfterPausesHost(self, _):
+        limiter = http_wrapper.AdaptiveRateLimiter(per_method=True)
+        slot = limiter.Acquire('https://www.example.com/', 'a.get')
+        limiter.Acquire('https://other.example.com/', 'a.get')
+        limiter.Release(slot, {'status': '429', 'retry-after': '30'})
+        state = limiter.State()
+        self.assertGreater(state[('www.example.com', 'a.get')].paused_for, 29)
+        self.assertEqual(0, state[('other.example.com', 'a.get')].paused_for)
+
+    def testWaitsForFreeSlot(self, _):
+        limiter = http_wrapper.AdaptiveRateLimiter(initial_limit=1)
+        url = 'https://www.example.com/'
+        slot = limiter.Acquire(url)
+        acquired = threading.Event()
+
+        def _Acquire():
+            limiter.Acquire(url)
+            acquired.set()
+        thread = threading.Thread(target=_Acquire)
+        thread.start()
+        self.assertFalse(acquired.wait(0.1))
+        limiter.Release(slot)
+        self.assertTrue(acquired.wait(5))
+        thread.join()
+        self.assertEqual(1, limiter.State()['www.example.com'].in_flight)
+
+
+class _FakeHttp(object):
+
+    """Stands in for an httplib2.Http, recording the requests it sees."""
+
+    def __init__(self, fail=False):
+        self.fail = fail
+        self.closed = False
+        self.uris = []
+
+    def request(self, uri, **unused_kwds):
+        self.uris.append(uri)
+        if self.fail:
+            raise socket.error()
+        return httplib2.Response({'status': '200'}), b'content'
+
+    def close(self):
+        self.closed = True
+
+
+class HttpConnectionPoolTest(unittest.TestCase):
+
+    def setUp(self):
+        self.created = []
+
+        def _Factory():
+            self.created.append(_FakeHttp())
+            return self.created[-1]
+        self.pool = http_wrapper.HttpConnectionPool(
+            http_factory=_Factory, max_connections_per_host=2)
+
+    def testReusesConnectionPerHost(self):
+        for _ in range(3):
+            self.pool.request('https://a.com/x')
+        self.pool.request('https://b.com/x')
+        self.assertEqual(2, len(self.created))
+        self.assertEqual(['https://a.com/x'] * 3, self.created[0].uris)
+        self.assertEqual(['https://b.com/x'], self.created[1].uris)
+
+    def testDropsConnectionOnError(self):
+        self.pool.request('https://a.com/x')
+        self.created[0].fail = True
+        with self.assertRaises(socket.error):
+            self.pool.request('https://a.com/x')
+        self.pool.request('https://a.com/x')
+        self.assertEqual(2, len(self.created))
+
+    def testBoundsConnectionsPerHost(self):
+        in_flight = []
+        max_in_flight = []
+        release = threading.Event()
+        lock = threading.Lock()
+
+        class _SlowHttp(_FakeHttp):
+
+            def request(self, uri, **kwds):
+                with lock:
+                    in_flight.append(uri)
+                    max_in_flight.append(len(in_flight))
+                release.wait()
+                with lock:
+                    in_flight.pop()
+                return super(_SlowHttp, self).request(uri, **kwds)
+
+        pool = http_wrapper.HttpConnectionPool(
+            http_factory=_SlowHttp, max_connections_per_host=2)
+        threads = [threading.Thread(target=pool.request,
+                                    args=('https://a.com/x',))
+                   for _ in range(5)]
+        for thread in threads:
+            thread.start()
+        release.set()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(2, max(max_in_flight))
+
+    def testRebuildHttpConnections(self):
+        self.pool.request('https://a.com/x')
+        http_wrapper.RebuildHttpConnections(self.pool)
+        self.assertTrue(self.created[0].closed)
+        self.pool.request('https://a.com/x')
+        self.assertEqual(2, len(self.created))
+
+    def testMakeRequest(self):
+        response = http_wrapper.MakeRequest(
+            self.pool, http_wrapper.Request('https://a.com/x'))
+        self.assertEqual(200, response.status_code)
+        self.assertEqual(b'content', response.content)
+
+    def testAuthorize(self):
+        credentials = AccessTokenCredentials('token', 'user-agent')
+        http = credentials.authorize(self.pool)
+        self.assertIs(self.pool, http)
+        http_wrapper.MakeRequest(
+            http, http_wrapper.Request('https://a.com/x'))
+        self.assertEqual(['https://a.com/x'], self.created[0].uris)
+
+    def testGetHttp(self):
+        pool = http_wrapper.GetHttp(max_connections_per_host=3)
+        self.assertIsInstance(pool, http_wrapper.HttpConnectionPool)
+        self.assertEqual(3, pool.max_connections_per_host)
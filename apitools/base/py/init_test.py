@@ -0,0 +1,75 @@
+#
+# Copyright 2015 Google Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Tests for the apitools.base.py package namespace."""
+
+import importlib
+import subprocess
+import sys
+import types
+import unittest
+
+import apitools.base.py as apitools_base
+
+
+class InitTest(unittest.TestCase):
+
+    def testSubmoduleNamesMatchAll(self):
+        # pylint: disable=protected-access
+        for submodule, names in apitools_base._SUBMODULE_NAMES.items():
+            module = importlib.import_module(
+                'apitools.base.py.%s' % submodule)
+            expected = getattr(module, '__all__', None)
+            if expected is None:
+                expected = [
+                    name for name, value in vars(module).items()
+                    if not name.startswith('_') and
+                    not isinstance(value, types.ModuleType)]
+            self.assertEqual(sorted(expected), sorted(names), submodule)
+
+    def testAttributes(self):
+        from apitools.base.py import exceptions
+        from apitools.base.py import transfer
+        self.assertIs(exceptions.HttpError, apitools_base.HttpError)
+        self.assertIs(transfer.Upload, apitools_base.Upload)
+        self.assertIs(transfer, apitools_base.transfer)
+        self.assertIn('Upload', dir(apitools_base))
+        with self.assertRaises(AttributeError):
+            apitools_base.NoSuchName  # pylint: disable=pointless-statement
+
+    def testWildcardImport(self):
+        namespace = {}
+        exec('from apitools.base.py import *', namespace)
+        # pylint: disable=protected-access
+        for names in apitools_base._SUBMODULE_NAMES.values():
+            for name in names:
+                self.assertIs(getattr(apitools_base, name), namespace[name])
+        self.assertIn('base_api', namespace)
+
+    @unittest.skipIf(sys.version_info < (3, 7),
+                     'Lazy imports need module __getattr__.')
+    def testImportIsLazy(self):
+        code = '\n'.join((
+            'import sys',
+            'import apitools.base.py',
+            'print(sorted(m for m in sys.modules if m.startswith(',
+            '    ("apitools.base.py.", "oauth2client"))))',
+        ))
+        output = subprocess.check_output([sys.executable, '-c', code])
+        self.assertEqual('[]', output.decode('ascii').strip())
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -16,11 +16,22 @@
 
 """A helper function that executes a series of List queries for many APIs."""
 
+import collections
+import heapq
+import itertools
+import sys
+import threading
+
 from apitools.base.py import encoding
+from apitools.base.py import exceptions
 import six
+from six.moves import queue
 
 __all__ = [
+    'PrefixShards',
+    'RangeShards',
     'YieldFromList',
+    'YieldFromListSharded',
 ]
 
 
@@ -62,13 +73,150 @@ def _SetattrNested(message, attribute, value):
                        attribute[-1], value)
 
 
+def _AddResponseFields(service, method, global_params, fields, field,
+                       next_token_attribute):
+    """Return global_params asking for only fields of each item.
+
+    Args:
+      service: apitools_base.BaseApiService, The service listing items.
+      method: str, The name of the method used to fetch resources.
+      global_params: protorpc.messages.Message, The global query parameters
+          given by the caller, or None.
+      fields: list, Paths of fields of the items, each a dotted string or
+          a tuple of field names.
+      field: str or tuple, The field in the response holding the items.
+      next_token_attribute: str or tuple, The field in the response holding
+          the next page token.
+
+    Returns:
+      protorpc.messages.Message, A copy of global_params with fields set.
+
+    Raises:
+      InvalidUserInputError: if global_params already sets fields, or a
+          path does not name a field.
+    """
+    def AsPath(attribute):
+        if isinstance(attribute, six.string_types):
+            return tuple(attribute.split('.'))
+        return tuple(attribute)
+
+    if global_params is None:
+        global_params = service.client.params_type()
+    elif global_params.fields:
+        raise exceptions.InvalidUserInputError(
+            'Cannot set both fields and global_params.fields')
+    else:
+        global_params = encoding.CopyProtoMessage(global_params)
+    items_path = AsPath(field)
+    global_params.fields = encoding.PartialResponseFields(
+        service.GetResponseType(method),
+        [items_path + AsPath(path) for path in fields] +
+        [AsPath(next_token_attribute)])
+    return global_params
+
+
+def _YieldPages(
+        service, request, global_params, limit, batch_size, method, field,
+        predicate, current_token_attribute, next_token_attribute,
+        batch_size_attribute, get_field_func):
+    """Make a series of List requests, yielding the items of each page.
+
+    The next page is only requested when the caller asks for it, and no
+    more pages are requested once limit items have been yielded. The
+    arguments are as for YieldFromList.
+
+    Yields:
+      list, The items of each page that satisfy predicate.
+    """
+    request = encoding.CopyProtoMessage(request)
+    _SetattrNested(request, current_token_attribute, None)
+    while limit is None or limit:
+        if batch_size_attribute:
+            # On Py3, None is not comparable so min() below will fail.
+            # On Py2, None is always less than any number so if batch_size
+            # is None, the request_batch_size will always be None regardless
+            # of the value of limit. This doesn't generally strike me as the
+            # correct behavior, but this change preserves the existing Py2
+            # behavior on Py3.
+            if batch_size is None:
+                request_batch_size = None
+            else:
+                request_batch_size = min(batch_size, limit or batch_size)
+            _SetattrNested(request, batch_size_attribute, request_batch_size)
+        response = getattr(service, method)(request,
+                                            global_params=global_params)
+        items = get_field_func(response, field)
+        if predicate:
+            items = filter(predicate, items)
+        items = list(items)
+        yield items
+        if limit is not None:
+            limit = max(0, limit - len(items))
+        token = _GetattrNested(response, next_token_attribute)
+        if not token:
+            return
+        _SetattrNested(request, current_token_attribute, token)
+
+
+def _PrefetchPages(pages, prefetch):
+    """Iterate over pages, fetching them ahead on a background thread.
+
+    Args:
+      pages: iterator, The pages to fetch, as from _YieldPages.
+      prefetch: int, The maximum number of pages to hold ahead of the
+          caller.
+
+    Yields:
+      The items of pages, in order. An exception raised while fetching a
+      page is raised in place of that page.
+    """
+    fetched = queue.Queue(maxsize=prefetch)
+    stop = threading.Event()
+
+    def FetchPages():
+        try:
+            while not stop.is_set():
+                try:
+                    items = next(pages)
+                except StopIteration:
+                    fetched.put((None, None))
+                    return
+                fetched.put((items, None))
+        # Hand the failure to the caller.
+        # pylint: disable=broad-except
+        except Exception:
+            fetched.put((None, sys.exc_info()))
+
+    fetcher = threading.Thread(target=FetchPages)
+    fetcher.daemon = True
+    fetcher.start()
+    try:
+        while True:
+            items, exc_info = fetched.get()
+            if exc_info is not None:
+                six.reraise(*exc_info)
+            if items is None:
+                return
+            yield items
+    finally:
+        stop.set()
+        # The fetcher puts at most one more page before it sees stop, so
+        # emptying the queue once is enough to keep it from blocking. A
+        # request already in flight completes, and its page is dropped.
+        try:
+            while True:
+                fetched.get_nowait()
+        except queue.Empty:
+            pass
+
+
 def YieldFromList(
         service, request, global_params=None, limit=None, batch_size=100,
         method='List', field='items', predicate=None,
         current_token_attribute='pageToken',
         next_token_attribute='nextPageToken',
         batch_size_attribute='maxResults',
-        get_field_func=_GetattrNested):
+        get_field_func=_GetattrNested, prefetch=None, fields=None):
     """Make a series of List requests, keeping track of page tokens.
 
     Args:
@@ -97,31 +245,343 @@ def YieldFromList(
           If a tuple, path to the attribute.
       get_field_func: Function that returns the items to be yielded. Argument
           is response message, and field.
+      prefetch: int, If set, pages are requested on a background thread as
+          soon as the previous page arrives, holding up to this many pages
+          ahead of the caller. get_field_func and predicate then run on
+          that thread, and the service's http must be safe to use from
+          several threads (see http_wrapper.GetHttp) if the caller makes
+          other requests with it while iterating.
+      fields: list, If set, only these fields of each item are requested
+          from the server, using the fields global parameter. Each is a
+          path of field names in the item message, as a dotted string or
+          a tuple. The page token is requested too.
 
     Yields:
       protorpc.message.Message, The resources listed by the service.
 
     """
-    request = encoding.CopyProtoMessage(request)
-    _SetattrNested(request, current_token_attribute, None)
-    while limit is None or limit:
-        if batch_size_attribute:
-            # On Py3, None is not comparable so min() below will fail.
-            # On Py2, None is always less than any number so if batch_size
-            # is None, the request_batch_size will always be None regardless
-            # of the value of limit. This doesn't generally strike me as the
-            # correct behavior, but this change preserves the existing Py2
-            # behavior on Py3.
-            if batch_size is None:
-                request_batch_size = None
-            else:
-                request_batch_size = min(batch_size, limit or batch_size)
-            _SetattrNested(request, batch_size_attribute, request_batch_size)
-        response = getattr(service, method)(request,
-                                            global_params=global_params)
-        items = get_field_func(response, field)
-        if predicate:
-            items = list(filter(predicate, items))
+    if fields:
+        global_params = _AddResponseFields(
+            service, method, global_params, fields, field,
+            next_token_attribute)
+    pages = _YieldPages(
+        service, request, global_params, limit, batch_size, method, field,
+        predicate, current_token_attribute, next_token_attribute,
+        batch_size_attribute, get_field_func)
+    if prefetch:
+        pages = _PrefetchPages(pages, prefetch)
+    try:
+        for items in pages:
+            for item in items:
+                yield item
+                if limit is None:
+                    continue
+                limit -= 1
+                if not limit:
+                    return
+    finally:
+        pages.close()
+
+
+def PrefixShards(prefixes, prefix_attribute='prefix'):
+    """Make shards that each list the items with one of prefixes.
+
+    Args:
+      prefixes: list of str, The prefixes. No prefix should start with
+          another, or items would be listed twice. Sort them to list
+          items in order.
+      prefix_attribute: str or tuple, The request attribute holding the
+          prefix. If a tuple, path to the attribute.
+
+    Returns:
+      list of dict, Shards for YieldFromListSharded.
+    """
+    return [{prefix_attribute: prefix} for prefix in prefixes]
+
+
+def RangeShards(split_points, start_attribute='startOffset',
+                end_attribute='endOffset'):
+    """Make shards that each list a range of the key space.
+
+    Args:
+      split_points: list of str, Sorted keys to split the key space at. The
+          first shard ends before the first split point, and the last
+          shard starts at the last split point.
+      start_attribute: str or tuple, The request attribute holding the
+          inclusive start of the range. If a tuple, path to the attribute.
+      end_attribute: str or tuple, The request attribute holding the
+          exclusive end of the range. If a tuple, path to the attribute.
+
+    Returns:
+      list of dict, Shards for YieldFromListSharded.
+    """
+    bounds = [None] + list(split_points) + [None]
+    return [{start_attribute: start, end_attribute: end}
+            for start, end in zip(bounds[:-1], bounds[1:])]
+
+
+class _Shard(object):
+
+    """The state of one shard's chain of List requests."""
+
+    def __init__(self, attributes, pages):
+        self.attributes = attributes
+        self.pages = pages
+        # Pages fetched and not yet consumed.
+        self.buffered = collections.deque()
+        self.num_pages = 0
+        self.parked = False
+        self.done = False
+        self.exc_info = None
+        # Shards replacing the rest of this one after a split.
+        self.children = []
+
+
+class _ShardedLister(object):
+
+    """Runs the page chains of several shards on a pool of threads.
+
+    Workers fetch one page of a shard at a time, so every shard makes
+    progress however few workers there are. A shard with prefetch pages
+    waiting to be consumed is parked until the caller catches up.
+    """
+
+    def __init__(self, make_pages, shards, max_workers, prefetch, ordered,
+                 split_shard_func, split_after_pages):
+        self.__make_pages = make_pages
+        self.__ordered = ordered
+        self.__max_workers = max_workers
+        self.__prefetch = prefetch
+        self.__split_shard_func = split_shard_func
+        self.__split_after_pages = split_after_pages
+        self.__condition = threading.Condition()
+        self.__stopped = False
+        self.__num_active = 0
+        self.__num_workers = 0
+        # Shards ready for their next page to be fetched.
+        self.__ready = collections.deque()
+        # Shards in the order their pages and errors arrive, if unordered.
+        self.__arrivals = collections.deque()
+        self.__shards = [self.__NewShard(shard) for shard in shards]
+
+    def __NewShard(self, attributes):
+        shard = _Shard(attributes, self.__make_pages(attributes))
+        self.__num_active += 1
+        self.__ready.append(shard)
+        return shard
+
+    def Start(self):
+        with self.__condition:
+            self.__StartWorkers()
+
+    def __StartWorkers(self):
+        """Start a worker for each active shard, up to max_workers.
+
+        This is called again when a shard is split, so that its children
+        are fetched in parallel.
+        """
+        while self.__num_workers < min(self.__max_workers,
+                                       self.__num_active):
+            worker = threading.Thread(target=self.__FetchPages)
+            worker.daemon = True
+            worker.start()
+            self.__num_workers += 1
+
+    def Stop(self):
+        with self.__condition:
+            self.__stopped = True
+            self.__condition.notify_all()
+
+    def __FetchPages(self):
+        """Fetch pages of ready shards until all shards are done."""
+        while True:
+            with self.__condition:
+                while (not self.__ready and self.__num_active and
+                       not self.__stopped):
+                    self.__condition.wait()
+                if self.__stopped or not self.__ready:
+                    self.__num_workers -= 1
+                    return
+                shard = self.__ready.popleft()
+            children = None
+            try:
+                items = next(shard.pages)
+                # Only this worker has the shard, so it can read
+                # num_pages without the lock. The split function is
+                # user code; don't hold the lock while it runs.
+                if (self.__split_shard_func is not None and items and
+                        shard.num_pages + 1 >= self.__split_after_pages):
+                    children = self.__split_shard_func(
+                        shard.attributes, items)
+            except StopIteration:
+                items = None
+            # Hand the failure to the caller.
+            # pylint: disable=broad-except
+            except Exception:
+                items = None
+                shard.exc_info = sys.exc_info()
+            with self.__condition:
+                self.__AddPage(shard, items, children)
+                self.__condition.notify_all()
+
+    def __AddPage(self, shard, items, children=None):
+        """Record a fetched page, and decide what the shard does next."""
+        if items is None:
+            shard.done = True
+            self.__num_active -= 1
+            if shard.exc_info is not None and not self.__ordered:
+                self.__arrivals.append(shard)
+            return
+        shard.buffered.append(items)
+        shard.num_pages += 1
+        if not self.__ordered:
+            self.__arrivals.append(shard)
+        if children:
+            shard.pages.close()
+            shard.children = [self.__NewShard(child) for child in children]
+            shard.done = True
+            self.__num_active -= 1
+            self.__StartWorkers()
+            return
+        if len(shard.buffered) < self.__prefetch:
+            self.__ready.append(shard)
+        else:
+            shard.parked = True
+
+    def __PopPage(self, shard):
+        """Take the oldest page from shard, unparking it if needed."""
+        items = shard.buffered.popleft()
+        if shard.parked and len(shard.buffered) < self.__prefetch:
+            shard.parked = False
+            self.__ready.append(shard)
+            self.__condition.notify_all()
+        return items
+
+    def YieldUnordered(self):
+        """Yield items in the order their pages arrive."""
+        while True:
+            with self.__condition:
+                while not self.__arrivals and self.__num_active:
+                    self.__condition.wait()
+                if not self.__arrivals:
+                    return
+                shard = self.__arrivals.popleft()
+                if not shard.buffered:
+                    six.reraise(*shard.exc_info)
+                items = self.__PopPage(shard)
+            for item in items:
+                yield item
+
+    def YieldShards(self):
+        """Yield an iterator over the items of each shard, in order."""
+        for shard in self.__shards:
+            yield self.__YieldShard(shard)
+
+    def __YieldShard(self, shard):
+        """Yield the items of shard, and of the shards it was split into."""
+        while True:
+            with self.__condition:
+                while not shard.buffered and not shard.done:
+                    self.__condition.wait()
+                if not shard.buffered:
+                    if shard.exc_info is not None:
+                        six.reraise(*shard.exc_info)
+                    break
+                items = self.__PopPage(shard)
+            for item in items:
+                yield item
+        for child in shard.children:
+            for item in self.__YieldShard(child):
+                yield item
+
+
+def YieldFromListSharded(
+        service, request, shards, global_params=None, limit=None,
+        batch_size=100, method='List', field='items', predicate=None,
+        current_token_attribute='pageToken',
+        next_token_attribute='nextPageToken',
+        batch_size_attribute='maxResults',
+        get_field_func=_GetattrNested, max_workers=8, prefetch=2,
+        ordered=False, sort_key=None, split_shard_func=None,
+        split_after_pages=10, fields=None):
+    """List a collection as several page chains run in parallel.
+
+    Each shard is a dict of request attributes, such as a prefix or a
+    start and end offset, which selects a disjoint part of the collection.
+    See PrefixShards and RangeShards. The shards are listed like
+    YieldFromList, with one request in flight per shard and at most
+    max_workers at once. The service's http must be safe to use from
+    several threads, as from http_wrapper.GetHttp(max_connections_per_host=N).
+
+    Args:
+      service: apitools_base.BaseApiService, A service with a .List() method.
+      request: protorpc.messages.Message, The request message
+          corresponding to the service's .List() method. The shard
+          attributes are set on a copy of it.
+      shards: list of dict, Maps from request attribute to value for each
+          shard. An attribute may be a tuple, as a path to the attribute.
+      global_params: protorpc.messages.Message, The global query parameters to
+           provide when calling the given method.
+      limit: int, The maximum number of records to yield. None if all available
+          records should be yielded.
+      batch_size: int, The number of items to retrieve per request.
+      method: str, The name of the method used to fetch resources.
+      field: str, The field in the response that will be a list of items.
+      predicate: lambda, A function that returns true for items to be yielded.
+      current_token_attribute: str or tuple, As for YieldFromList.
+      next_token_attribute: str or tuple, As for YieldFromList.
+      batch_size_attribute: str or tuple, As for YieldFromList.
+      get_field_func: Function that returns the items to be yielded. Argument
+          is response message, and field.
+      max_workers: int, The number of threads making requests.
+      prefetch: int, The number of pages each shard may fetch ahead of
+          the caller.
+      ordered: bool, If false, items are yielded as their pages arrive.
+          If true, items are yielded in order: by a heap merge on
+          sort_key if it is given, or else shard by shard, for shards
+          which are given in key order.
+      sort_key: Function of an item returning its sort key, for ordered.
+          Each shard must list its items in this order.
+      split_shard_func: Function of a shard and the items of its latest
+          page, returning a list of shards covering the rest of that
+          shard's key space after the items, or None to keep listing it.
+          It is called once a shard has fetched split_after_pages pages,
+          so hot shards can be split adaptively. Its new shards start
+          counting pages afresh.
+      split_after_pages: int, The number of pages a shard fetches before
+          split_shard_func is called for it.
+      fields: list, Paths of the fields to request for each item, as for
+          YieldFromList.
+
+    Yields:
+      protorpc.message.Message, The resources listed by the service.
+    """
+    if limit is not None and not limit:
+        return
+    if fields:
+        global_params = _AddResponseFields(
+            service, method, global_params, fields, field,
+            next_token_attribute)
+
+    def MakePages(attributes):
+        shard_request = encoding.CopyProtoMessage(request)
+        for attribute, value in attributes.items():
+            _SetattrNested(shard_request, attribute, value)
+        return _YieldPages(
+            service, shard_request, global_params, limit, batch_size, method,
+            field, predicate, current_token_attribute, next_token_attribute,
+            batch_size_attribute, get_field_func)
+
+    lister = _ShardedLister(MakePages, shards, max_workers, max(1, prefetch),
+                            ordered, split_shard_func, split_after_pages)
+    lister.Start()
+    if not ordered:
+        items = lister.YieldUnordered()
+    elif sort_key is not None:
+        items = heapq.merge(*lister.YieldShards(), key=sort_key)
+    else:
+        items = itertools.chain.from_iterable(lister.YieldShards())
+    try:
         for item in items:
             yield item
             if limit is None:
@@ -129,7 +589,5 @@ def YieldFromList(
             limit -= 1
             if not limit:
                 return
-        token = _GetattrNested(response, next_token_attribute)
-        if not token:
-            return
-        _SetattrNested(request, current_token_attribute, token)
+    finally:
+        lister.Stop()
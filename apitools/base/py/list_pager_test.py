@@ -15,8 +15,13 @@
 
 """Tests for list_pager."""
 
+import threading
+import time
 import unittest
 
+from apitools.base.protorpclite import messages as protorpc_messages
+from apitools.base.py import encoding
+from apitools.base.py import exceptions
 from apitools.base.py import list_pager
 from apitools.base.py.testing import mock
 from samples.fusiontables_sample.fusiontables_v1 \
@@ -366,3 +371,325 @@ class ListPagerAttributeTest(unittest.TestCase):
         for i, instance in enumerate(results):
             self.assertEqual('c{0}'.format(i), instance.fullResourcePath)
         self.assertEqual(1, i)
+
+
+class _FakeColumnService(object):
+
+    """A column service serving pages of two columns each."""
+
+    def __init__(self, num_pages, error_page=None):
+        self.num_pages = num_pages
+        self.error_page = error_page
+        self.requests = []
+        self.global_params = []
+        self.requested = threading.Event()
+        self.client = fusiontables.FusiontablesV1(get_credentials=False)
+
+    def GetResponseType(self, unused_method):
+        return messages.ColumnList
+
+    def List(self, request, global_params=None):
+        page = int(request.pageToken or 0)
+        self.requests.append(encoding.CopyProtoMessage(request))
+        self.global_params.append(global_params)
+        self.requested.set()
+        if page == self.error_page:
+            raise exceptions.HttpError({'status': 500}, 'error', 'url')
+        next_page = page + 1
+        return messages.ColumnList(
+            items=[messages.Column(name='c%d' % (2 * page)),
+                   messages.Column(name='c%d' % (2 * page + 1))],
+            nextPageToken=(str(next_page) if next_page < self.num_pages
+                           else None))
+
+
+class PrefetchTest(unittest.TestCase):
+
+    def _Names(self, results):
+        return [column.name for column in results]
+
+    def testPrefetch(self):
+        service = _FakeColumnService(5)
+        request = messages.FusiontablesColumnListRequest(tableId='mytable')
+        results = list_pager.YieldFromList(service, request, prefetch=2)
+
+        self.assertEqual(['c%d' % i for i in range(10)], self._Names(results))
+        self.assertEqual([None, '1', '2', '3', '4'],
+                         [r.pageToken for r in service.requests])
+        self.assertIsNone(request.pageToken)
+
+    def testPrefetchFetchesAhead(self):
+        service = _FakeColumnService(5)
+        request = messages.FusiontablesColumnListRequest(tableId='mytable')
+        results = list_pager.YieldFromList(service, request, prefetch=2)
+
+        self.assertEqual('c0', next(results).name)
+        # The fetcher holds up to two pages beyond the current one, and one
+        # more while it waits for room.
+        for _ in range(100):
+            if len(service.requests) == 4:
+                break
+            time.sleep(0.01)
+        self.assertEqual(4, len(service.requests))
+        results.close()
+
+    def testPrefetchLimit(self):
+        service = _FakeColumnService(5)
+        request = messages.FusiontablesColumnListRequest(tableId='mytable')
+        results = list_pager.YieldFromList(
+            service, request, limit=5, batch_size=2, prefetch=3,
+            predicate=lambda column: column.name != 'c1')
+
+        self.assertEqual(['c0', 'c2', 'c3', 'c4', 'c5'], self._Names(results))
+        # Pages are requested exactly as without prefetching.
+        self.assertEqual([(None, 2), ('1', 2), ('2', 2)],
+                         [(r.pageToken, r.maxResults)
+                          for r in service.requests])
+
+    def testPrefetchError(self):
+        service = _FakeColumnService(5, error_page=2)
+        request = messages.FusiontablesColumnListRequest(tableId='mytable')
+        results = list_pager.YieldFromList(service, request, prefetch=4)
+
+        names = []
+        with self.assertRaises(exceptions.HttpError):
+            for column in results:
+                names.append(column.name)
+        self.assertEqual(['c0', 'c1', 'c2', 'c3'], names)
+        self.assertEqual(3, len(service.requests))
+
+    def testPrefetchClose(self):
+        service = _FakeColumnService(1000)
+        request = messages.FusiontablesColumnListRequest(tableId='mytable')
+        results = list_pager.YieldFromList(service, request, prefetch=1)
+
+        self.assertEqual('c0', next(results).name)
+        results.close()
+        num_requests = len(service.requests)
+        service.requested.clear()
+        # No more than the request in flight when closing completes.
+        service.requested.wait(0.1)
+        self.assertLessEqual(len(service.requests), num_requests + 1)
+        self.assertLess(len(service.requests), 5)
+
+
+class FieldsTest(unittest.TestCase):
+
+    def testFields(self):
+        service = _FakeColumnService(2)
+        request = messages.FusiontablesColumnListRequest(tableId='mytable')
+        global_params = messages.StandardQueryParameters(quotaUser='user')
+        results = list_pager.YieldFromList(
+            service, request, global_params=global_params,
+            fields=['name', 'baseColumn.tableIndex'])
+
+        self.assertEqual(4, len(list(results)))
+        self.assertEqual(2, len(service.global_params))
+        for params in service.global_params:
+            self.assertEqual(
+                'items(name,baseColumn(tableIndex)),nextPageToken',
+                params.fields)
+            self.assertEqual('user', params.quotaUser)
+        self.assertIsNone(global_params.fields)
+
+    def testFieldsValidated(self):
+        service = _FakeColumnService(2)
+        request = messages.FusiontablesColumnListRequest(tableId='mytable')
+        with self.assertRaises(exceptions.InvalidUserInputError):
+            list(list_pager.YieldFromList(service, request,
+                                          fields=['nmae']))
+        with self.assertRaises(exceptions.InvalidUserInputError):
+            list(list_pager.YieldFromList(
+                service, request, fields=['name'],
+                global_params=messages.StandardQueryParameters(
+                    fields='items')))
+        self.assertEqual([], service.requests)
+
+
+class _ListObjectsRequest(protorpc_messages.Message):
+    prefix = protorpc_messages.StringField(1)
+    startOffset = protorpc_messages.StringField(2)
+    endOffset = protorpc_messages.StringField(3)
+    pageToken = protorpc_messages.StringField(4)
+    maxResults = protorpc_messages.IntegerField(5)
+
+
+class _Object(protorpc_messages.Message):
+    name = protorpc_messages.StringField(1)
+
+
+class _Objects(protorpc_messages.Message):
+    items = protorpc_messages.MessageField(_Object, 1, repeated=True)
+    nextPageToken = protorpc_messages.StringField(2)
+
+
+class _FakeObjectsService(object):
+
+    """Lists objects by prefix or range, like the storage API."""
+
+    def __init__(self, names, error_prefix=None):
+        self.names = sorted(names)
+        self.error_prefix = error_prefix
+        self.lock = threading.Lock()
+        self.requests = []
+
+    def List(self, request, global_params=None):
+        with self.lock:
+            self.requests.append(encoding.CopyProtoMessage(request))
+        if request.prefix == self.error_prefix is not None:
+            raise exceptions.HttpError({'status': 500}, 'error', 'url')
+        names = [name for name in self.names
+                 if name.startswith(request.prefix or '') and
+                 name >= (request.startOffset or '') and
+                 (request.endOffset is None or name < request.endOffset) and
+                 name > (request.pageToken or '')]
+        page = names[:request.maxResults]
+        return _Objects(
+            items=[_Object(name=name) for name in page],
+            nextPageToken=page[-1] if len(names) > len(page) else None)
+
+
+class ShardedListTest(unittest.TestCase):
+
+    def setUp(self):
+        self.names = ['%s%02d' % (letter, i)
+                      for letter in 'abcd' for i in range(25)]
+        self.service = _FakeObjectsService(self.names)
+
+    def _Names(self, results):
+        return [item.name for item in results]
+
+    def testPrefixShardsUnordered(self):
+        results = list_pager.YieldFromListSharded(
+            self.service, _ListObjectsRequest(),
+            list_pager.PrefixShards(['a', 'b', 'c', 'd']), batch_size=10,
+            max_workers=2)
+
+        self.assertEqual(sorted(self.names), sorted(self._Names(results)))
+        self.assertEqual(12, len(self.service.requests))
+
+    def testPrefixShardsInShardOrder(self):
+        results = list_pager.YieldFromListSharded(
+            self.service, _ListObjectsRequest(),
+            list_pager.PrefixShards(['a', 'b', 'c', 'd']), batch_size=10,
+            prefetch=1, ordered=True)
+
+        self.assertEqual(self.names, self._Names(results))
+
+    def testRangeShardsHeapMerge(self):
+        shards = list_pager.RangeShards(['b', 'c05', 'd'])
+        self.assertEqual(
+            [{'startOffset': None, 'endOffset': 'b'},
+             {'startOffset': 'b', 'endOffset': 'c05'},
+             {'startOffset': 'c05', 'endOffset': 'd'},
+             {'startOffset': 'd', 'endOffset': None}], shards)
+        # Interleave the shards, so only the merge puts them in order.
+        shards = list_pager.PrefixShards(
+            ['%d' % i for i in range(10)], prefix_attribute=('prefix',))
+        names = ['%d%s' % (i % 10, name) for i, name in enumerate(self.names)]
+        service = _FakeObjectsService(names)
+
+        results = list_pager.YieldFromListSharded(
+            service, _ListObjectsRequest(), shards, batch_size=3,
+            max_workers=3, ordered=True, sort_key=lambda item: item.name)
+
+        self.assertEqual(sorted(names), self._Names(results))
+
+    def testSplitHotShards(self):
+
+        def SplitShard(shard, items):
+            # Split the rest of the range at the next letter.
+            last = items[-1].name
+            split_point = chr(ord(last[0]) + 1)
+            end = shard['endOffset']
+            if end is not None and split_point >= end:
+                return None
+            return [{'startOffset': last + '\0', 'endOffset': split_point},
+                    {'startOffset': split_point, 'endOffset': end}]
+
+        results = list_pager.YieldFromListSharded(
+            self.service, _ListObjectsRequest(),
+            list_pager.RangeShards([]), batch_size=10, ordered=True,
+            split_shard_func=SplitShard, split_after_pages=2)
+
+        self.assertEqual(self.names, self._Names(results))
+        self.assertEqual(
+            set([None, 'a', 'b', 'c', 'd', 'e']),
+            set(request.startOffset and request.startOffset[0]
+                for request in self.service.requests))
+
+    def testSplitShardsFetchInParallel(self):
+        service = _FakeObjectsService(self.names)
+        in_flight = []
+        max_in_flight = []
+        overlapped = threading.Condition()
+        list_objects = service.List
+
+        def ListOverlapping(request, global_params=None):
+            with overlapped:
+                in_flight.append(request)
+                max_in_flight.append(len(in_flight))
+                overlapped.notify_all()
+                # Until two requests have overlapped, give the other child
+                # shard a moment to start one.
+                if request.startOffset is not None:
+                    deadline = time.time() + 5
+                    while (max(max_in_flight) < 2 and
+                           time.time() < deadline):
+                        overlapped.wait(deadline - time.time())
+            try:
+                return list_objects(request, global_params=global_params)
+            finally:
+                with overlapped:
+                    in_flight.remove(request)
+        service.List = ListOverlapping
+
+        def SplitShard(shard, items):
+            # Split the initial shard only.
+            if shard['startOffset'] is not None:
+                return None
+            return [{'startOffset': items[-1].name + '\0',
+                     'endOffset': 'c'},
+                    {'startOffset': 'c', 'endOffset': None}]
+
+        results = list_pager.YieldFromListSharded(
+            service, _ListObjectsRequest(), list_pager.RangeShards([]),
+            batch_size=10, max_workers=2, ordered=True,
+            split_shard_func=SplitShard, split_after_pages=1)
+
+        self.assertEqual(self.names, self._Names(results))
+        self.assertEqual(2, max(max_in_flight))
+
+    def testLimit(self):
+        results = list_pager.YieldFromListSharded(
+            self.service, _ListObjectsRequest(),
+            list_pager.PrefixShards(['a', 'b']), batch_size=10, limit=15,
+            ordered=True, prefetch=1)
+
+        self.assertEqual(self.names[:15], self._Names(results))
+        # Each shard stops once it has listed limit items.
+        self.assertEqual(
+            [10, 5], [request.maxResults for request in self.service.requests
+                      if request.prefix == 'a'])
+
+    def testError(self):
+        service = _FakeObjectsService(self.names, error_prefix='c')
+        results = list_pager.YieldFromListSharded(
+            service, _ListObjectsRequest(),
+            list_pager.PrefixShards(['a', 'b', 'c', 'd']), batch_size=10,
+            ordered=True)
+
+        names = []
+        with self.assertRaises(exceptions.HttpError):
+            for item in results:
+                names.append(item.name)
+        self.assertEqual(self.names[:50], names)
+
+    def testUnorderedError(self):
+        service = _FakeObjectsService(self.names, error_prefix='c')
+        results = list_pager.YieldFromListSharded(
+            service, _ListObjectsRequest(),
+            list_pager.PrefixShards(['a', 'b', 'c', 'd']), batch_size=10)
+
+        with self.assertRaises(exceptions.HttpError):
+            list(results)
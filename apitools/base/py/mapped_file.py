@@ -0,0 +1,110 @@
+#!/usr/bin/env python
+#
+# Copyright 2015 Google Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Read-only file stream whose reads are views of a memory map."""
+
+import io
+import mmap
+import os
+
+
+class MappedFile(io.RawIOBase):
+
+    """Reads a file through a memory map, without copying.
+
+    read() returns a memoryview of the mapped file rather than bytes, so
+    an upload chunk goes from the page cache to the socket without an
+    intermediate copy. StreamSlice and BufferedStream pass these views
+    through unchanged.
+
+    The file must not be truncated while it is mapped. Closing the
+    stream while views returned by read() are still referenced leaves
+    the map open until they are released.
+    """
+
+    def __init__(self, filename):
+        super(MappedFile, self).__init__()
+        self.name = filename
+        self.__file = open(filename, 'rb')
+        self.__size = os.fstat(self.__file.fileno()).st_size
+        self.__position = 0
+        # mmap can't map an empty file.
+        if self.__size:
+            self.__map = mmap.mmap(
+                self.__file.fileno(), 0, access=mmap.ACCESS_READ)
+            self.__view = memoryview(self.__map)
+        else:
+            self.__map = None
+            self.__view = memoryview(b'')
+
+    @property
+    def size(self):
+        return self.__size
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def read(self, size=-1):
+        """Return a memoryview of at most size bytes from the position."""
+        self._checkClosed()
+        end = self.__size
+        if size is not None and size >= 0:
+            end = min(self.__position + size, self.__size)
+        start = min(self.__position, end)
+        self.__position = max(self.__position, end)
+        return self.__view[start:end]
+
+    def readall(self):
+        return self.read()
+
+    def readinto(self, buf):
+        data = self.read(len(buf))
+        buf[:len(data)] = data
+        return len(data)
+
+    def seek(self, offset, whence=os.SEEK_SET):
+        self._checkClosed()
+        if whence == os.SEEK_CUR:
+            offset += self.__position
+        elif whence == os.SEEK_END:
+            offset += self.__size
+        elif whence != os.SEEK_SET:
+            raise ValueError('Invalid whence: %r' % whence)
+        if offset < 0:
+            raise ValueError('Negative seek position %d' % offset)
+        self.__position = offset
+        return self.__position
+
+    def tell(self):
+        self._checkClosed()
+        return self.__position
+
+    def close(self):
+        if self.closed:
+            return
+        self.__view.release()
+        if self.__map is not None:
+            try:
+                self.__map.close()
+            except BufferError:
+                # Views handed out by read() are still alive; the map is
+                # closed when the last of them is released.
+                pass
+        self.__file.close()
+        super(MappedFile, self).close()
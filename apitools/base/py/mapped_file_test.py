@@ -0,0 +1,98 @@
+#
+# Copyright 2015 Google Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Tests for mapped_file."""
+
+import os
+import shutil
+import string
+import tempfile
+import unittest
+
+from apitools.base.py import buffered_stream
+from apitools.base.py import mapped_file
+from apitools.base.py import stream_slice
+
+
+class MappedFileTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tempdir = tempfile.mkdtemp()
+        self.value = string.ascii_letters.encode('ascii')
+        self.filename = self.__WriteFile('letters', self.value)
+        self.stream = mapped_file.MappedFile(self.filename)
+
+    def tearDown(self):
+        self.stream.close()
+        shutil.rmtree(self.tempdir)
+
+    def __WriteFile(self, name, data):
+        filename = os.path.join(self.tempdir, name)
+        with open(filename, 'wb') as f:
+            f.write(data)
+        return filename
+
+    def testRead(self):
+        data = self.stream.read(10)
+        self.assertIsInstance(data, memoryview)
+        self.assertEqual(self.value[:10], data)
+        self.assertEqual(10, self.stream.tell())
+        self.assertEqual(self.value[10:], self.stream.read())
+        self.assertEqual(b'', self.stream.read(10))
+        self.assertEqual(len(self.value), self.stream.size)
+
+    def testSeek(self):
+        self.assertEqual(40, self.stream.seek(40))
+        self.assertEqual(self.value[40:45], self.stream.read(5))
+        self.assertEqual(40, self.stream.seek(-5, os.SEEK_CUR))
+        self.assertEqual(50, self.stream.seek(-2, os.SEEK_END))
+        self.assertEqual(self.value[50:], self.stream.read())
+        self.stream.seek(100)
+        self.assertEqual(b'', self.stream.read())
+        self.assertEqual(100, self.stream.tell())
+        with self.assertRaises(ValueError):
+            self.stream.seek(-1)
+
+    def testEmptyFile(self):
+        with mapped_file.MappedFile(
+                self.__WriteFile('empty', b'')) as stream:
+            self.assertEqual(b'', stream.read())
+            self.assertEqual(0, stream.size)
+
+    def testCloseWithViewsOutstanding(self):
+        data = self.stream.read(5)
+        self.stream.close()
+        self.assertTrue(self.stream.closed)
+        self.assertEqual(self.value[:5], data)
+        with self.assertRaises(ValueError):
+            self.stream.read()
+
+    def testStreamSlice(self):
+        self.stream.seek(26)
+        data = stream_slice.StreamSlice(self.stream, 10).read()
+        self.assertIsInstance(data, memoryview)
+        self.assertEqual(self.value[26:36], data)
+
+    def testBufferedStream(self):
+        bs = buffered_stream.BufferedStream(self.stream, 0, 100)
+        self.assertTrue(bs.stream_exhausted)
+        data = bs.read(100)
+        self.assertIsInstance(data, memoryview)
+        self.assertEqual(self.value, data)
+        self.assertEqual(b'', bs.read(1))
+
+
+if __name__ == '__main__':
+    unittest.main()
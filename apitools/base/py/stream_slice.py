@@ -58,7 +58,8 @@ class StreamSlice(object):
           size: If provided, read no more than size bytes from the stream.
 
         Returns:
-          The bytes read from this slice.
+          The data read from this slice, as returned by the stream; a
+          memoryview from the stream is passed through without a copy.
 
         Raises:
           exceptions.StreamExhausted
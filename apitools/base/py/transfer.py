@@ -17,6 +17,7 @@
 """Upload and download support for apitools."""
 from __future__ import print_function
 
+import collections
 import email.generator as email_generator
 import email.mime.multipart as mime_multipart
 import email.mime.nonmultipart as mime_nonmultipart
@@ -24,6 +25,7 @@ import io
 import json
 import mimetypes
 import os
+import sys
 import threading
 
 import six
@@ -33,7 +35,9 @@ from apitools.base.py import buffered_stream
 from apitools.base.py import compression
 from apitools.base.py import exceptions
 from apitools.base.py import http_wrapper
+from apitools.base.py import mapped_file
 from apitools.base.py import stream_slice
+from apitools.base.py import upload_checkpoint
 from apitools.base.py import util
 
 __all__ = [
@@ -154,6 +158,10 @@ class _Transfer(object):
             self.__http = http or http_wrapper.GetHttp()
         self.__url = url
 
+    def _Uninitialize(self):
+        """Forget the url set by _Initialize, so it can be called again."""
+        self.__url = None
+
     @property
     def initialized(self):
         return self.url is not None and self.http is not None
@@ -408,7 +416,7 @@ class Download(_Transfer):
 
         return end_byte
 
-    def __GetChunk(self, start, end, additional_headers=None):
+    def __GetChunk(self, start, end, additional_headers=None, http=None):
         """Retrieve a chunk, and return the full response."""
         self.EnsureInitialized()
         request = http_wrapper.Request(url=self.url)
@@ -416,9 +424,15 @@ class Download(_Transfer):
         if additional_headers is not None:
             request.headers.update(additional_headers)
         return http_wrapper.MakeRequest(
-            self.bytes_http, request, retry_func=self.retry_func,
+            http or self.bytes_http, request, retry_func=self.retry_func,
             retries=self.num_retries)
 
+    def __WriteContent(self, content):
+        try:
+            self.stream.write(six.ensure_binary(content))
+        except TypeError:
+            self.stream.write(six.ensure_text(content))
+
     def __ProcessResponse(self, response):
         """Process response (by updating self and writing to self.stream)."""
         if response.status_code not in self._ACCEPTABLE_STATUSES:
@@ -431,10 +445,7 @@ class Download(_Transfer):
                 raise exceptions.TransferRetryError(response.content)
         if response.status_code in (http_client.OK,
                                     http_client.PARTIAL_CONTENT):
-            try:
-                self.stream.write(six.ensure_binary(response.content))
-            except TypeError:
-                self.stream.write(six.ensure_text(response.content))
+            self.__WriteContent(response.content)
             self.__progress += response.length
             if response.info and 'content-encoding' in response.info:
                 # TODO(craigcitro): Handle the case where this changes over a
@@ -548,6 +559,148 @@ class Download(_Transfer):
                 break
         self._ExecuteCallback(finish_callback, response)
 
+    def __NewSliceHttp(self):
+        """Create a new http for a slice worker, reusing any credentials."""
+        http = http_wrapper.GetHttp()
+        # oauth2client records the credentials on the wrapped request method.
+        credentials = getattr(
+            getattr(self.bytes_http, 'request', None), 'credentials', None)
+        if credentials is not None:
+            http = credentials.authorize(http)
+        return http
+
+    def __FetchSlice(self, http, start, end, lock, callback,
+                     additional_headers=None):
+        """Fetch bytes [start, end] and write them at their stream offset."""
+        last_response = None
+        while start <= end:
+            response = self.__GetChunk(start, end, http=http,
+                                       additional_headers=additional_headers)
+            if response.status_code not in (http_client.OK,
+                                            http_client.PARTIAL_CONTENT):
+                if response.status_code in (http_client.FORBIDDEN,
+                                            http_client.NOT_FOUND):
+                    raise exceptions.HttpError.FromResponse(response)
+                raise exceptions.TransferRetryError(response.content)
+            if (response.status_code == http_client.OK and
+                    (start != 0 or end != self.total_size - 1)):
+                # The server ignored our Range header and sent the whole
+                # object, which we can't place at this slice's offset.
+                raise exceptions.TransferRetryError(
+                    'Range ignored by server for slice bytes %d-%d' % (
+                        start, end))
+            if response.length == 0:
+                raise exceptions.TransferRetryError(
+                    'Zero bytes unexpectedly returned in download response')
+            with lock:
+                self.stream.seek(start)
+                self.__WriteContent(response.content)
+                self.__progress += response.length
+                if response.info and 'content-encoding' in response.info:
+                    self.__encoding = response.info['content-encoding']
+            self._ExecuteCallback(callback, response)
+            start += response.length
+            last_response = response
+        return last_response
+
+    def StreamInSlices(self, num_workers=4, callback=None,
+                       finish_callback=None, additional_headers=None,
+                       http_factory=None):
+        """Stream the entire download as byte ranges fetched in parallel.
+
+        The bytes remaining after self.progress are split into slices of
+        self.chunksize, which are fetched by num_workers threads, each
+        with its own http object. Each slice is written at its offset in
+        self.stream, so the stream must be seekable. Every slice request
+        is retried just as in StreamInChunks.
+
+        Args:
+          num_workers: (int, default: 4) Number of slices to fetch
+              concurrently.
+          callback: (default: None) Callback to call as each chunk is
+              completed. Chunks may complete out of order.
+          finish_callback: (default: None) Callback to call when the
+              download is complete.
+          additional_headers: (default: None) Additional headers to
+              include in fetching bytes.
+          http_factory: (default: None) Function called with no arguments
+              to create the http object for each worker. By default, a new
+              http is created and authorized with the credentials of
+              self.bytes_http, if any.
+
+        Returns:
+            None. Streams bytes into self.stream.
+        """
+        callback = callback or self.progress_callback
+        finish_callback = finish_callback or self.finish_callback
+        http_factory = http_factory or self.__NewSliceHttp
+        if num_workers < 1:
+            raise exceptions.InvalidUserInputError(
+                'Must have at least one worker, got %s' % num_workers)
+        seekable = getattr(self.stream, 'seekable', None)
+        if (not hasattr(self.stream, 'seek') or
+                (seekable is not None and not seekable())):
+            raise exceptions.InvalidUserInputError(
+                'Cannot stream slices into a non-seekable stream')
+
+        self.EnsureInitialized()
+        response = self.__initial_response
+        self.__initial_response = None
+        if response is None and self.total_size is None:
+            # We need to know the total size before we can slice it up.
+            response = self.__GetChunk(
+                self.progress, self.__ComputeEndByte(self.progress),
+                additional_headers=additional_headers)
+            self.__SetTotal(response.info)
+        if response is not None:
+            response = self.__ProcessResponse(response)
+            self._ExecuteCallback(callback, response)
+            if (response.status_code == http_client.OK or
+                    self.progress >= self.total_size):
+                self._ExecuteCallback(finish_callback, response)
+                return
+
+        slices = six.moves.queue.Queue()
+        for start in six.moves.range(
+                self.progress, self.total_size, self.chunksize):
+            slices.put(
+                (start, min(start + self.chunksize, self.total_size) - 1))
+        lock = threading.Lock()
+        errors = []
+        responses = []
+
+        def FetchSlices(http):
+            while not errors:
+                try:
+                    start, end = slices.get_nowait()
+                except six.moves.queue.Empty:
+                    return
+                try:
+                    responses.append(self.__FetchSlice(
+                        http, start, end, lock, callback,
+                        additional_headers=additional_headers))
+                # Hand the failure to the calling thread, and stop the
+                # other workers from picking up new slices.
+                # pylint: disable=broad-except
+                except Exception:
+                    errors.append(sys.exc_info())
+                    return
+
+        workers = []
+        for _ in six.moves.range(min(num_workers, slices.qsize())):
+            worker = threading.Thread(target=FetchSlices,
+                                      args=(http_factory(),))
+            worker.daemon = True
+            worker.start()
+            workers.append(worker)
+        for worker in workers:
+            worker.join()
+        if errors:
+            six.reraise(*errors[0])
+        self.stream.seek(self.total_size)
+        self._ExecuteCallback(finish_callback,
+                              responses[-1] if responses else response)
+
 
 if six.PY3:
     class MultipartBytesGenerator(email_generator.BytesGenerator):
@@ -572,6 +725,145 @@ if six.PY3:
         _writeBody = _handle_text
 
 
+def _IsSeekable(stream):
+    seekable = getattr(stream, 'seekable', None)
+    return (hasattr(stream, 'seek') and hasattr(stream, 'tell') and
+            (seekable is None or seekable()))
+
+
+class _MediaRequestBody(object):
+
+    """A request body streaming the media between a prefix and a suffix.
+
+    Iterating over the body yields prefix, then media_length bytes of
+    stream from its position when the body was created, in pieces of at
+    most piece_size bytes, then suffix. Every iteration seeks back to
+    the start of the media, so the body can be sent again on a retry.
+    Only the length is computed up front, for the Content-Length header.
+    """
+
+    def __init__(self, stream, media_length, prefix=b'', suffix=b'',
+                 piece_size=1 << 20):
+        self.__stream = stream
+        self.__media_start = stream.tell()
+        self.__media_length = media_length
+        self.__prefix = prefix
+        self.__suffix = suffix
+        self.__piece_size = piece_size
+
+    def __len__(self):
+        return self.length
+
+    def __nonzero__(self):
+        # For 32-bit python2.x, len() cannot exceed a 32-bit number; avoid
+        # accidental len() calls from httplib in the form of "if this_object:".
+        return bool(self.length)
+
+    @property
+    def length(self):
+        # For 32-bit python2.x, len() cannot exceed a 32-bit number.
+        return len(self.__prefix) + self.__media_length + len(self.__suffix)
+
+    def __iter__(self):
+        if self.__prefix:
+            yield self.__prefix
+        self.__stream.seek(self.__media_start)
+        remaining = self.__media_length
+        while remaining:
+            data = self.__stream.read(min(remaining, self.__piece_size))
+            if not data:
+                raise exceptions.StreamExhausted(
+                    'Not enough bytes in stream; expected %d, exhausted '
+                    'after %d' % (self.__media_length,
+                                  self.__media_length - remaining))
+            remaining -= len(data)
+            yield data
+        if self.__suffix:
+            yield self.__suffix
+
+
+# start, end: Range of stream positions the chunk holds.
+# body: Request body; bytes, or a stream reading the chunk.
+# last: True iff no chunk follows this one.
+_UploadChunk = collections.namedtuple(
+    '_UploadChunk', ['start', 'end', 'body', 'last'])
+
+
+class _ChunkReader(object):
+
+    """Reads upload chunks on a thread, ahead of the one being sent.
+
+    At most max_buffers chunks are held at once, counting the one most
+    recently returned by Next, which is taken to be in flight until Next
+    is called again. While the reader runs, it owns the stream: callers
+    must Stop it before using the stream themselves.
+    """
+
+    def __init__(self, read_func, max_buffers):
+        self.__read_func = read_func
+        self.__max_buffers = max_buffers
+        self.__stream = None
+        self.__thread = None
+        self.__next_start = None
+
+    def __Start(self, stream, start):
+        if stream.tell() != start:
+            stream.seek(start)
+        self.__chunks = six.moves.queue.Queue()
+        self.__buffers = threading.Semaphore(self.__max_buffers)
+        self.__stop = threading.Event()
+        self.__thread = threading.Thread(
+            target=self.__Read,
+            args=(start, self.__chunks, self.__buffers, self.__stop))
+        self.__thread.daemon = True
+        self.__thread.start()
+
+    def __Read(self, start, chunks, buffers, stop):
+        try:
+            while True:
+                buffers.acquire()
+                if stop.is_set():
+                    return
+                chunk = self.__read_func(start)
+                chunks.put((chunk, None))
+                if chunk.last:
+                    return
+                start = chunk.end
+        # Hand the failure to the sending thread.
+        # pylint: disable=broad-except
+        except Exception:
+            chunks.put((None, sys.exc_info()))
+
+    def Next(self, stream, start):
+        """Return the chunk of stream starting at start.
+
+        Chunks read ahead are discarded if start is not where the
+        previous chunk ended, as after a short write.
+        """
+        if self.__thread is not None and start == self.__next_start:
+            # The previous chunk is no longer in flight.
+            self.__buffers.release()
+        else:
+            self.Stop()
+            self.__Start(stream, start)
+        chunk, exc_info = self.__chunks.get()
+        if exc_info is not None:
+            self.Stop()
+            six.reraise(*exc_info)
+        self.__next_start = None if chunk.last else chunk.end
+        return chunk
+
+    def Stop(self):
+        """Stop reading ahead, leaving the stream at an arbitrary position."""
+        if self.__thread is None:
+            return
+        self.__stop.set()
+        self.__buffers.release()
+        self.__thread.join()
+        self.__thread = None
+        self.__next_start = None
+
+
 class Upload(_Transfer):
 
     """Data for a single Upload.
@@ -584,6 +876,17 @@ class Upload(_Transfer):
           stream when finished with the upload.
       auto_transfer: (default: True) If True, stream all bytes as soon as
           the upload is created.
+      pipeline_buffers: (optional) If set, StreamInChunks reads (and
+          compresses) each chunk on a separate thread while the previous
+          one is sent, holding at most this many chunks in memory. Use 2
+          for double buffering.
+      gzip_threads: (optional) With gzip_encoded, the number of threads
+          to compress on. See compression.ParallelGzipFile.
+      checkpoint_store: (optional) An upload_checkpoint.CheckpointStore.
+          If set, a resumable upload records its session there, under
+          checkpoint_key, after each chunk the server acknowledges.
+      checkpoint_key: (optional) Key of the checkpoint; required with
+          checkpoint_store.
     """
     _REQUIRED_SERIALIZATION_KEYS = set((
         'auto_transfer', 'mime_type', 'total_size', 'url'))
@@ -591,7 +894,8 @@ class Upload(_Transfer):
     def __init__(self, stream, mime_type, total_size=None, http=None,
                  close_stream=False, chunksize=None, auto_transfer=True,
                  progress_callback=None, finish_callback=None,
-                 gzip_encoded=False, **kwds):
+                 gzip_encoded=False, pipeline_buffers=None, gzip_threads=None,
+                 checkpoint_store=None, checkpoint_key=None, **kwds):
         super(Upload, self).__init__(
             stream, close_stream=close_stream, chunksize=chunksize,
             auto_transfer=auto_transfer, http=http, **kwds)
@@ -603,6 +907,20 @@ class Upload(_Transfer):
         self.__strategy = None
         self.__total_size = None
         self.__gzip_encoded = gzip_encoded
+        self.__gzip_threads = gzip_threads
+        if pipeline_buffers is not None and pipeline_buffers < 1:
+            raise exceptions.InvalidUserInputError(
+                'pipeline_buffers must be positive, got %s' %
+                pipeline_buffers)
+        self.__pipeline_buffers = pipeline_buffers
+        if checkpoint_store is not None and checkpoint_key is None:
+            raise exceptions.InvalidUserInputError(
+                'checkpoint_key is required with checkpoint_store')
+        self.__checkpoint_store = checkpoint_store
+        self.__checkpoint_key = checkpoint_key
+        self.__fingerprint = None
+        # The stored checkpoint this upload resumes, if any.
+        self.__resume_checkpoint = None
 
         self.progress_callback = progress_callback
         self.finish_callback = finish_callback
@@ -614,8 +932,21 @@ class Upload(_Transfer):
 
     @classmethod
     def FromFile(cls, filename, mime_type=None, auto_transfer=True,
-                 gzip_encoded=False, **kwds):
-        """Create a new Upload object from a filename."""
+                 gzip_encoded=False, memory_map=False, resume=False,
+                 checkpoint_store=None, **kwds):
+        """Create a new Upload object from a filename.
+
+        If memory_map is True, the file is read through a memory map
+        (see mapped_file.MappedFile), and each chunk is sent from a view
+        of the map rather than a copy. This needs Python 3.
+
+        If resume is True, a resumable upload of the file is checkpointed
+        in checkpoint_store (by default, an
+        upload_checkpoint.FileCheckpointStore). If a checkpoint for the
+        unmodified file is already there, InitializeUpload continues that
+        session from the server's committed offset instead of starting a
+        new one.
+        """
         path = os.path.expanduser(filename)
         if not os.path.exists(path):
             raise exceptions.NotFoundError('Could not find file %s' % path)
@@ -624,10 +955,46 @@ class Upload(_Transfer):
             if mime_type is None:
                 raise exceptions.InvalidUserInputError(
                     'Could not guess mime type for %s' % path)
+        if memory_map and six.PY2:
+            raise exceptions.InvalidUserInputError(
+                'memory_map requires Python 3')
+        if resume:
+            kwds['checkpoint_store'] = (
+                checkpoint_store or upload_checkpoint.FileCheckpointStore())
+            kwds['checkpoint_key'] = os.path.abspath(path)
         size = os.stat(path).st_size
-        return cls(open(path, 'rb'), mime_type, total_size=size,
-                   close_stream=True, auto_transfer=auto_transfer,
-                   gzip_encoded=gzip_encoded, **kwds)
+        stream = (mapped_file.MappedFile(path) if memory_map
+                  else open(path, 'rb'))
+        upload = cls(stream, mime_type, total_size=size,
+                     close_stream=True, auto_transfer=auto_transfer,
+                     gzip_encoded=gzip_encoded, **kwds)
+        if resume:
+            upload.__fingerprint = upload_checkpoint.FileFingerprint(path)
+            upload.__LoadCheckpoint()
+        return upload
+
+    def __LoadCheckpoint(self):
+        """Find a checkpoint of this upload to resume, if there is one."""
+        checkpoint = self.__checkpoint_store.Get(self.__checkpoint_key)
+        if checkpoint is None:
+            return
+        if (checkpoint.fingerprint != self.__fingerprint or
+                checkpoint.total_size != self.total_size):
+            # The source changed since the checkpoint was written.
+            self.__checkpoint_store.Delete(self.__checkpoint_key)
+            return
+        self.__resume_checkpoint = checkpoint
+        # The session is resumable, whatever the default strategy.
+        self.strategy = RESUMABLE_UPLOAD
+
+    def __SaveCheckpoint(self, committed):
+        """Record that the server has the first committed bytes."""
+        if self.__checkpoint_store is None:
+            return
+        self.__checkpoint_store.Put(
+            self.__checkpoint_key, upload_checkpoint.UploadCheckpoint(
+                url=self.url, total_size=self.total_size,
+                fingerprint=self.__fingerprint, committed=committed))
 
     @classmethod
     def FromStream(cls, stream, mime_type, total_size=None, auto_transfer=True,
@@ -791,9 +1158,13 @@ class Upload(_Transfer):
                 # the body, which we can't do with a stream. So, we consume the
                 # bytes from the stream now and store them in a re-readable
                 # bytes container.
+                body = http_request.body
+                if isinstance(body, _MediaRequestBody):
+                    body = b''.join(body)
                 http_request.body = (
                     compression.CompressStream(
-                        six.BytesIO(http_request.body))[0].read())
+                        six.BytesIO(body),
+                        num_threads=self.__gzip_threads)[0].read())
         else:
             url_builder.relative_path = upload_config.resumable_path
             url_builder.query_params['uploadType'] = 'resumable'
@@ -802,9 +1173,25 @@ class Upload(_Transfer):
     def __ConfigureMediaRequest(self, http_request):
         """Configure http_request as a simple request for this upload."""
         http_request.headers['content-type'] = self.mime_type
-        http_request.body = self.stream.read()
+        http_request.body = self.__MediaBody()
         http_request.loggable_body = '<media body>'
 
+    def __MediaBody(self, prefix=b'', suffix=b''):
+        """Return a request body of prefix, the media and suffix.
+
+        If the size of the media is known and the stream can seek back for
+        retries, the media is read as the request is sent. Otherwise the
+        rest of the stream is read into memory now.
+        """
+        # httplib in Python 2 can't send an iterable body.
+        if (six.PY2 or self.total_size is None or
+                not _IsSeekable(self.stream)):
+            if not prefix and not suffix:
+                return self.stream.read()
+            return b''.join((prefix, self.stream.read(), suffix))
+        return _MediaRequestBody(self.stream, self.total_size,
+                                 prefix=prefix, suffix=suffix)
+
     def __ConfigureMultipartRequest(self, http_request):
         """Configure http_request as a multipart request for this upload."""
         # This is a multipart/related upload.
@@ -818,10 +1205,11 @@ class Upload(_Transfer):
         msg.set_payload(http_request.body)
         msg_root.attach(msg)
 
-        # attach the media as the second part
+        # attach the media as the second part; a placeholder marks where
+        # it goes, so that the media itself never passes through email.
         msg = mime_nonmultipart.MIMENonMultipart(*self.mime_type.split('/'))
         msg['Content-Transfer-Encoding'] = 'binary'
-        msg.set_payload(self.stream.read())
+        msg.set_payload('<media body>')
         msg_root.attach(msg)
 
         # NOTE: We encode the body, but can't use
@@ -834,18 +1222,14 @@ class Upload(_Transfer):
             generator_class = email_generator.Generator
         g = generator_class(fp, mangle_from_=False)
         g.flatten(msg_root, unixfrom=False)
-        http_request.body = fp.getvalue()
+        loggable_body = fp.getvalue()
+        prefix, _, suffix = loggable_body.rpartition(b'<media body>')
+        http_request.body = self.__MediaBody(prefix=prefix, suffix=suffix)
 
         multipart_boundary = msg_root.get_boundary()
         http_request.headers['content-type'] = (
             'multipart/related; boundary=%r' % multipart_boundary)
-        if isinstance(multipart_boundary, six.text_type):
-            multipart_boundary = multipart_boundary.encode('ascii')
-
-        body_components = http_request.body.split(multipart_boundary)
-        headers, _, _ = body_components[-2].partition(b'\n\n')
-        body_components[-2] = b'\n\n'.join([headers, b'<media body>\n\n--'])
-        http_request.loggable_body = multipart_boundary.join(body_components)
+        http_request.loggable_body = loggable_body
 
     def __ConfigureResumableRequest(self, http_request):
         http_request.headers['X-Upload-Content-Type'] = self.mime_type
@@ -857,7 +1241,7 @@ class Upload(_Transfer):
         """Talk to the server and refresh the state of this resumable upload.
 
         Returns:
-          Response if the upload is complete.
+          The server's response to the status request.
         """
         if self.strategy != RESUMABLE_UPLOAD:
             return
@@ -886,6 +1270,7 @@ class Upload(_Transfer):
             self.stream.seek(self.progress)
         else:
             raise exceptions.HttpError.FromResponse(refresh_response)
+        return refresh_response
 
     def _GetRangeHeaderFromResponse(self, response):
         return response.info.get('Range', response.info.get('range'))
@@ -900,6 +1285,10 @@ class Upload(_Transfer):
         if self.strategy != RESUMABLE_UPLOAD:
             return
         http = http or client.http
+        if self.__resume_checkpoint is not None:
+            http_response = self.__ResumeFromCheckpoint(http)
+            if http_response is not None:
+                return http_response
         if client is not None:
             http_request.url = client.FinalizeTransferUrl(http_request.url)
         self.EnsureUninitialized()
@@ -914,6 +1303,7 @@ class Upload(_Transfer):
         if client is not None:
             url = client.FinalizeTransferUrl(url)
         self._Initialize(http, url)
+        self.__SaveCheckpoint(0)
 
         # Unless the user has requested otherwise, we want to just
         # go ahead and pump the bytes now.
@@ -921,6 +1311,34 @@ class Upload(_Transfer):
             return self.StreamInChunks()
         return http_response
 
+    def __ResumeFromCheckpoint(self, http):
+        """Continue the session in the checkpoint this upload was made with.
+
+        Returns:
+          As for InitializeUpload, or None if the session has expired and
+          a new one must be started.
+        """
+        checkpoint = self.__resume_checkpoint
+        self.__resume_checkpoint = None
+        self._Initialize(http, checkpoint.url)
+        try:
+            http_response = self.RefreshResumableUploadState()
+        except exceptions.HttpError as e:
+            if e.status_code not in (http_client.NOT_FOUND, http_client.GONE):
+                raise
+            self.__checkpoint_store.Delete(self.__checkpoint_key)
+            self._Uninitialize()
+            return None
+        if self.auto_transfer:
+            return self.StreamInChunks()
+        if http_response.status_code == http_wrapper.RESUME_INCOMPLETE:
+            # The API method expects a response like the one that creates
+            # a session, not the 308 from the status request.
+            http_response = http_wrapper.Response(
+                info={'status': str(http_client.OK), 'location': self.url},
+                content='', request_url=self.url)
+        return http_response
+
     def __GetLastByte(self, range_header):
         _, _, end = range_header.partition('-')
         # TODO(craigcitro): Validate start == 0?
@@ -966,6 +1384,9 @@ class Upload(_Transfer):
         if use_chunks:
             self.__ValidateChunksize(self.chunksize)
         self.EnsureInitialized()
+        if use_chunks and self.__pipeline_buffers and not self.complete:
+            response = self.__SendPipelinedChunks(
+                callback, additional_headers)
         while not self.complete:
             response = send_func(self.stream.tell())
             if response.status_code in (http_client.OK, http_client.CREATED):
@@ -988,6 +1409,7 @@ class Upload(_Transfer):
 
             self.__progress = self.__GetLastByte(
                 self._GetRangeHeaderFromResponse(response))
+            self.__SaveCheckpoint(self.progress + 1)
             if self.progress + 1 != self.stream.tell():
                 # TODO(craigcitro): Add a better way to recover here.
                 raise exceptions.CommunicationError(
@@ -1003,9 +1425,55 @@ class Upload(_Transfer):
                 raise exceptions.TransferInvalidError(
                     'Upload complete with %s additional bytes left in stream' %
                     (int(end_pos) - int(current_pos)))
+        if self.__complete and self.__checkpoint_store is not None:
+            self.__checkpoint_store.Delete(self.__checkpoint_key)
         self._ExecuteCallback(finish_callback, response)
         return response
 
+    def __SendPipelinedChunks(self, callback, additional_headers):
+        """Send the remaining chunks, reading each one ahead on a thread.
+
+        This follows the loop in __StreamMedia, but tracks the position
+        to send from itself, since the reader moves the stream ahead.
+        """
+        reader = _ChunkReader(
+            lambda start: self.__ReadChunk(start, in_memory=True),
+            self.__pipeline_buffers)
+        position = self.stream.tell()
+        try:
+            while True:
+                chunk = reader.Next(self.stream, position)
+                # The reader owns the stream, and restarts after a short
+                # write itself.
+                response = self.__SendChunkRequest(
+                    chunk, additional_headers=additional_headers, seek=False)
+                if response.status_code in (http_client.OK,
+                                            http_client.CREATED):
+                    self.__complete = True
+                    position = chunk.end
+                    break
+                if response.status_code != http_wrapper.RESUME_INCOMPLETE:
+                    if not self.__IsRetryable(response):
+                        raise exceptions.HttpError.FromResponse(response)
+                    reader.Stop()
+                    self.RefreshResumableUploadState()
+                    position = self.stream.tell()
+                    self._ExecuteCallback(callback, response)
+                    if self.complete:
+                        break
+                    continue
+                self.__progress = self.__GetLastByte(
+                    self._GetRangeHeaderFromResponse(response))
+                self.__SaveCheckpoint(self.progress + 1)
+                # After a short write, resume where the server stopped.
+                position = self.progress + 1
+                self._ExecuteCallback(callback, response)
+        finally:
+            reader.Stop()
+        if self.stream.tell() != position:
+            self.stream.seek(position)
+        return response
+
     def StreamMedia(self, callback=None, finish_callback=None,
                     additional_headers=None):
         """Send this resumable upload in a single request.
@@ -1032,8 +1500,12 @@ class Upload(_Transfer):
             callback=callback, finish_callback=finish_callback,
             additional_headers=additional_headers)
 
-    def __SendMediaRequest(self, request, end):
-        """Request helper function for SendMediaBody & SendChunk."""
+    def __SendMediaRequest(self, request, end, seek=True):
+        """Request helper function for SendMediaBody & SendChunk.
+
+        Unless seek is False, after a short write self.stream is moved back
+        to the first byte the server did not receive.
+        """
         def CheckResponse(response):
             if response is None:
                 # Caller shouldn't call us if the response is None,
@@ -1047,7 +1519,7 @@ class Upload(_Transfer):
         if response.status_code == http_wrapper.RESUME_INCOMPLETE:
             last_byte = self.__GetLastByte(
                 self._GetRangeHeaderFromResponse(response))
-            if last_byte + 1 != end:
+            if seek and last_byte + 1 != end:
                 self.stream.seek(last_byte + 1)
         return response
 
@@ -1079,37 +1551,64 @@ class Upload(_Transfer):
     def __SendChunk(self, start, additional_headers=None):
         """Send the specified chunk."""
         self.EnsureInitialized()
-        no_log_body = self.total_size is None
-        request = http_wrapper.Request(url=self.url, http_method='PUT')
+        return self.__SendChunkRequest(
+            self.__ReadChunk(start), additional_headers=additional_headers)
+
+    def __ReadChunk(self, start, in_memory=False):
+        """Read the chunk starting at start, the position of self.stream.
+
+        Args:
+          start: (int) Position of the start of the chunk.
+          in_memory: (bool, default: False) If True, the body is always
+              read into memory now, rather than from the stream as it is
+              sent.
+
+        Returns:
+          An _UploadChunk.
+        """
+        total_size = self.total_size
         if self.__gzip_encoded:
-            request.headers['Content-Encoding'] = 'gzip'
-            body_stream, read_length, exhausted = compression.CompressStream(
-                self.stream, self.chunksize)
+            body, read_length, exhausted = compression.CompressStream(
+                self.stream, self.chunksize, num_threads=self.__gzip_threads)
             end = start + read_length
-            # If the stream length was previously unknown and the input stream
-            # is exhausted, then we're at the end of the stream.
-            if self.total_size is None and exhausted:
-                self.__total_size = end
-        elif self.total_size is None:
+        elif total_size is None:
             # For the streaming resumable case, we need to detect when
             # we're at the end of the stream.
             body_stream = buffered_stream.BufferedStream(
                 self.stream, start, self.chunksize)
             end = body_stream.stream_end_position
-            if body_stream.stream_exhausted:
-                self.__total_size = end
+            exhausted = body_stream.stream_exhausted
             # TODO: Here, change body_stream from a stream to a string object,
             # which means reading a chunk into memory.  This works around
             # https://code.google.com/p/httplib2/issues/detail?id=176 which can
             # cause httplib2 to skip bytes on 401's for file objects.
             # Rework this solution to be more general.
-            body_stream = body_stream.read(self.chunksize)
+            body = body_stream.read(self.chunksize)
         else:
-            end = min(start + self.chunksize, self.total_size)
-            body_stream = stream_slice.StreamSlice(self.stream, end - start)
+            end = min(start + self.chunksize, total_size)
+            exhausted = False
+            body = stream_slice.StreamSlice(self.stream, end - start)
+            # Reading a mapped file returns a view of the map, so the
+            # chunk is "read into memory" without a copy.
+            if in_memory or isinstance(self.stream, mapped_file.MappedFile):
+                body = body.read()
+        last = exhausted or (total_size is not None and end >= total_size)
+        return _UploadChunk(start, end, body, last)
+
+    def __SendChunkRequest(self, chunk, additional_headers=None, seek=True):
+        """Send a chunk read by __ReadChunk."""
+        start, end = chunk.start, chunk.end
+        no_log_body = self.total_size is None
+        # If the stream length was previously unknown and the input stream
+        # is exhausted, then we're at the end of the stream.
+        if self.total_size is None and chunk.last:
+            self.__total_size = end
+        request = http_wrapper.Request(url=self.url, http_method='PUT')
+        if self.__gzip_encoded:
+            request.headers['Content-Encoding'] = 'gzip'
         # TODO(craigcitro): Think about clearer errors on "no data in
         # stream".
-        request.body = body_stream
+        request.body = chunk.body
         request.headers['Content-Type'] = self.mime_type
         if no_log_body:
             # Disable logging of streaming body.
@@ -1130,4 +1629,4 @@ class Upload(_Transfer):
         if additional_headers:
             request.headers.update(additional_headers)
 
-        return self.__SendMediaRequest(request, end)
+        return self.__SendMediaRequest(request, end, seek=seek)
@@ -15,7 +15,11 @@
 # limitations under the License.
 
 """Tests for transfer.py."""
+import os
+import shutil
 import string
+import tempfile
+import time
 import unittest
 
 import httplib2
@@ -29,6 +33,9 @@ from apitools.base.py import exceptions
 from apitools.base.py import gzip
 from apitools.base.py import http_wrapper
 from apitools.base.py import transfer
+from apitools.base.py import upload_checkpoint
+from samples.storage_sample.storage_v1 import storage_v1_client
+from samples.storage_sample.storage_v1 import storage_v1_messages
 
 
 class TransferTest(unittest.TestCase):
@@ -244,6 +251,106 @@ class TransferTest(unittest.TestCase):
             self.assertEqual(string.ascii_lowercase + string.ascii_uppercase,
                              download_stream.getvalue())
 
+    def _ReturnSlice(self, data, status=http_client.PARTIAL_CONTENT,
+                     max_length=None):
+        """Returns a MakeRequest side effect serving ranges of data."""
+        def _SideEffect(unused_http, http_request,
+                        *unused_args, **unused_kwds):
+            byte_range = http_request.headers['range'][len('bytes='):]
+            start, _, end = byte_range.partition('-')
+            start, end = int(start), int(end)
+            if max_length is not None:
+                end = min(end, start + max_length - 1)
+            return http_wrapper.Response(
+                info={
+                    'content-range': 'bytes %d-%d/%d' % (
+                        start, end, len(data)),
+                    'status': status,
+                },
+                content=data[start:end + 1],
+                request_url=http_request.url,
+            )
+        return _SideEffect
+
+    def testStreamInSlices(self):
+        data = (string.ascii_lowercase + string.ascii_uppercase).encode()
+        download_stream = six.BytesIO()
+        download = transfer.Download.FromStream(
+            download_stream, chunksize=10, total_size=len(data),
+            auto_transfer=False)
+        callback = mock.Mock()
+        with mock.patch.object(http_wrapper, 'MakeRequest',
+                               autospec=True) as make_request:
+            make_request.side_effect = self._ReturnSlice(data)
+            request = http_wrapper.Request(url='https://part.one/')
+            download.InitializeDownload(request, http=object())
+            download.StreamInSlices(num_workers=3, callback=callback,
+                                    http_factory=object)
+            self.assertEqual(6, make_request.call_count)
+            ranges = sorted(call[0][1].headers['range']
+                            for call in make_request.call_args_list)
+            self.assertEqual(
+                ['bytes=0-9', 'bytes=10-19', 'bytes=20-29', 'bytes=30-39',
+                 'bytes=40-49', 'bytes=50-51'], ranges)
+        self.assertEqual(data, download_stream.getvalue())
+        self.assertEqual(len(data), download.progress)
+        self.assertEqual(len(data), download_stream.tell())
+
+    def testStreamInSlicesShortReads(self):
+        data = string.ascii_lowercase.encode()
+        download_stream = six.BytesIO()
+        download = transfer.Download.FromStream(
+            download_stream, chunksize=10, total_size=len(data),
+            auto_transfer=False)
+        with mock.patch.object(http_wrapper, 'MakeRequest',
+                               autospec=True) as make_request:
+            make_request.side_effect = self._ReturnSlice(data, max_length=4)
+            request = http_wrapper.Request(url='https://part.one/')
+            download.InitializeDownload(request, http=object())
+            download.StreamInSlices(num_workers=2, http_factory=object)
+            self.assertEqual(8, make_request.call_count)
+        self.assertEqual(data, download_stream.getvalue())
+        self.assertEqual(len(data), download.progress)
+
+    def testStreamInSlicesUnknownTotalSize(self):
+        data = string.ascii_lowercase.encode()
+        download_stream = six.BytesIO()
+        download = transfer.Download.FromStream(
+            download_stream, chunksize=10, auto_transfer=False)
+        with mock.patch.object(http_wrapper, 'MakeRequest',
+                               autospec=True) as make_request:
+            make_request.side_effect = self._ReturnSlice(data)
+            request = http_wrapper.Request(url='https://part.one/')
+            download.InitializeDownload(request, http=object())
+            download.StreamInSlices(http_factory=object)
+            self.assertEqual(3, make_request.call_count)
+            self.assertEqual(
+                'bytes=0-9', make_request.call_args_list[0][0][1].headers[
+                    'range'])
+        self.assertEqual(len(data), download.total_size)
+        self.assertEqual(data, download_stream.getvalue())
+
+    def testStreamInSlicesRangeIgnored(self):
+        data = string.ascii_lowercase.encode()
+        download = transfer.Download.FromStream(
+            six.BytesIO(), chunksize=10, total_size=len(data),
+            auto_transfer=False)
+        with mock.patch.object(http_wrapper, 'MakeRequest',
+                               autospec=True) as make_request:
+            make_request.side_effect = self._ReturnSlice(
+                data, status=http_client.OK)
+            request = http_wrapper.Request(url='https://part.one/')
+            download.InitializeDownload(request, http=object())
+            with self.assertRaises(exceptions.TransferRetryError):
+                download.StreamInSlices(num_workers=1, http_factory=object)
+
+    def testStreamInSlicesNotSeekable(self):
+        stream = mock.Mock(spec=['write'])
+        download = transfer.Download.FromStream(
+            stream, total_size=26, auto_transfer=False)
+        with self.assertRaises(exceptions.InvalidUserInputError):
+            download.StreamInSlices()
+
     # @mock.patch.object(transfer.Upload, 'RefreshResumableUploadState',
     #                    new=mock.Mock())
     def testFinalizesTransferUrlIfClientPresent(self):
@@ -309,7 +416,7 @@ class TransferTest(unittest.TestCase):
             self.assertEqual(
                 'multipart', url_builder.query_params['uploadType'])
             rewritten_upload_contents = b'\n'.join(
-                http_request.body.split(b'--')[2].splitlines()[1:])
+                _ReadBody(http_request.body).split(b'--')[2].splitlines()[1:])
             self.assertTrue(rewritten_upload_contents.endswith(upload_bytes))
 
             # Test non-multipart (aka media): no body argument means this is
@@ -323,10 +430,73 @@ class TransferTest(unittest.TestCase):
                 headers={'content-type': 'text/plain'})
             upload.ConfigureRequest(upload_config, http_request, url_builder)
             self.assertEqual(url_builder.query_params['uploadType'], 'media')
-            rewritten_upload_contents = http_request.body
+            rewritten_upload_contents = _ReadBody(http_request.body)
             self.assertTrue(rewritten_upload_contents.endswith(upload_bytes))
 
 
+def _ReadBody(body):
+    """Return the bytes httplib would send for a request body."""
+    if isinstance(body, bytes):
+        return body
+    return b''.join(body)
+
+
+class _FakeResumableServer(object):
+
+    """Stands in for the http of a resumable upload, storing what it gets.
+
+    Each request is counted from 1; requests in short_writes only store
+    half their bytes, and requests in failures get a 503. A request
+    without a Content-Range starts a new session.
+    """
+
+    def __init__(self, short_writes=(), failures=(), on_chunk=None):
+        self.data = b''
+        self.requests = 0
+        self.short_writes = set(short_writes)
+        self.failures = set(failures)
+        self.on_chunk = on_chunk
+        self.connections = {}
+        self.sessions = 0
+
+    def __Incomplete(self):
+        info = {'status': str(http_wrapper.RESUME_INCOMPLETE)}
+        if self.data:
+            info['range'] = 'bytes=0-%d' % (len(self.data) - 1)
+        return info, b''
+
+    def request(self, unused_uri, body=None, headers=None, **unused_kwds):
+        self.requests += 1
+        if 'Content-Range' not in headers:
+            self.sessions += 1
+            self.data = b''
+            return {'status': str(http_client.OK),
+                    'location': 'http://www.uploads.com/upload'}, b''
+        range_spec, _, total = headers['Content-Range'][
+            len('bytes '):].partition('/')
+        if range_spec == '*' and total == '*':
+            return self.__Incomplete()
+        if self.requests in self.failures:
+            return {'status': str(http_client.SERVICE_UNAVAILABLE)}, b''
+        body = getattr(body, 'read', lambda: body)()
+        if headers.get('Content-Encoding') == 'gzip':
+            with gzip.GzipFile(fileobj=six.BytesIO(body)) as f:
+                body = f.read()
+        if range_spec != '*':
+            start = int(range_spec.partition('-')[0])
+            if start != len(self.data):
+                raise AssertionError('Chunk at %d, expected %d' % (
+                    start, len(self.data)))
+            if self.on_chunk is not None:
+                self.on_chunk(start)
+            if self.requests in self.short_writes:
+                body = body[:len(body) // 2]
+            self.data += body
+        if total != '*' and len(self.data) == int(total):
+            return {'status': str(http_client.OK)}, b'{}'
+        return self.__Incomplete()
+
+
 class UploadTest(unittest.TestCase):
 
     def setUp(self):
@@ -499,6 +669,38 @@ class UploadTest(unittest.TestCase):
             original = f.read()
             self.assertTrue(self.sample_data in original)
 
+    def testMultipartBodyStreamsMedia(self):
+        """Test that multipart bodies read the media only as they're sent."""
+        upload_config = base_api.ApiUploadInfo(
+            accept=['*/*'], max_size=None, simple_multipart=True,
+            simple_path=u'/upload')
+        upload = transfer.Upload(
+            stream=self.sample_stream, mime_type='text/plain',
+            total_size=len(self.sample_data))
+        self.request.body = '{"body_field_one": 7}'
+        upload.ConfigureRequest(upload_config, self.request, self.url_builder)
+        self.assertEqual(0, self.sample_stream.tell())
+        body = _ReadBody(self.request.body)
+        self.assertEqual(str(len(body)),
+                         self.request.headers['content-length'])
+        self.assertIn(b'{"body_field_one": 7}', body)
+        self.assertEqual(self.request.loggable_body,
+                         body.replace(self.sample_data, b'<media body>'))
+        # The body can be sent again, as on a retry.
+        self.assertEqual(body, _ReadBody(self.request.body))
+
+    def testMediaBodyFromUnseekableStream(self):
+        """Test that media is read up front if the stream can't rewind."""
+        upload_config = base_api.ApiUploadInfo(
+            accept=['*/*'], max_size=None, simple_path=u'/upload')
+        stream = mock.Mock(wraps=self.sample_stream)
+        stream.seekable.return_value = False
+        upload = transfer.Upload(
+            stream=stream, mime_type='text/plain',
+            total_size=len(self.sample_data))
+        upload.ConfigureRequest(upload_config, self.request, self.url_builder)
+        self.assertEqual(self.sample_data, self.request.body)
+
     def HttpRequestSideEffect(self, responses=None):
         responses = [(response.info, response.content)
                      for response in responses]
@@ -606,3 +808,199 @@ class UploadTest(unittest.TestCase):
         transfer.Upload.FromData(self.sample_stream, fake_json_data, mock_http,
                                  client=mock_client)
         mock_client.FinalizeTransferUrl.assert_called_once_with('url')
+
+    def __StreamPipelined(self, server, **kwds):
+        upload = transfer.Upload(
+            stream=self.sample_stream, mime_type='text/plain',
+            chunksize=100, pipeline_buffers=2, **kwds)
+        upload.strategy = transfer.RESUMABLE_UPLOAD
+        upload._Initialize(  # pylint: disable=protected-access
+            server, 'http://www.uploads.com/upload')
+        response = upload.StreamInChunks()
+        self.assertEqual(http_client.OK, response.status_code)
+        self.assertTrue(upload.complete)
+        self.assertEqual(self.sample_data, server.data)
+        self.assertEqual(len(self.sample_data), self.sample_stream.tell())
+        return upload
+
+    def testStreamInChunksPipelined(self):
+        max_buffered = []
+
+        def _CheckReadAhead(start):
+            # Wait for the next chunk to be read while this one is sent,
+            # then check no more than that was.
+            deadline = time.time() + 5
+            expected = min(start + 200, len(self.sample_data))
+            while (self.sample_stream.tell() < expected and
+                   time.time() < deadline):
+                time.sleep(0.001)
+            max_buffered.append(self.sample_stream.tell() - start)
+        server = _FakeResumableServer(on_chunk=_CheckReadAhead)
+        self.__StreamPipelined(server, total_size=len(self.sample_data))
+        self.assertEqual(6, server.requests)
+        self.assertEqual([200] * 5 + [100], max_buffered)
+
+    def testStreamInChunksPipelinedShortWrite(self):
+        server = _FakeResumableServer(short_writes=[2, 5])
+        self.__StreamPipelined(server, total_size=len(self.sample_data))
+        self.assertEqual(7, server.requests)
+
+    def testStreamInChunksPipelinedRetry(self):
+        # The failed chunk is followed by a request for the upload state,
+        # and the last by an empty one, since the size isn't known.
+        server = _FakeResumableServer(failures=[3])
+        upload = self.__StreamPipelined(server)
+        self.assertEqual(9, server.requests)
+        self.assertEqual(len(self.sample_data), upload.total_size)
+
+    def testStreamInChunksPipelinedCompressed(self):
+        server = _FakeResumableServer(failures=[1])
+        self.__StreamPipelined(server, gzip_encoded=True)
+        self.assertEqual(3, server.requests)
+
+    def testStreamInChunksCompressedOnThreads(self):
+        server = _FakeResumableServer()
+        self.__StreamPipelined(server, gzip_encoded=True, gzip_threads=2)
+        self.assertEqual(1, server.requests)
+
+    @unittest.skipIf(six.PY2, 'memory_map requires Python 3')
+    def testStreamInChunksMemoryMapped(self):
+        with tempfile.NamedTemporaryFile(suffix='.txt') as f:
+            f.write(self.sample_data)
+            f.flush()
+            upload = transfer.Upload.FromFile(
+                f.name, chunksize=100, auto_transfer=False, memory_map=True)
+        server = _FakeResumableServer()
+        bodies = []
+        request = server.request
+
+        def _RecordBody(uri, body=None, **kwds):
+            bodies.append(body)
+            return request(uri, body=body, **kwds)
+        server.request = _RecordBody
+        upload.strategy = transfer.RESUMABLE_UPLOAD
+        upload._Initialize(  # pylint: disable=protected-access
+            server, 'http://www.uploads.com/upload')
+        response = upload.StreamInChunks()
+        self.assertEqual(http_client.OK, response.status_code)
+        self.assertEqual(self.sample_data, server.data)
+        self.assertEqual(6, len(bodies))
+        # Each chunk is sent as a view of the map, not a copy.
+        for body in bodies:
+            self.assertIsInstance(body, memoryview)
+        upload.stream.close()
+
+    def __CheckpointedUpload(self, store, **kwds):
+        upload = transfer.Upload.FromFile(
+            self.filename, chunksize=100, resume=True,
+            checkpoint_store=store, **kwds)
+        upload.strategy = transfer.RESUMABLE_UPLOAD
+        return upload
+
+    def __WriteSampleFile(self):
+        tempdir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, tempdir)
+        self.filename = os.path.join(tempdir, 'sample.txt')
+        with open(self.filename, 'wb') as f:
+            f.write(self.sample_data)
+        return upload_checkpoint.FileCheckpointStore(
+            os.path.join(tempdir, 'checkpoints'))
+
+    def __PutCheckpoint(self, store, url):
+        store.Put(os.path.abspath(self.filename),
+                  upload_checkpoint.UploadCheckpoint(
+                      url=url, total_size=len(self.sample_data),
+                      fingerprint=upload_checkpoint.FileFingerprint(
+                          self.filename),
+                      committed=100))
+
+    def testResumeFromCheckpoint(self):
+        store = self.__WriteSampleFile()
+        key = os.path.abspath(self.filename)
+
+        def _Crash(start):
+            if start == 300:
+                raise KeyboardInterrupt()
+        server = _FakeResumableServer(on_chunk=_Crash)
+        upload = self.__CheckpointedUpload(store)
+        with self.assertRaises(KeyboardInterrupt):
+            upload.InitializeUpload(self.request, http=server)
+        checkpoint = store.Get(key)
+        self.assertEqual('http://www.uploads.com/upload', checkpoint.url)
+        self.assertEqual(300, checkpoint.committed)
+        self.assertEqual(len(self.sample_data), checkpoint.total_size)
+
+        server.on_chunk = None
+        upload = self.__CheckpointedUpload(store)
+        response = upload.InitializeUpload(self.request, http=server)
+        self.assertEqual(http_client.OK, response.status_code)
+        self.assertEqual(1, server.sessions)
+        self.assertEqual(self.sample_data, server.data)
+        self.assertIsNone(store.Get(key))
+
+    def testResumeWithoutAutoTransfer(self):
+        store = self.__WriteSampleFile()
+        server = _FakeResumableServer()
+        server.data = self.sample_data[:200]
+        self.__PutCheckpoint(store, 'http://www.uploads.com/upload')
+        upload = self.__CheckpointedUpload(store, auto_transfer=False)
+        upload.InitializeUpload(self.request, http=server)
+        # The server's offset wins over the checkpoint's.
+        self.assertEqual(200, upload.stream.tell())
+        upload.StreamInChunks()
+        self.assertEqual(0, server.sessions)
+        self.assertEqual(self.sample_data, server.data)
+
+    def testResumeThroughApiMethod(self):
+        store = self.__WriteSampleFile()
+        self.__PutCheckpoint(store, 'http://www.uploads.com/upload')
+        server = _FakeResumableServer()
+        server.data = self.sample_data[:200]
+        client = storage_v1_client.StorageV1(
+            get_credentials=False, http=server)
+        upload = self.__CheckpointedUpload(store, auto_transfer=False)
+        result = client.objects.Insert(
+            storage_v1_messages.StorageObjectsInsertRequest(
+                bucket='bucket', name='sample.txt'),
+            upload=upload)
+        self.assertEqual(storage_v1_messages.Object(), result)
+        self.assertEqual(200, upload.stream.tell())
+        upload.StreamInChunks()
+        self.assertEqual(0, server.sessions)
+        self.assertEqual(self.sample_data, server.data)
+
+    def testResumeModifiedFile(self):
+        store = self.__WriteSampleFile()
+        key = os.path.abspath(self.filename)
+        store.Put(key, upload_checkpoint.UploadCheckpoint(
+            url='http://www.uploads.com/stale',
+            total_size=len(self.sample_data), fingerprint='stale',
+            committed=100))
+        server = _FakeResumableServer()
+        upload = self.__CheckpointedUpload(store)
+        upload.InitializeUpload(self.request, http=server)
+        self.assertEqual(1, server.sessions)
+        self.assertEqual(self.sample_data, server.data)
+        self.assertIsNone(store.Get(key))
+
+    def testResumeExpiredSession(self):
+        store = self.__WriteSampleFile()
+        self.__PutCheckpoint(store, 'http://www.uploads.com/expired')
+        server = _FakeResumableServer()
+        request = server.request
+
+        def _ExpireSession(uri, **kwds):
+            if uri.endswith('/expired'):
+                return {'status': str(http_client.NOT_FOUND)}, b''
+            return request(uri, **kwds)
+        server.request = _ExpireSession
+        upload = self.__CheckpointedUpload(store)
+        response = upload.InitializeUpload(self.request, http=server)
+        self.assertEqual(http_client.OK, response.status_code)
+        self.assertEqual(1, server.sessions)
+        self.assertEqual(self.sample_data, server.data)
+
+    def testPipelineBuffersMustBePositive(self):
+        with self.assertRaises(exceptions.InvalidUserInputError):
+            transfer.Upload(self.sample_stream, 'text/plain',
+                            pipeline_buffers=0)
@@ -0,0 +1,136 @@
+#!/usr/bin/env python
+#
+# Copyright 2015 Google Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Checkpoints that let a resumable upload survive a restart.
+
+An Upload with a checkpoint store records its resumable session after
+each chunk the server acknowledges. Upload.FromFile(resume=True) looks
+the session up again, so a new process continues from the server's
+committed offset instead of starting over.
+"""
+
+import collections
+import errno
+import hashlib
+import json
+import os
+import tempfile
+
+__all__ = [
+    'CheckpointStore',
+    'FileCheckpointStore',
+    'FileFingerprint',
+    'UploadCheckpoint',
+]
+
+# url: The resumable session URL.
+# total_size: Size of the upload, in bytes.
+# fingerprint: Identifies the contents of the source; see FileFingerprint.
+# committed: Number of bytes the server has acknowledged.
+UploadCheckpoint = collections.namedtuple(
+    'UploadCheckpoint', ['url', 'total_size', 'fingerprint', 'committed'])
+
+# os.replace is atomic on all platforms; os.rename is on POSIX.
+_Replace = getattr(os, 'replace', os.rename)
+
+
+def FileFingerprint(path):
+    """Return a string that changes when the file at path is modified.
+
+    This uses the size and modification time, rather than a hash of the
+    contents, so that it is cheap for large files.
+    """
+    stat = os.stat(path)
+    return '%d-%d' % (stat.st_size, int(stat.st_mtime * 1000000))
+
+
+class CheckpointStore(object):
+
+    """Interface for storing UploadCheckpoints by key.
+
+    Keys are strings; Upload.FromFile uses the absolute path of the file.
+    """
+
+    def Get(self, key):
+        """Return the UploadCheckpoint for key, or None if there is none."""
+        raise NotImplementedError()
+
+    def Put(self, key, checkpoint):
+        """Store checkpoint for key, replacing any earlier one."""
+        raise NotImplementedError()
+
+    def Delete(self, key):
+        """Delete the checkpoint for key, if there is one."""
+        raise NotImplementedError()
+
+
+class FileCheckpointStore(CheckpointStore):
+
+    """Stores each checkpoint as a JSON file in a directory.
+
+    A checkpoint is written to a temporary file which is then renamed
+    over the old one, so a crash leaves either the old checkpoint or the
+    new one, never a partial file.
+    """
+
+    def __init__(self, directory=None):
+        self.__directory = directory or os.path.expanduser(
+            '~/.apitools_upload_checkpoints')
+
+    @property
+    def directory(self):
+        return self.__directory
+
+    def __Path(self, key):
+        digest = hashlib.sha1(key.encode('utf-8')).hexdigest()
+        return os.path.join(self.__directory, digest + '.json')
+
+    def Get(self, key):
+        try:
+            with open(self.__Path(key)) as checkpoint_file:
+                data = json.load(checkpoint_file)
+        except (IOError, OSError, ValueError):
+            return None
+        try:
+            return UploadCheckpoint(**data)
+        except TypeError:
+            # Not a checkpoint we wrote; treat it as missing.
+            return None
+
+    def Put(self, key, checkpoint):
+        try:
+            os.makedirs(self.__directory)
+        except OSError as e:
+            if e.errno != errno.EEXIST:
+                raise
+        fd, temp_path = tempfile.mkstemp(
+            dir=self.__directory, prefix='.checkpoint-')
+        try:
+            with os.fdopen(fd, 'w') as temp_file:
+                json.dump(checkpoint._asdict(), temp_file)
+                temp_file.flush()
+                os.fsync(temp_file.fileno())
+            _Replace(temp_path, self.__Path(key))
+        except BaseException:
+            os.remove(temp_path)
+            raise
+
+    def Delete(self, key):
+        try:
+            os.remove(self.__Path(key))
+        except OSError as e:
+            if e.errno != errno.ENOENT:
+                raise
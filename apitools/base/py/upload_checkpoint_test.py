@@ -0,0 +1,90 @@
+#
+# Copyright 2015 Google Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Tests for upload_checkpoint."""
+
+import os
+import shutil
+import tempfile
+import unittest
+
+import mock
+
+from apitools.base.py import upload_checkpoint
+
+
+class FileCheckpointStoreTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tempdir = tempfile.mkdtemp()
+        self.directory = os.path.join(self.tempdir, 'checkpoints')
+        self.store = upload_checkpoint.FileCheckpointStore(self.directory)
+        self.checkpoint = upload_checkpoint.UploadCheckpoint(
+            url='http://www.uploads.com/upload', total_size=1000,
+            fingerprint='1000-1', committed=300)
+
+    def tearDown(self):
+        shutil.rmtree(self.tempdir)
+
+    def testPutAndGet(self):
+        self.assertIsNone(self.store.Get('/tmp/a'))
+        self.store.Put('/tmp/a', self.checkpoint)
+        self.assertEqual(self.checkpoint, self.store.Get('/tmp/a'))
+        self.assertIsNone(self.store.Get('/tmp/b'))
+        self.store.Put('/tmp/a', self.checkpoint._replace(committed=400))
+        self.assertEqual(400, self.store.Get('/tmp/a').committed)
+        self.assertEqual(1, len(os.listdir(self.directory)))
+
+    def testDelete(self):
+        self.store.Put('/tmp/a', self.checkpoint)
+        self.store.Delete('/tmp/a')
+        self.assertIsNone(self.store.Get('/tmp/a'))
+        self.store.Delete('/tmp/a')
+
+    def testFailedPutKeepsCheckpoint(self):
+        self.store.Put('/tmp/a', self.checkpoint)
+        with mock.patch.object(os, 'fsync', side_effect=OSError('full')):
+            with self.assertRaises(OSError):
+                self.store.Put('/tmp/a',
+                               self.checkpoint._replace(committed=400))
+        self.assertEqual(self.checkpoint, self.store.Get('/tmp/a'))
+        self.assertEqual(1, len(os.listdir(self.directory)))
+
+    def testUnreadableCheckpoint(self):
+        self.store.Put('/tmp/a', self.checkpoint)
+        path = os.path.join(self.directory, os.listdir(self.directory)[0])
+        for contents in ('{"url": ', '{"url": "http://www.uploads.com"}'):
+            with open(path, 'w') as f:
+                f.write(contents)
+            self.assertIsNone(self.store.Get('/tmp/a'))
+
+
+class FileFingerprintTest(unittest.TestCase):
+
+    def testChangesWithFile(self):
+        with tempfile.NamedTemporaryFile() as f:
+            f.write(b'abc')
+            f.flush()
+            fingerprint = upload_checkpoint.FileFingerprint(f.name)
+            self.assertEqual(
+                fingerprint, upload_checkpoint.FileFingerprint(f.name))
+            f.write(b'd')
+            f.flush()
+            self.assertNotEqual(
+                fingerprint, upload_checkpoint.FileFingerprint(f.name))
+
+
+if __name__ == '__main__':
+    unittest.main()
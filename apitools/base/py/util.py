@@ -18,6 +18,8 @@
 
 import os
 import random
+import re
+import threading
 
 import six
 from six.moves import http_client
@@ -40,6 +42,7 @@ __all__ = [
 ]
 
 _RESERVED_URI_CHARS = r":/?#[]@!$&'()*+,;="
+_PATH_TEMPLATE_RE = re.compile(r'\{(\+?)([^{}]*)\}')
 
 
 def DetectGae():
@@ -141,6 +144,81 @@ def ExpandRelativePath(method_config, params, relative_path=None):
     return path
 
 
+def CompileRelativePath(relative_path, path_params):
+    """Split a relative path template into literals and parameters.
+
+    Expanding the result with ExpandCompiledRelativePath gives the same
+    path as ExpandRelativePath, without searching the template each time.
+
+    Args:
+      relative_path: (str) The path template.
+      path_params: ([str]) The names of the path parameters.
+
+    Returns:
+      A (parts, params) tuple. parts alternates literal strings and
+      parameter names, starting and ending with a literal. params is a
+      list of (name, reserved_chars) tuples, in path_params order.
+
+    Raises:
+      InvalidUserInputError: if a path parameter is not in the template.
+    """
+    path = relative_path or ''
+    parts = ['']
+    reserved = {}
+    position = 0
+    for match in _PATH_TEMPLATE_RE.finditer(path):
+        param = match.group(2)
+        if param not in path_params:
+            continue
+        parts[-1] += path[position:match.start()]
+        parts.extend((param, ''))
+        # For more details about "reserved word expansion", see:
+        #   http://tools.ietf.org/html/rfc6570#section-3.2.2
+        if match.group(1) or param not in reserved:
+            reserved[param] = _RESERVED_URI_CHARS if match.group(1) else ''
+        position = match.end()
+    parts[-1] += path[position:]
+    for param in path_params:
+        if param not in reserved:
+            raise exceptions.InvalidUserInputError(
+                'Missing path parameter %s' % param)
+    return parts, [(param, reserved[param]) for param in path_params]
+
+
+def ExpandCompiledRelativePath(compiled_path, params):
+    """Expand a path compiled by CompileRelativePath with params.
+
+    Args:
+      compiled_path: The result of CompileRelativePath.
+      params: (dict) Map from path parameter names to values.
+
+    Returns:
+      The relative path.
+
+    Raises:
+      InvalidUserInputError: if a parameter is missing or can't be encoded.
+    """
+    parts, path_params = compiled_path
+    values = {}
+    for param, reserved_chars in path_params:
+        value = params.get(param)
+        if value is None:
+            raise exceptions.InvalidUserInputError(
+                'Request missing required parameter %s' % param)
+        try:
+            if not isinstance(value, six.string_types):
+                value = str(value)
+            values[param] = urllib_parse.quote(value.encode('utf_8'),
+                                               reserved_chars)
+        except TypeError as e:
+            raise exceptions.InvalidUserInputError(
+                'Error setting required parameter %s to value %s: %s' % (
+                    param, value, e))
+    expanded = list(parts)
+    expanded[1::2] = [values[param] for param in parts[1::2]]
+    return ''.join(expanded)
+
+
 def CalculateWaitForRetry(retry_attempt, max_wait=60):
     """Calculates amount of time to wait before a retry attempt.
 
@@ -235,3 +313,60 @@ def MapRequestParams(params, request_type):
             new_params[param_name] = encoding.GetCustomJsonEnumMapping(
                 type(value), python_name=str(value)) or str(value)
     return new_params
+
+
+def LazyDefinitions(module_globals, names):
+    """Return __getattr__ and __dir__ functions for a lazy module.
+
+    Generated messages modules built with --experimental_lazy_load define
+    each top-level type in a _Define<name> function instead of at import
+    time. The returned __getattr__ calls that function the first time the
+    name is looked up and stores the result in the module. Module-level
+    __getattr__ requires Python 3.7.
+
+    Args:
+      module_globals: (dict) The globals() of the module.
+      names: ([str]) The names of the lazily defined types.
+
+    Returns:
+      A (__getattr__, __dir__) tuple for the module.
+    """
+    lazy_names = frozenset(names)
+    module_name = module_globals['__name__']
+    # Reentrant, since defining one type may look up another.
+    lock = threading.RLock()
+
+    def __getattr__(name):  # pylint: disable=invalid-name
+        if name not in lazy_names:
+            raise AttributeError('module %r has no attribute %r' % (
+                module_name, name))
+        with lock:
+            if name not in module_globals:
+                definition = module_globals['_Define' + name]()
+                _FixQualifiedNames(definition, name, module_name)
+                module_globals[name] = definition
+        return module_globals[name]
+
+    def __dir__():  # pylint: disable=invalid-name
+        return sorted(set(module_globals) | lazy_names)
+
+    return __getattr__, __dir__
+
+
+def _FixQualifiedNames(definition, qualified_name, module_name):
+    """Give a type defined in a function the name it would have at top level.
+
+    Pickle finds classes by __qualname__, which for a class defined in a
+    function is not a path from the module. Message and Enum classes are
+    frozen once created, so this sets the attribute through type.
+    """
+    if (not isinstance(definition, type) or
+            definition.__module__ != module_name or
+            not hasattr(definition, '__qualname__')):
+        return
+    type.__setattr__(definition, '__qualname__', qualified_name)
+    for name, value in vars(definition).items():
+        if isinstance(value, type) and '<locals>' in getattr(
+                value, '__qualname__', ''):
+            _FixQualifiedNames(
+                value, '%s.%s' % (qualified_name, name), module_name)
@@ -73,6 +73,23 @@ class UtilTest(unittest.TestCase):
         self.assertEqual('foo%2F%3Abar%3A/baz', util.ExpandRelativePath(
             method_config_no_reserved, {'x': 'foo/:bar:'}))
 
+    def testCompiledExpand(self):
+        compiled = util.CompileRelativePath('{x}/y/{+z}/{w}', ['x', 'z'])
+        self.assertEqual('1/y/a/b/{w}', util.ExpandCompiledRelativePath(
+            compiled, {'x': 1, 'z': 'a/b'}))
+        self.assertEqual(
+            util.ExpandRelativePath(
+                MockedMethodConfig(relative_path='{x}/{x}', path_params=['x']),
+                {'x': 'a/b'}),
+            util.ExpandCompiledRelativePath(
+                util.CompileRelativePath('{x}/{x}', ['x']), {'x': 'a/b'}))
+        with self.assertRaisesRegex(exceptions.InvalidUserInputError,
+                                    'Missing path parameter z'):
+            util.CompileRelativePath('{x}/y', ['x', 'z'])
+        with self.assertRaisesRegex(exceptions.InvalidUserInputError,
+                                    'missing required parameter z'):
+            util.ExpandCompiledRelativePath(compiled, {'x': '1'})
+
     def testCalculateWaitForRetry(self):
         try0 = util.CalculateWaitForRetry(0)
         self.assertTrue(try0 >= 1.0)
@@ -201,3 +218,34 @@ class UtilTest(unittest.TestCase):
         remapped_params = ['str_field', 'enum_field']
         self.assertEqual(remapped_params,
                          util.MapParamNames(params, MessageWithRemappings))
+
+    def testLazyDefinitions(self):
+        definitions = []
+
+        def DefineLazyMessage():
+
+            class LazyMessage(messages.Message):
+
+                class Color(messages.Enum):
+                    red = 1
+
+                color = messages.EnumField('Color', 1)
+
+            definitions.append(LazyMessage)
+            return LazyMessage
+
+        module_globals = {
+            '__name__': __name__,
+            '_DefineLazyMessage': DefineLazyMessage,
+        }
+        getattr_, dir_ = util.LazyDefinitions(
+            module_globals, ['LazyMessage'])
+        self.assertIn('LazyMessage', dir_())
+        self.assertNotIn('LazyMessage', module_globals)
+        lazy_message = getattr_('LazyMessage')
+        self.assertIs(lazy_message, getattr_('LazyMessage'))
+        self.assertIs(lazy_message, module_globals['LazyMessage'])
+        self.assertEqual(1, len(definitions))
+        self.assertEqual('LazyMessage.Color', lazy_message.Color.__qualname__)
+        with self.assertRaisesRegex(AttributeError, 'Unknown'):
+            getattr_('Unknown')
@@ -183,6 +183,46 @@ def WritePythonFile(file_descriptor, package, version, printer):
                _ProtoRpcPrinter(printer))
 
 
+def WriteLazyPythonFile(file_descriptor, package, version, printer):
+    """Write file_descriptor to out, defining each type on first use.
+
+    Each top-level enum and message is defined by a _Define<name>
+    function, which also registers its custom JSON mappings. The module's
+    __getattr__ (see util.LazyDefinitions) calls it on first lookup.
+    """
+    proto_printer = _ProtoRpcPrinter(printer)
+    proto_printer.PrintPreamble(package, version, file_descriptor)
+    definitions = sorted(
+        file_descriptor.enum_types, key=operator.attrgetter('name'))
+    definitions.extend(sorted(
+        file_descriptor.message_types, key=operator.attrgetter('name')))
+    for definition in definitions:
+        printer('def _Define%s():', definition.name)
+        with printer.Indent():
+            if isinstance(definition, ExtendedEnumDescriptor):
+                proto_printer.PrintEnum(definition)
+            elif definition.alias_for:
+                printer('return %s', definition.alias_for)
+                printer()
+                printer()
+                continue
+            else:
+                proto_printer.PrintMessage(definition)
+            for mapping in _FetchCustomMappings([definition]):
+                for line in mapping.splitlines():
+                    proto_printer.PrintCustomJsonMapping(line)
+            printer('return %s', definition.name)
+        printer()
+        printer()
+    printer('__all__ = [')
+    with printer.Indent(indent='    '):
+        for definition in definitions:
+            printer('%r,', str(definition.name))
+    printer(']')
+    printer()
+    printer('__getattr__, __dir__ = _util.LazyDefinitions(globals(), __all__)')
+
+
 def PrintIndentedDescriptions(printer, ls, name, prefix=''):
     if ls:
         with printer.Indent(indent=prefix):
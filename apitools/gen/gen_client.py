@@ -102,7 +102,8 @@ def _GetCodegenFromFlags(args):
         init_wildcards_file=(args.init_file == 'wildcards'),
         use_proto2=args.experimental_proto2_output,
         unelidable_request_methods=args.unelidable_request_methods,
-        apitools_version=args.apitools_version)
+        apitools_version=args.apitools_version,
+        lazy_load=args.experimental_lazy_load)
 
 
 # TODO(craigcitro): Delete this if we don't need this functionality.
@@ -327,6 +328,12 @@ def main(argv=None):
         default=False, action='store_true',
         help='Dangerous: also output a proto2 message file.')
 
+    parser.add_argument(
+        '--experimental_lazy_load',
+        default=False, action='store_true',
+        help=('Create services and message classes on first use, instead '
+              'of when the client is imported. Requires Python 3.7.'))
+
     subparsers = parser.add_subparsers(help='Type of generated code')
 
     client_parser = subparsers.add_parser(
@@ -64,7 +64,7 @@ class DescriptorGenerator(object):
     def __init__(self, discovery_doc, client_info, names, root_package, outdir,
                  base_package, protorpc_package, init_wildcards_file=True,
                  use_proto2=False, unelidable_request_methods=None,
-                 apitools_version=''):
+                 apitools_version='', lazy_load=False):
         self.__discovery_doc = discovery_doc
         self.__client_info = client_info
         self.__outdir = outdir
@@ -79,13 +79,14 @@ class DescriptorGenerator(object):
         self.__base_files_package = base_package
         self.__protorpc_package = protorpc_package
         self.__names = names
+        self.__lazy_load = lazy_load
 
         # Order is important here: we need the schemas before we can
         # define the services.
         self.__message_registry = message_registry.MessageRegistry(
             self.__client_info, self.__names, self.__description,
             self.__root_package, self.__base_files_package,
-            self.__protorpc_package)
+            self.__protorpc_package, lazy_load=lazy_load)
         schemas = self.__discovery_doc.get('schemas', {})
         for schema_name, schema in sorted(schemas.items()):
             self.__message_registry.AddDescriptorFromSchema(
@@ -107,7 +108,8 @@ class DescriptorGenerator(object):
             self.__names,
             self.__root_package,
             self.__base_files_package,
-            unelidable_request_methods or [])
+            unelidable_request_methods or [],
+            lazy_load=lazy_load)
         services = self.__discovery_doc.get('resources', {})
         for service_name, methods in sorted(services.items()):
             self.__services_registry.AddServiceFromResource(
@@ -178,11 +180,29 @@ class DescriptorGenerator(object):
                 import_prefix = '%s.' % self.__root_package
             printer('from %s%s import *',
                     import_prefix, self.__client_info.client_rule_name)
-            printer('from %s%s import *',
-                    import_prefix, self.__client_info.messages_rule_name)
+            if self.__lazy_load:
+                # A wildcard import would define every message class.
+                self.__WriteLazyMessagesImport(printer, import_prefix)
+            else:
+                printer('from %s%s import *',
+                        import_prefix, self.__client_info.messages_rule_name)
             printer()
         printer('__path__ = pkgutil.extend_path(__path__, __name__)')
 
+    def __WriteLazyMessagesImport(self, printer, import_prefix):
+        """Write an import that resolves message classes when used."""
+        package, _, module = ('%s%s' % (
+            import_prefix, self.__client_info.messages_rule_name)).rpartition(
+                '.')
+        printer('from %s import %s as _messages_module',
+                package or '.', module)
+        printer()
+        printer()
+        printer('def __getattr__(name):')
+        with printer.Indent():
+            printer('return getattr(_messages_module, name)')
+        printer()
+
     def WriteIntermediateInit(self, out):
         """Write a simple __init__.py for an intermediate directory."""
         printer = self._GetPrinter(out)
@@ -16,6 +16,7 @@
 """Test for gen_client module."""
 
 import os
+import sys
 import unittest
 
 from apitools.gen import gen_client
@@ -153,6 +154,50 @@ __path__ = pkgutil.extend_path(__path__, __name__)
                     '__init__.py']),
                 set(os.listdir(tmp_dir_path)))
 
+    @unittest.skipIf(sys.version_info < (3, 7),
+                     'Lazy loading needs module __getattr__.')
+    def testGenClient_LazyLoad(self):
+        with test_utils.TempDir() as tmp_dir_path:
+            gen_client.main([
+                gen_client.__file__,
+                '--infile', GetTestDataPath('dns', 'dns_v1.json'),
+                '--outdir', os.path.join(tmp_dir_path, 'lazy_dns'),
+                '--overwrite',
+                '--root_package', '.',
+                '--experimental_lazy_load',
+                'client'
+            ])
+            sys.path.insert(0, tmp_dir_path)
+            try:
+                # pylint: disable=import-error
+                import lazy_dns
+                from lazy_dns import dns_v1_messages
+                self.assertNotIn('ManagedZone', vars(dns_v1_messages))
+                client = lazy_dns.DnsV1(get_credentials=False)
+                self.assertNotIn('managedZones', vars(client))
+                self.assertIs(client.managedZones, client.managedZones)
+                self.assertIs(dns_v1_messages.ManagedZone,
+                              lazy_dns.ManagedZone)
+                self.assertIn('ManagedZone', vars(dns_v1_messages))
+                self.assertIn('Quota', dir(dns_v1_messages))
+                self.assertEqual(
+                    'Change.StatusValueValuesEnum',
+                    dns_v1_messages.Change.StatusValueValuesEnum.__qualname__)
+
+                service = client.managedZones
+                http_request = service.PrepareHttpRequest(
+                    service.GetMethodConfig('Get'),
+                    dns_v1_messages.DnsManagedZonesGetRequest(
+                        project='p', managedZone='z'))
+                self.assertEqual(
+                    'https://www.googleapis.com/dns/v1/projects/p/'
+                    'managedZones/z?alt=json', http_request.url)
+            finally:
+                sys.path.remove(tmp_dir_path)
+                for name in list(sys.modules):
+                    if name.split('.')[0] == 'lazy_dns':
+                        del sys.modules[name]
+
     def testGenPipPackage_SimpleDoc(self):
         with test_utils.TempDir() as tmp_dir_path:
             gen_client.main([
@@ -78,7 +78,7 @@ class MessageRegistry(object):
     }
 
     def __init__(self, client_info, names, description, root_package_dir,
-                 base_files_package, protorpc_package):
+                 base_files_package, protorpc_package, lazy_load=False):
         self.__names = names
         self.__client_info = client_info
         self.__package = client_info.package
@@ -86,12 +86,16 @@ class MessageRegistry(object):
         self.__root_package_dir = root_package_dir
         self.__base_files_package = base_files_package
         self.__protorpc_package = protorpc_package
+        self.__lazy_load = lazy_load
         self.__file_descriptor = extended_descriptor.ExtendedFileDescriptor(
             package=self.__package, description=self.__description)
         # Add required imports
         self.__file_descriptor.additional_imports = [
             'from %s import messages as _messages' % self.__protorpc_package,
         ]
+        if lazy_load:
+            self.__file_descriptor.additional_imports.append(
+                'from %s import util as _util' % base_files_package)
         # Map from scoped names (i.e. Foo.Bar) to MessageDescriptors.
         self.__message_registry = collections.OrderedDict()
         # A set of types that we're currently adding (for cycle detection).
@@ -120,6 +124,11 @@ class MessageRegistry(object):
     def WriteFile(self, printer):
         """Write the messages file to out."""
         self.Validate()
+        if self.__lazy_load:
+            extended_descriptor.WriteLazyPythonFile(
+                self.__file_descriptor, self.__package,
+                self.__client_info.version, printer)
+            return
         extended_descriptor.WritePythonFile(
             self.__file_descriptor, self.__package, self.__client_info.version,
             printer)
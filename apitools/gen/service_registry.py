@@ -36,7 +36,7 @@ class ServiceRegistry(object):
 
     def __init__(self, client_info, message_registry,
                  names, root_package, base_files_package,
-                 unelidable_request_methods):
+                 unelidable_request_methods, lazy_load=False):
         self.__client_info = client_info
         self.__package = client_info.package
         self.__names = names
@@ -45,6 +45,7 @@ class ServiceRegistry(object):
         self.__root_package = root_package
         self.__base_files_package = base_files_package
         self.__unelidable_request_methods = unelidable_request_methods
+        self.__lazy_load = lazy_load
         self.__all_scopes = set(self.__client_info.scopes)
 
     def Validate(self):
@@ -234,6 +235,11 @@ class ServiceRegistry(object):
             printer('_URL_VERSION = {0!r}'.format(client_info.url_version))
             printer('_API_KEY = {0!r}'.format(client_info.api_key))
             printer()
+            if self.__lazy_load:
+                for name in self.__service_method_info_map.keys():
+                    printer('%s = base_api.LazyService(%r, %r)',
+                            name, name, self.__GetServiceClassName(name))
+                printer()
             printer("def __init__(self, url='', credentials=None,")
             with printer.Indent(indent='             '):
                 printer('get_credentials=True, http=None, model=None,')
@@ -255,9 +261,10 @@ class ServiceRegistry(object):
                 printer('    default_global_params=default_global_params,')
                 printer('    additional_http_headers=additional_http_headers,')
                 printer('    response_encoding=response_encoding)')
-                for name in self.__service_method_info_map.keys():
-                    printer('self.%s = self.%s(self)',
-                            name, self.__GetServiceClassName(name))
+                if not self.__lazy_load:
+                    for name in self.__service_method_info_map.keys():
+                        printer('self.%s = self.%s(self)',
+                                name, self.__GetServiceClassName(name))
             for name, method_info in self.__service_method_info_map.items():
                 self.__WriteSingleService(
                     printer, name, method_info, client_info.client_class_name)
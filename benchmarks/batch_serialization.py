@@ -0,0 +1,76 @@
+#!/usr/bin/env python
+#
+# Copyright 2015 Google Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Benchmark for serializing batch requests.
+
+Compares BatchHttpRequest._SerializeBatch with the email package
+serializer it replaced, for batches of JSON requests.
+"""
+
+import argparse
+import json
+import os
+import sys
+import timeit
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from apitools.base.py import batch  # noqa: E402
+from apitools.base.py import http_wrapper  # noqa: E402
+
+
+def _MakeBatch(num_requests, body_size):
+    batch_request = batch.BatchHttpRequest(
+        'https://www.googleapis.com/batch/storage/v1')
+    for i in range(num_requests):
+        body = json.dumps({
+            'name': 'object-%d' % i,
+            'metadata': {'padding': 'x' * body_size},
+        })
+        batch_request.Add(http_wrapper.Request(
+            url='https://www.googleapis.com/storage/v1/b/bucket/o/%d' % i,
+            http_method='PATCH',
+            headers={'content-type': 'application/json'},
+            body=body))
+    return batch_request
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--requests', type=int, nargs='+',
+                        default=[10, 100, 1000])
+    parser.add_argument('--body-size', type=int, default=1024)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    print('%8s %12s %12s %8s' % ('requests', 'email (ms)', 'direct (ms)',
+                                 'speedup'))
+    for num_requests in args.requests:
+        batch_request = _MakeBatch(num_requests, args.body_size)
+        # pylint: disable=protected-access
+        email_time = min(timeit.repeat(
+            batch_request._SerializeBatchWithEmail,
+            number=1, repeat=args.repeat))
+        direct_time = min(timeit.repeat(
+            batch_request._SerializeBatch, number=1, repeat=args.repeat))
+        print('%8d %12.2f %12.2f %7.1fx' % (
+            num_requests, email_time * 1000, direct_time * 1000,
+            email_time / direct_time))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,81 @@
+#!/usr/bin/env python
+#
+# Copyright 2015 Google Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Benchmark for the throughput of compression.CompressStream.
+
+Compresses the same data, as an upload with gzip_encoded=True would,
+on one thread with GzipFile and on several with ParallelGzipFile, and
+reports the median throughput and the compression ratio of each.
+
+The data is hex-encoded random bytes, which gzip compresses to about
+half, unless --file is given.
+"""
+
+import argparse
+import binascii
+import os
+import statistics
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import six  # noqa: E402
+
+from apitools.base.py import compression  # noqa: E402
+
+
+def _Measure(data, compresslevel, num_threads):
+    """Compress data and return the time taken and the compressed size."""
+    stream = six.BytesIO(data)
+    start = time.perf_counter()
+    output, _, _ = compression.CompressStream(
+        stream, compresslevel=compresslevel, num_threads=num_threads)
+    elapsed = time.perf_counter() - start
+    return elapsed, output.length
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--file', help='Compress this file.')
+    parser.add_argument('--size_mb', type=int, default=64,
+                        help='Size of the generated data.')
+    parser.add_argument('--compresslevel', type=int, default=2)
+    parser.add_argument('--threads', type=int, nargs='+',
+                        default=[1, 2, 4, 8])
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    if args.file:
+        with open(args.file, 'rb') as f:
+            data = f.read()
+    else:
+        data = binascii.hexlify(os.urandom(args.size_mb << 19))
+    size_mb = len(data) / float(1 << 20)
+    print('%.1f MiB at compresslevel %d, %d CPUs' % (
+        size_mb, args.compresslevel, os.cpu_count()))
+    for num_threads in args.threads:
+        runs = [_Measure(data, args.compresslevel, num_threads)
+                for _ in range(args.repeat)]
+        elapsed = statistics.median(run[0] for run in runs)
+        print('%-8s %2d thread(s): %7.1f MiB/s, ratio %.3f' % (
+            'GzipFile' if num_threads == 1 else 'parallel', num_threads,
+            size_mb / elapsed, runs[0][1] / float(len(data))))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,117 @@
+#!/usr/bin/env python
+#
+# Copyright 2015 Google Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Benchmark for the cold-start import time of apitools.
+
+Imports each module in a fresh interpreter with `python -X importtime`,
+parses the per-module timings it writes to stderr, and reports the
+median cumulative time of the import along with the modules that cost
+the most. Bytecode is compiled once beforehand so that compilation is
+not counted.
+"""
+
+import argparse
+import collections
+import os
+import re
+import statistics
+import subprocess
+import sys
+
+_DEFAULT_MODULES = (
+    'apitools.base.py',
+    'apitools.base.py.base_api',
+    'samples.bigquery_sample.bigquery_v2.bigquery_v2_client',
+    'samples.dns_sample.dns_v1.dns_v1_client',
+    'samples.fusiontables_sample.fusiontables_v1.fusiontables_v1_client',
+    'samples.iam_sample.iam_v1.iam_v1_client',
+    'samples.servicemanagement_sample.servicemanagement_v1.'
+    'servicemanagement_v1_client',
+    'samples.storage_sample.storage_v1.storage_v1_client',
+)
+
+# import time: self [us] | cumulative | imported package
+_IMPORT_TIME_RE = re.compile(
+    r'^import time:\s+(\d+)\s+\|\s+(\d+)\s+\|(\s*)(\S+)\s*$')
+
+ImportTime = collections.namedtuple(
+    'ImportTime', ('name', 'self_us', 'cumulative_us', 'depth'))
+
+
+def ParseImportTime(stderr):
+    """Parse the output of -X importtime into ImportTime tuples."""
+    times = []
+    for line in stderr.splitlines():
+        match = _IMPORT_TIME_RE.match(line)
+        if match is None:
+            continue
+        self_us, cumulative_us, indent, name = match.groups()
+        times.append(ImportTime(name, int(self_us), int(cumulative_us),
+                                (len(indent) - 1) // 2))
+    return times
+
+
+def _MeasureImport(module, env):
+    """Import module in a new interpreter and return its ImportTimes."""
+    process = subprocess.Popen(
+        [sys.executable, '-X', 'importtime', '-c', 'import %s' % module],
+        stdout=subprocess.PIPE, stderr=subprocess.PIPE, env=env,
+        universal_newlines=True)
+    _, stderr = process.communicate()
+    if process.returncode:
+        raise RuntimeError('Importing %s failed:\n%s' % (module, stderr))
+    return ParseImportTime(stderr)
+
+
+def _Report(module, runs, top):
+    """Print the timings of module, given the ImportTimes of each run."""
+    totals = [sum(t.cumulative_us for t in times if t.depth == 0)
+              for times in runs]
+    self_times = collections.defaultdict(list)
+    for times in runs:
+        for t in times:
+            self_times[t.name].append(t.self_us)
+    print('%s: %.1f ms (median of %d, %d modules)' % (
+        module, statistics.median(totals) / 1000.0, len(runs),
+        len(self_times)))
+    slowest = sorted(self_times.items(),
+                     key=lambda item: -statistics.median(item[1]))
+    for name, values in slowest[:top]:
+        print('  %8.2f ms  %s' % (statistics.median(values) / 1000.0, name))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('modules', nargs='*', default=_DEFAULT_MODULES)
+    parser.add_argument('--repeat', type=int, default=10)
+    parser.add_argument('--top', type=int, default=10,
+                        help='Number of slowest modules to list.')
+    args = parser.parse_args()
+
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    env = dict(os.environ)
+    env['PYTHONPATH'] = os.pathsep.join(
+        filter(None, (root, env.get('PYTHONPATH'))))
+    env.pop('PYTHONDONTWRITEBYTECODE', None)
+    for module in args.modules:
+        # Warm up, which also writes the bytecode caches.
+        _MeasureImport(module, env)
+        runs = [_MeasureImport(module, env) for _ in range(args.repeat)]
+        _Report(module, runs, args.top)
+
+
+if __name__ == '__main__':
+    main()